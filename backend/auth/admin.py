@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Company, UserSet, Expense, ExpenseCategory, Receipt
+from .models import (
+    User, Company, UserSet, Expense, ExpenseCategory, Receipt, ExchangeRate, ReferenceSnapshot, ApprovalInbox, WorkerLease,
+    BusinessCalendar, Holiday, ExpenseDailyStats, CompanyMonthlyStats
+)
 
 
 @admin.register(Company)
@@ -64,3 +67,55 @@ class ReceiptAdmin(admin.ModelAdmin):
     list_filter = ['file_type', 'created_at']
     search_fields = ['file_name', 'merchant_name', 'merchant_address']
     readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ['base_currency', 'target_currency', 'rate', 'rate_date', 'as_of', 'updated_at']
+    list_filter = ['base_currency', 'rate_date']
+    search_fields = ['base_currency', 'target_currency']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(ReferenceSnapshot)
+class ReferenceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['key', 'etag', 'source_url', 'fetched_at']
+    readonly_fields = ['fetched_at']
+    exclude = ['payload']
+
+
+@admin.register(ApprovalInbox)
+class ApprovalInboxAdmin(admin.ModelAdmin):
+    list_display = ['expense', 'company', 'stage', 'user_set', 'submission_date']
+    list_filter = ['stage', 'company']
+    raw_id_fields = ['expense']
+
+
+@admin.register(ExpenseDailyStats)
+class ExpenseDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ['day', 'company', 'user', 'category', 'status', 'count', 'amount']
+    list_filter = ['status', 'company']
+    raw_id_fields = ['user']
+
+
+@admin.register(CompanyMonthlyStats)
+class CompanyMonthlyStatsAdmin(admin.ModelAdmin):
+    list_display = ['month', 'company', 'users_joined', 'expenses', 'amount', 'approved', 'rejected']
+    list_filter = ['company']
+
+
+@admin.register(WorkerLease)
+class WorkerLeaseAdmin(admin.ModelAdmin):
+    list_display = ['name', 'owner', 'expires_at']
+
+
+class HolidayInline(admin.TabularInline):
+    model = Holiday
+    extra = 0
+
+
+@admin.register(BusinessCalendar)
+class BusinessCalendarAdmin(admin.ModelAdmin):
+    list_display = ['company', 'timezone', 'workday_start', 'workday_end', 'updated_at']
+    readonly_fields = ['updated_at']
+    inlines = [HolidayInline]
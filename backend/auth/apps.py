@@ -5,3 +5,6 @@ class AuthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'auth'
     label = 'expense_auth'  # Use a unique label to avoid conflicts
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
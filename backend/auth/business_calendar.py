@@ -0,0 +1,143 @@
+"""
+Business-hours calendar for approval SLAs
+
+A company's BusinessCalendar and holidays are compiled into a table of
+working days covering a horizon around today: each day's opening time in UTC,
+its length in minutes and the business minutes elapsed before it. Turning a
+submission time and an SLA into a deadline is then two bisects over that
+table instead of a walk through the days in between.
+
+Compiled calendars are kept in a VersionedCache per company, which signals
+invalidate whenever a calendar or holiday changes. Companies without a
+calendar count SLAs in wall-clock hours.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from django.utils import timezone
+
+from .models import BusinessCalendar
+from .versioned_cache import VersionedCache
+
+
+PAST_DAYS = 31  # Days before today covered by a compiled calendar
+HORIZON_DAYS = 730  # Days after today covered by a compiled calendar
+DEFAULT_SLA_HOURS = 48
+
+calendars = VersionedCache('business_calendar')  # company_id -> CompiledCalendar or None
+
+
+class CompiledCalendar:
+    """
+    Cumulative business-minute table for one calendar
+
+    ``opens[i]`` is when day i starts work (UTC), ``lengths[i]`` its working
+    minutes (zero on weekends and holidays) and ``ends[i]`` the business
+    minutes elapsed by the end of day i, counted from the first day.
+    """
+
+    def __init__(self, calendar, holidays, first_day, days):
+        self.zone = ZoneInfo(calendar.timezone)
+        self.first_day = first_day
+        holidays = set(holidays)
+        workdays = set(calendar.workdays)
+
+        self.opens = []
+        self.closes = []
+        self.lengths = []
+        self.ends = []
+        elapsed = 0
+        for offset in range(days):
+            day = first_day + timedelta(days=offset)
+            opens = datetime.combine(day, calendar.workday_start, tzinfo=self.zone).astimezone(ZoneInfo('UTC'))
+            closes = datetime.combine(day, calendar.workday_end, tzinfo=self.zone).astimezone(ZoneInfo('UTC'))
+            length = 0
+            if day.isoweekday() in workdays and day not in holidays:
+                length = int((closes - opens).total_seconds() // 60)
+            elapsed += length
+            self.opens.append(opens)
+            self.closes.append(closes)
+            self.lengths.append(length)
+            self.ends.append(elapsed)
+
+    @property
+    def last_day(self):
+        return self.first_day + timedelta(days=len(self.opens) - 1)
+
+    def covers(self, moment):
+        return self.first_day <= moment.astimezone(self.zone).date() <= self.last_day
+
+    def minutes_at(self, moment):
+        """
+        Business minutes elapsed from the first day up to moment
+        """
+        index = bisect_right(self.opens, moment) - 1
+        if index < 0:
+            return 0
+        into_day = (min(moment, self.closes[index]) - self.opens[index]).total_seconds() / 60
+        return self.ends[index] - self.lengths[index] + min(max(into_day, 0), self.lengths[index])
+
+    def deadline(self, start, hours):
+        """
+        The moment hours business hours after start, or None past the horizon
+        """
+        target = self.minutes_at(start) + hours * 60
+        index = bisect_left(self.ends, target)
+        if index >= len(self.ends):
+            return None
+        started = self.ends[index] - self.lengths[index]
+        return self.opens[index] + timedelta(minutes=target - started)
+
+
+def invalidate_calendar(company_id):
+    """
+    Drop the compiled calendar for a company in every process
+    """
+    calendars.invalidate(company_id)
+
+
+def compile_calendar(company_id, around=None, days=None):
+    """
+    Compile a company's calendar, or return None when it has none
+    """
+    calendar = BusinessCalendar.objects.filter(company_id=company_id).first()
+    if calendar is None:
+        return None
+    around = (around or timezone.now()).astimezone(ZoneInfo(calendar.timezone)).date()
+    first_day = around - timedelta(days=PAST_DAYS)
+    days = days or PAST_DAYS + HORIZON_DAYS
+    holidays = calendar.holidays.filter(
+        date__gte=first_day, date__lt=first_day + timedelta(days=days)
+    ).values_list('date', flat=True)
+    return CompiledCalendar(calendar, holidays, first_day, days)
+
+
+def get_calendar(company_id, at=None):
+    """
+    Get the compiled calendar for a company, rebuilding it when stale
+    """
+    return calendars.get(
+        company_id, lambda: compile_calendar(company_id, at),
+        usable=lambda compiled: compiled is None or at is None or compiled.covers(at)
+    )
+
+
+def escalation_deadline(company_id, rule=None, start=None):
+    """
+    When an expense submitted at start escalates under rule's SLA
+    """
+    start = start or timezone.now()
+    hours = rule.sla_hours if rule is not None else DEFAULT_SLA_HOURS
+    calendar = get_calendar(company_id, start)
+    if calendar is None:
+        return start + timedelta(hours=hours)
+
+    deadline = calendar.deadline(start, hours)
+    days = len(calendar.opens)
+    while deadline is None and calendar.ends[-1] > 0:
+        # Longer than the horizon: compile a wider table just for this lookup
+        days *= 2
+        calendar = compile_calendar(company_id, start, days)
+        deadline = calendar.deadline(start, hours)
+    return deadline or start + timedelta(hours=hours)
@@ -0,0 +1,31 @@
+"""
+System checks for the deployment settings this app depends on
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+# Backends shared between processes with an atomic add()
+SHARED_CACHE_BACKENDS = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Warn when the default cache cannot carry versions and locks between processes
+    """
+    if settings.DEBUG:
+        return []
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend in SHARED_CACHE_BACKENDS:
+        return []
+    return [Warning(
+        f"The default cache ({backend}) is not shared between processes with an atomic add().",
+        hint="Set CACHE_URL to a Redis or Memcached server; rule, calendar and dashboard "
+             "invalidation and the dashboard recompute lock rely on it.",
+        id='expense_auth.W001',
+    )]
@@ -0,0 +1,130 @@
+"""
+Response cache for the dashboard endpoints
+
+Dashboards are polled constantly while their data changes far less often.
+Responses are stored in the Django cache under a key holding generation
+counters for the company, user set and user they depend on. Any Expense,
+ApprovalRecord or User write bumps the counters of its company, set and
+user, so the next request misses and recomputes; superseded entries are
+never deleted, they just expire. Generations are versions as kept by
+versioned_cache, so a write in one process expires the responses cached by
+all of them.
+
+Concurrent misses for the same key are collapsed: the first request takes a
+short lock in the cache and computes the response, while the others wait
+for it to appear and only compute it themselves if it does not. The lock is
+a cache.add(), which only excludes other processes on a backend where add()
+is atomic: Redis or Memcached, as settings require outside development.
+"""
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .versioned_cache import bump_versions, read_versions
+
+
+DEFAULTS = {
+    'TIMEOUT': 300,  # Seconds a response is kept; new generations replace it sooner
+    'LOCK_TIMEOUT': 30,  # Seconds a request may hold the recompute lock
+    'WAIT_TIMEOUT': 5,  # Seconds a concurrent miss waits for the recompute
+    'WAIT_INTERVAL': 0.05,
+}
+
+GENERATION_KEY = 'dashboard:generation:{scope}:{id}'
+RESPONSE_KEY = 'dashboard:{view}:{user_id}:{day}:{generations}'
+
+
+def get_setting(name):
+    """
+    Read a DASHBOARD_CACHE setting, falling back to the module defaults
+    """
+    return getattr(settings, 'DASHBOARD_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def _generation_key(scope, scope_id):
+    return GENERATION_KEY.format(scope=scope, id=scope_id)
+
+
+def invalidate_dashboards(company_ids=(), user_set_ids=(), user_ids=()):
+    """
+    Bump the generations of the companies, sets and users whose data changed
+    """
+    keys = [_generation_key('company', pk) for pk in set(company_ids) if pk is not None]
+    keys += [_generation_key('set', pk) for pk in set(user_set_ids) if pk is not None]
+    keys += [_generation_key('user', pk) for pk in set(user_ids) if pk is not None]
+    bump_versions(keys)
+    # Bump again once the write is visible, so no request can cache a
+    # response computed from pre-commit rows under the new generation
+    transaction.on_commit(lambda: bump_versions(keys))
+
+
+def response_key(view_name, user, scopes):
+    """
+    The cache key of a dashboard response for user at the current generations
+    """
+    ids = {'company': user.company_id, 'set': user.user_set_id, 'user': user.pk}
+    keys = [_generation_key(scope, ids[scope]) for scope in scopes]
+    generations = read_versions(keys)
+    return RESPONSE_KEY.format(
+        view=view_name, user_id=user.pk, day=timezone.localdate().isoformat(),
+        generations='-'.join(str(generations[key]) for key in keys)
+    )
+
+
+def _compute(key, render):
+    # Only successful responses are cached
+    response = render()
+    if response.status_code == status.HTTP_200_OK:
+        cache.set(key, response.data, get_setting('TIMEOUT'))
+    return response
+
+
+def get_or_render(key, render):
+    """
+    Get a cached response body, or render it once however many requests miss at the same time
+    """
+    data = cache.get(key)
+    if data is not None:
+        return Response(data, status=status.HTTP_200_OK)
+
+    lock_key = f'{key}:lock'
+    # Atomic on Redis and Memcached: exactly one request wins the lock
+    if cache.add(lock_key, 1, get_setting('LOCK_TIMEOUT')):
+        try:
+            return _compute(key, render)
+        finally:
+            cache.delete(lock_key)
+
+    # Another request is rendering this response: wait for it
+    deadline = time.monotonic() + get_setting('WAIT_TIMEOUT')
+    while time.monotonic() < deadline:
+        time.sleep(get_setting('WAIT_INTERVAL'))
+        data = cache.get(key)
+        if data is not None:
+            return Response(data, status=status.HTTP_200_OK)
+        if cache.get(lock_key) is None:
+            # It failed or gave an error response; render our own
+            break
+    return _compute(key, render)
+
+
+def cached_dashboard(*scopes):
+    """
+    Serve a dashboard view from the cache until one of its generations changes
+
+    scopes are the generations the response depends on, from 'company', 'set'
+    and 'user'; responses are always cached per requesting user and day.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = response_key(view.__name__, request.user, scopes)
+            return get_or_render(key, lambda: view(request, *args, **kwargs))
+        return wrapper
+    return decorator
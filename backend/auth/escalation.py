@@ -0,0 +1,164 @@
+"""
+Escalation scheduler for the escalation_worker command
+
+Instead of rescanning the expense table every hour, the scheduler keeps a
+min-heap of the escalation dates due before its next resync and sleeps until
+the earliest one. New submissions are picked up from a change feed: a range
+read on the primary key above the highest id already seen, which costs one
+index lookup per poll while nothing is happening.
+
+The feed can miss a row that commits out of primary key order, or whose
+escalation_date is set after the row was first read; the periodic resync,
+which rebuilds the heap from the escalation index, catches those.
+
+Any number of workers can run. On databases with SKIP LOCKED they all fire
+and split the overdue rows between them; elsewhere they share the
+``escalation`` lease and only its holder fires, the others standing by
+until it expires.
+"""
+import heapq
+import threading
+from datetime import timedelta
+
+from django.db import close_old_connections, models
+from django.utils import timezone
+
+from .leases import acquire_lease, can_skip_locked, default_owner, release_lease
+from .models import Expense
+from .workflow import ESCALATION_CHUNK_SIZE, OPEN_STATUSES, escalate_overdue_expenses
+
+
+POLL_INTERVAL = 5  # Seconds between change feed reads
+RESYNC_INTERVAL = 300  # Seconds between full reloads of the heap
+ESCALATION_LEASE = 'escalation'
+LEASE_TTL = 60  # Seconds a worker holds the lease without renewing it
+
+
+class EscalationScheduler:
+    """
+    Fires escalations at their escalation_date from an in-memory heap
+    """
+
+    def __init__(self, poll_interval=POLL_INTERVAL, resync_interval=RESYNC_INTERVAL,
+                 chunk_size=ESCALATION_CHUNK_SIZE, on_escalated=None, owner=None):
+        self.poll_interval = poll_interval
+        self.resync_interval = timedelta(seconds=resync_interval)
+        self.chunk_size = chunk_size
+        self.on_escalated = on_escalated
+        self.owner = owner or default_owner()
+        self.lease_ttl = max(LEASE_TTL, 3 * poll_interval)
+        self.lease_expires = None
+        self.heap = []
+        self.due = {}  # expense id -> escalation date currently in the heap
+        self.cursor = 0
+        self.next_resync = None
+        self.stopped = threading.Event()
+
+    def schedule(self, expense_id, escalation_date):
+        if escalation_date is None or escalation_date >= self.next_resync:
+            return
+        if self.due.get(expense_id) == escalation_date:
+            return
+        self.due[expense_id] = escalation_date
+        heapq.heappush(self.heap, (escalation_date, expense_id))
+
+    def resync(self, now):
+        """
+        Rebuild the heap from every open expense due before the next resync
+        """
+        # Read the cursor first so rows created during the load come through the feed
+        self.cursor = Expense.objects.aggregate(last=models.Max('pk'))['last'] or 0
+        self.next_resync = now + self.resync_interval
+        self.heap = []
+        self.due = {}
+        upcoming = Expense.objects.filter(
+            escalated=False, escalation_date__lt=self.next_resync, status__in=OPEN_STATUSES
+        ).values_list('pk', 'escalation_date')
+        for expense_id, escalation_date in upcoming.iterator(chunk_size=self.chunk_size):
+            self.schedule(expense_id, escalation_date)
+
+    def poll(self):
+        """
+        Schedule expenses created since the last poll
+        """
+        created = Expense.objects.filter(pk__gt=self.cursor).order_by('pk').values_list(
+            'pk', 'escalation_date', 'escalated', 'status'
+        )
+        for expense_id, escalation_date, escalated, expense_status in created.iterator(chunk_size=self.chunk_size):
+            self.cursor = expense_id
+            if not escalated and expense_status in OPEN_STATUSES:
+                self.schedule(expense_id, escalation_date)
+
+    def fire_due(self, now):
+        """
+        Escalate every scheduled expense whose escalation date has passed
+
+        Expenses approved or rejected since they were scheduled no longer
+        match escalate_overdue_expenses and are skipped there.
+        """
+        fired = []
+        while self.heap and self.heap[0][0] <= now:
+            escalation_date, expense_id = heapq.heappop(self.heap)
+            if self.due.get(expense_id) != escalation_date:
+                continue
+            del self.due[expense_id]
+            fired.append((expense_id, escalation_date))
+
+        escalated_ids = []
+        for start in range(0, len(fired), self.chunk_size):
+            batch = fired[start:start + self.chunk_size]
+            escalated_ids += escalate_overdue_expenses(
+                now, self.chunk_size, expense_ids=[expense_id for expense_id, _ in batch]
+            )
+        if escalated_ids and self.on_escalated:
+            dates = dict(fired)
+            self.on_escalated(escalated_ids, max(now - dates[expense_id] for expense_id in escalated_ids))
+        return escalated_ids
+
+    def holds_lease(self, now):
+        if can_skip_locked():
+            return True
+        # Renew once half the lease has run out rather than on every pass
+        if self.lease_expires and now < self.lease_expires - timedelta(seconds=self.lease_ttl / 2):
+            return True
+        if acquire_lease(ESCALATION_LEASE, self.owner, self.lease_ttl, now):
+            self.lease_expires = now + timedelta(seconds=self.lease_ttl)
+            return True
+        self.lease_expires = None
+        return False
+
+    def run_once(self, now=None):
+        """
+        Resync or poll, fire what is due and return the seconds to sleep
+        """
+        now = now or timezone.now()
+        if not self.holds_lease(now):
+            # Standing by; start from a fresh heap if the lease comes our way
+            self.next_resync = None
+            return self.poll_interval
+        if self.next_resync is None or now >= self.next_resync:
+            self.resync(now)
+        else:
+            self.poll()
+        self.fire_due(now)
+
+        wake_at = self.next_resync
+        if self.heap:
+            wake_at = min(wake_at, self.heap[0][0])
+        return max(0.0, min(self.poll_interval, (wake_at - now).total_seconds()))
+
+    def run(self):
+        while not self.stopped.is_set():
+            close_old_connections()
+            try:
+                wait = self.run_once()
+            except Exception as e:
+                print(f"Error running escalation scheduler: {e}")
+                # The heap may be half built; reload it on the next pass
+                self.next_resync = None
+                wait = self.poll_interval
+            self.stopped.wait(wait)
+        release_lease(ESCALATION_LEASE, self.owner)
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,405 @@
+"""
+Exchange rate store for currency conversion
+
+Rates live in the ExchangeRate table, are written in bulk by the
+refresh_exchange_rates management command and are served to the request path
+from an in-process TTL/LRU cache, so a conversion costs a dictionary lookup or
+at most one indexed query and never an HTTP round trip. Cached entries are
+keyed on a shared rates version (see versioned_cache) that every rate write
+bumps, so a refresh in one process reaches all of them at once, pairs
+found missing included.
+"""
+import csv
+import json
+import threading
+import time
+from collections import OrderedDict
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal, ROUND_HALF_UP
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import http_client
+from .models import ExchangeRate
+from .versioned_cache import bump_versions, read_version
+
+
+DEFAULTS = {
+    'PROVIDER': 'auth.exchange_rates.ExchangeRateAPIProvider',
+    'PROVIDER_OPTIONS': {},
+    'BASE_CURRENCIES': ['USD'],
+    'CACHE_TTL': 3600,
+    'CACHE_MAXSIZE': 1024,
+}
+
+RATES_VERSION_KEY = 'exchange_rates:version'
+
+_MISSING = object()
+
+
+def get_setting(name):
+    """
+    Read an EXCHANGE_RATES setting, falling back to the module defaults
+    """
+    return getattr(settings, 'EXCHANGE_RATES', {}).get(name, DEFAULTS[name])
+
+
+class RateCache:
+    """
+    Thread-safe TTL/LRU cache that loads each missing key only once
+
+    Concurrent misses for the same key wait on a per-key lock while the
+    first caller runs the loader, then read the value it stored.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another thread may have finished loading while we waited
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            try:
+                value = loader()
+                self.set(key, value)
+                return value
+            finally:
+                with self._lock:
+                    self._key_locks.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ExchangeRateAPIProvider:
+    """
+    Rate provider backed by exchangerate-api.com
+    """
+    url = 'https://api.exchangerate-api.com/v4/latest/{base}'
+
+    def __init__(self, url=None, timeout=None):
+        self.url = url or self.url
+        self.timeout = timeout
+
+    def fetch(self, base_currency):
+        data = http_client.get_json(self.url.format(base=base_currency), timeout=self.timeout)
+        return {
+            'base': data.get('base', base_currency),
+            'as_of': timezone.now(),
+            'rates': {code: Decimal(str(rate)) for code, rate in data['rates'].items()},
+        }
+
+
+class FileRateProvider:
+    """
+    Rate provider reading a local JSON or CSV file
+
+    JSON files use the exchangerate-api payload shape (``base``, ``date``,
+    ``rates``), either as a single object or a list of them. CSV files need
+    ``base``, ``currency`` and ``rate`` columns and may add a ``date`` column.
+    Files holding several dates per base can seed the rate history.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def _read_tables(self):
+        if self.path.suffix.lower() == '.csv':
+            tables = {}
+            with self.path.open(newline='') as handle:
+                for row in csv.DictReader(handle):
+                    key = (row['base'], row.get('date') or None)
+                    table = tables.setdefault(key, {'base': row['base'], 'date': key[1], 'rates': {}})
+                    table['rates'][row['currency']] = row['rate']
+            return list(tables.values())
+
+        with self.path.open() as handle:
+            data = json.load(handle)
+        return data if isinstance(data, list) else [data]
+
+    def _to_payload(self, table):
+        as_of = timezone.now()
+        if table.get('date'):
+            as_of = timezone.make_aware(datetime.combine(date.fromisoformat(table['date']), dt_time.min))
+        return {
+            'base': table['base'],
+            'as_of': as_of,
+            'rates': {code: Decimal(str(rate)) for code, rate in table['rates'].items()},
+        }
+
+    def fetch_history(self, base_currency):
+        tables = [table for table in self._read_tables() if table.get('base') == base_currency]
+        return sorted((self._to_payload(table) for table in tables), key=lambda payload: payload['as_of'])
+
+    def fetch(self, base_currency):
+        history = self.fetch_history(base_currency)
+        if not history:
+            raise LookupError(f"No rates for {base_currency} in {self.path}")
+        return history[-1]
+
+
+class StaticRateProvider:
+    """
+    In-memory rate provider for tests and offline development
+
+    ``rates`` maps a base currency to a ``{target: rate}`` dictionary.
+    """
+
+    def __init__(self, rates=None, as_of=None):
+        self.rates = rates or {}
+        self.as_of = as_of
+
+    def fetch(self, base_currency):
+        if base_currency not in self.rates:
+            raise LookupError(f"No rates configured for {base_currency}")
+        return {
+            'base': base_currency,
+            'as_of': self.as_of or timezone.now(),
+            'rates': {code: Decimal(str(rate)) for code, rate in self.rates[base_currency].items()},
+        }
+
+
+def get_provider(path=None, options=None):
+    """
+    Instantiate the configured exchange rate provider, or the one at path
+    """
+    provider_class = import_string(path or get_setting('PROVIDER'))
+    return provider_class(**(options if options is not None else get_setting('PROVIDER_OPTIONS')))
+
+
+rate_cache = RateCache(maxsize=get_setting('CACHE_MAXSIZE'), ttl=get_setting('CACHE_TTL'))
+
+RATE_SCALE = 10 ** 8  # ExchangeRate.rate has 8 decimal places
+CENT = Decimal('0.01')
+
+
+class RateSeries:
+    """
+    Daily rate time series for one currency pair
+
+    Dates are kept as ordinals and rates as integers scaled by RATE_SCALE in
+    two compact arrays, so a lookup is a bisect plus an exact Decimal rebuild.
+    """
+
+    def __init__(self, points=()):
+        self.days = array('i')
+        self.rates = array('q')
+        for rate_date, rate in points:
+            self.days.append(rate_date.toordinal())
+            self.rates.append(int(rate * RATE_SCALE))
+
+    def __len__(self):
+        return len(self.days)
+
+    def rate_on(self, on_date=None):
+        """
+        Rate in effect on a date: the latest one published on or before it,
+        or the earliest known rate for dates before the series starts
+        """
+        if not self.days:
+            return None
+        if on_date is None:
+            index = len(self.days) - 1
+        else:
+            index = max(bisect_right(self.days, on_date.toordinal()) - 1, 0)
+        return Decimal(self.rates[index]) / RATE_SCALE
+
+
+class PairRates:
+    """
+    Resolves the rate for a currency pair on any date
+
+    A direct series wins, then the inverse series, then a cross rate through
+    one of the configured base currencies.
+    """
+
+    def __init__(self, direct=None, inverse=None, cross=None):
+        self.direct = direct
+        self.inverse = inverse
+        self.cross = cross
+
+    def rate_on(self, on_date=None):
+        if self.direct:
+            return self.direct.rate_on(on_date)
+        if self.inverse:
+            return Decimal('1') / self.inverse.rate_on(on_date)
+        if self.cross:
+            from_series, to_series = self.cross
+            return to_series.rate_on(on_date) / from_series.rate_on(on_date)
+        return None
+
+
+def save_rates(base_currency, rates, as_of, rate_date=None):
+    """
+    Bulk upsert a base currency's rate table for one day in a single statement
+    """
+    rate_date = rate_date or as_of.date()
+    rows = [
+        ExchangeRate(base_currency=base_currency, target_currency=code, rate=rate, rate_date=rate_date, as_of=as_of)
+        for code, rate in rates.items()
+        if code != base_currency
+    ]
+    ExchangeRate.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['base_currency', 'target_currency', 'rate_date'],
+        update_fields=['rate', 'as_of', 'updated_at'],
+    )
+    invalidate_rates()
+    return len(rows)
+
+
+def invalidate_rates():
+    """
+    Drop the cached pairs and rate tables in every process
+    """
+    rate_cache.clear()
+    bump_versions([RATES_VERSION_KEY])
+    # Bump again once the rows are visible, so no process caches a pair
+    # loaded before the commit under the new version
+    transaction.on_commit(lambda: bump_versions([RATES_VERSION_KEY]))
+
+
+def _load_pair(from_currency, to_currency):
+    """
+    Load every series needed to convert a pair with a single query
+    """
+    bases = get_setting('BASE_CURRENCIES')
+    rows = ExchangeRate.objects.filter(
+        Q(base_currency=from_currency, target_currency=to_currency) |
+        Q(base_currency=to_currency, target_currency=from_currency) |
+        Q(base_currency__in=bases, target_currency__in=[from_currency, to_currency])
+    ).order_by('rate_date').values_list('base_currency', 'target_currency', 'rate_date', 'rate')
+
+    points = {}
+    for base, target, rate_date, rate in rows:
+        points.setdefault((base, target), []).append((rate_date, rate))
+    series = {key: RateSeries(values) for key, values in points.items()}
+
+    if (from_currency, to_currency) in series:
+        return PairRates(direct=series[(from_currency, to_currency)])
+    if (to_currency, from_currency) in series:
+        return PairRates(inverse=series[(to_currency, from_currency)])
+    for base in bases:
+        if (base, from_currency) in series and (base, to_currency) in series:
+            return PairRates(cross=(series[(base, from_currency)], series[(base, to_currency)]))
+    return PairRates()
+
+
+def _rate(from_currency, to_currency, on_date, version):
+    if from_currency == to_currency:
+        return Decimal('1')
+    pair = rate_cache.get_or_load(
+        (version, from_currency, to_currency),
+        lambda: _load_pair(from_currency, to_currency)
+    )
+    return pair.rate_on(on_date)
+
+
+def get_rate(from_currency, to_currency, on_date=None):
+    """
+    Get the rate converting one unit of from_currency into to_currency,
+    as of on_date (or the latest known rate)
+    """
+    return _rate(from_currency, to_currency, on_date, read_version(RATES_VERSION_KEY))
+
+
+def convert(amount, from_currency, to_currency, on_date=None):
+    """
+    Convert an amount at the rate in effect on on_date, rounded to cents
+
+    Returns None when no rate is known for the pair.
+    """
+    return _apply_rate(amount, get_rate(from_currency, to_currency, on_date))
+
+
+def _apply_rate(amount, rate):
+    if rate is None:
+        return None
+    return (Decimal(str(amount)) * rate).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def convert_many(rows):
+    """
+    Convert an iterable of (amount, from_currency, to_currency, on_date) tuples
+
+    Returns a (converted amount, rate) pair per row, both None when no rate
+    is known. Each distinct pair costs at most one query, after which every
+    row is a bisect over the cached series, so backfills and reports do no
+    per-row I/O.
+    """
+    version = read_version(RATES_VERSION_KEY)
+    results = []
+    for amount, from_currency, to_currency, on_date in rows:
+        rate = _rate(from_currency, to_currency, on_date, version)
+        results.append((_apply_rate(amount, rate), rate))
+    return results
+
+
+def _load_rate_table(base_currency):
+    """
+    Load the most recent stored rates for a base currency
+    """
+    latest = ExchangeRate.objects.filter(base_currency=base_currency).aggregate(latest=Max('rate_date'))['latest']
+    rates = {base_currency: Decimal('1')}
+    as_of = None
+    if latest:
+        rows = ExchangeRate.objects.filter(
+            base_currency=base_currency,
+            rate_date=latest
+        ).values_list('target_currency', 'rate', 'as_of')
+        for target, rate, row_as_of in rows:
+            rates[target] = rate
+            as_of = max(as_of, row_as_of) if as_of else row_as_of
+    return {'base': base_currency, 'as_of': as_of, 'rates': rates}
+
+
+def get_rate_table(base_currency):
+    """
+    Get all stored rates for a base currency
+    """
+    version = read_version(RATES_VERSION_KEY)
+    return rate_cache.get_or_load((version, 'table', base_currency), lambda: _load_rate_table(base_currency))
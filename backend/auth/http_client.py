@@ -0,0 +1,185 @@
+"""
+Shared outbound HTTP client for calls to third-party services
+
+Every outbound request goes through one pooled keep-alive session with
+per-host timeouts, bounded retries with jittered backoff and a per-host
+circuit breaker, so a slow or failing provider cannot hold WSGI workers for
+its full timeout on every call.
+"""
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'TIMEOUT': (3.05, 10),  # (connect, read) seconds
+    'HOST_TIMEOUTS': {},
+    'MAX_RETRIES': 2,
+    'BACKOFF_BASE': 0.2,
+    'BACKOFF_MAX': 2.0,
+    'POOL_CONNECTIONS': 10,
+    'POOL_MAXSIZE': 20,
+    'BREAKER_FAILURE_THRESHOLD': 5,
+    'BREAKER_RESET_TIMEOUT': 30,
+}
+
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class UpstreamError(Exception):
+    """Raised when an outbound request fails after all retries"""
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised without calling the upstream while its circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls fail fast. Once ``reset_timeout`` seconds have passed a single trial
+    call is let through; success closes the circuit, failure re-opens it.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class OutboundClient:
+    """
+    Pooled HTTP client with timeouts, retries and circuit breaking
+    """
+
+    def __init__(self, config=None):
+        self.config = dict(DEFAULTS, **(config or {}))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.config['POOL_CONNECTIONS'],
+            pool_maxsize=self.config['POOL_MAXSIZE'],
+            max_retries=0,
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker_for(self, host):
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(
+                    self.config['BREAKER_FAILURE_THRESHOLD'],
+                    self.config['BREAKER_RESET_TIMEOUT'],
+                )
+            return self._breakers[host]
+
+    def timeout_for(self, host):
+        return self.config['HOST_TIMEOUTS'].get(host, self.config['TIMEOUT'])
+
+    def _backoff(self, attempt):
+        # Full jitter keeps retries from many workers from arriving in lockstep
+        ceiling = min(self.config['BACKOFF_MAX'], self.config['BACKOFF_BASE'] * (2 ** attempt))
+        time.sleep(random.uniform(0, ceiling))
+
+    def request(self, method, url, timeout=None, **kwargs):
+        host = urlsplit(url).hostname
+        breaker = self.breaker_for(host)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {host}")
+
+        timeout = timeout or self.timeout_for(host)
+        max_retries = self.config['MAX_RETRIES']
+        last_error = None
+        for attempt in range(max_retries + 1):
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+                logger.warning("Outbound %s %s failed (attempt %s): %s", method, host, attempt + 1, e)
+            except requests.RequestException as e:
+                # Not worth retrying, but still a failure: a half-open trial must re-open the circuit
+                breaker.record_failure()
+                raise UpstreamError(f"{method} {url} failed: {e}") from e
+            else:
+                if response.status_code in RETRY_STATUSES and attempt < max_retries:
+                    logger.warning("Outbound %s %s returned %s (attempt %s)", method, host, response.status_code, attempt + 1)
+                elif response.status_code >= 500:
+                    breaker.record_failure()
+                    return response
+                else:
+                    breaker.record_success()
+                    return response
+            if attempt < max_retries:
+                self._backoff(attempt)
+
+        breaker.record_failure()
+        raise UpstreamError(f"{method} {url} failed after {max_retries + 1} attempts: {last_error}") from last_error
+
+    def get_json(self, url, **kwargs):
+        response = self.request('GET', url, **kwargs)
+        try:
+            response.raise_for_status()
+        except requests.HTTPError as e:
+            raise UpstreamError(str(e)) from e
+        return response.json()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Get the process-wide outbound client configured from OUTBOUND_HTTP
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OutboundClient(getattr(settings, 'OUTBOUND_HTTP', {}))
+    return _client
+
+
+def get_json(url, **kwargs):
+    """
+    GET a JSON document through the shared outbound client
+    """
+    return get_client().get_json(url, **kwargs)
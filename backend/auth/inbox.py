@@ -0,0 +1,115 @@
+"""
+Materialized approval inbox
+
+ApprovalInbox holds one row per open expense waiting at the manager or admin
+stage, scoped by the submitter's set (manager stage) or the company (admin
+stage), so pending lists and badge counts are a range scan over one index
+instead of a join over Expense and User. Rows are written whenever an
+expense is created, saved or moved through the workflow; rebuild_inbox
+reconciles the table from Expense after a crash or a bulk data fix.
+"""
+from .models import ApprovalInbox, Expense
+
+
+INBOX_STAGES = ['manager', 'admin']
+OPEN_STATUSES = ['pending', 'in_progress']
+INBOX_FIELDS = ['company', 'stage', 'user_set', 'submission_date']
+
+
+def _belongs_in_inbox(expense):
+    return expense.status in OPEN_STATUSES and expense.current_stage in INBOX_STAGES
+
+
+def _entry_for(expense):
+    return ApprovalInbox(
+        expense_id=expense.pk,
+        company_id=expense.company_id,
+        stage=expense.current_stage,
+        user_set_id=expense.user.user_set_id,
+        submission_date=expense.submission_date,
+    )
+
+
+def upsert_entries(entries):
+    """
+    Insert inbox rows, or move the existing row of each expense
+    """
+    ApprovalInbox.objects.bulk_create(
+        entries, update_conflicts=True, unique_fields=['expense'], update_fields=INBOX_FIELDS
+    )
+
+
+def sync_inbox(expenses):
+    """
+    Add, move or remove the inbox rows for expenses after they changed
+
+    Costs one upsert and one delete however many expenses are passed.
+    """
+    expenses = list(expenses)
+    entries = [_entry_for(expense) for expense in expenses if _belongs_in_inbox(expense)]
+    closed = [expense.pk for expense in expenses if not _belongs_in_inbox(expense)]
+    if entries:
+        upsert_entries(entries)
+    if closed:
+        ApprovalInbox.objects.filter(expense_id__in=closed).delete()
+
+
+def move_user_inbox(user):
+    """
+    Re-scope a user's open expenses after they moved to another set
+    """
+    ApprovalInbox.objects.filter(expense__user=user).update(user_set=user.user_set_id)
+
+
+def inbox_for(user):
+    """
+    Get the inbox rows waiting for the user's approval
+    """
+    if user.role == 'manager':
+        return ApprovalInbox.objects.filter(user_set_id=user.user_set_id, stage='manager')
+    if user.role == 'admin':
+        return ApprovalInbox.objects.filter(company_id=user.company_id, stage='admin')
+    return ApprovalInbox.objects.none()
+
+
+def rebuild_inbox(company=None, chunk_size=2000):
+    """
+    Reconcile ApprovalInbox with Expense
+
+    Returns the number of rows added or corrected and the number removed.
+    """
+    expenses = Expense.objects.filter(status__in=OPEN_STATUSES, current_stage__in=INBOX_STAGES)
+    entries = ApprovalInbox.objects.all()
+    if company is not None:
+        expenses = expenses.filter(company=company)
+        entries = entries.filter(company=company)
+
+    existing = {
+        entry[0]: entry[1:]
+        for entry in entries.values_list('expense_id', 'company_id', 'stage', 'user_set_id', 'submission_date')
+    }
+    wanted = expenses.values_list('pk', 'company_id', 'current_stage', 'user__user_set_id', 'submission_date')
+
+    fixed = 0
+    batch = []
+    for pk, company_id, stage, user_set_id, submission_date in wanted.iterator(chunk_size=chunk_size):
+        row = (company_id, stage, user_set_id, submission_date)
+        if existing.pop(pk, None) == row:
+            continue
+        batch.append(ApprovalInbox(
+            expense_id=pk, company_id=company_id, stage=stage,
+            user_set_id=user_set_id, submission_date=submission_date
+        ))
+        if len(batch) >= chunk_size:
+            upsert_entries(batch)
+            fixed += len(batch)
+            batch = []
+    if batch:
+        upsert_entries(batch)
+        fixed += len(batch)
+
+    # Whatever is left is in the inbox but no longer waiting for approval
+    stale = list(existing)
+    for start in range(0, len(stale), chunk_size):
+        ApprovalInbox.objects.filter(expense_id__in=stale[start:start + chunk_size]).delete()
+    return fixed, len(stale)
@@ -0,0 +1,56 @@
+"""
+Database leases for work that more than one node may be running
+
+A lease is a WorkerLease row naming its owner and an expiry. The owner
+renews it while it works; when the owner dies the lease expires and another
+node takes over. Taking and renewing are single conditional UPDATEs, so two
+nodes can never both believe they hold the same lease.
+"""
+import os
+import socket
+from datetime import timedelta
+
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+
+from .models import WorkerLease
+
+
+def default_owner():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def acquire_lease(name, owner, ttl, now=None):
+    """
+    Take the named lease, or renew it if the owner already holds it
+
+    Returns True when the owner holds the lease for the next ttl seconds.
+    """
+    now = now or timezone.now()
+    expires_at = now + timedelta(seconds=ttl)
+    taken = WorkerLease.objects.filter(name=name).filter(
+        models.Q(owner=owner) | models.Q(expires_at__lte=now)
+    ).update(owner=owner, expires_at=expires_at)
+    if taken:
+        return True
+    try:
+        with transaction.atomic():
+            WorkerLease.objects.create(name=name, owner=owner, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        # Held by someone else, or created by another node just now
+        return False
+
+
+def release_lease(name, owner):
+    """
+    Give up the named lease if the owner holds it
+    """
+    WorkerLease.objects.filter(name=name, owner=owner).delete()
+
+
+def can_skip_locked():
+    """
+    Whether workers can split rows with SELECT ... FOR UPDATE SKIP LOCKED
+    """
+    return transaction.get_connection().features.has_select_for_update_skip_locked
@@ -0,0 +1,73 @@
+"""
+Django management command to fill exchange_rate and base_amount on expenses
+Run this once after upgrading, and again after loading older rate history
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from auth.dashboard_cache import invalidate_dashboards
+from auth.models import Expense
+from auth.rollups import FACT_FIELDS, StatsDelta, fact
+from auth.workflow import COMPANY_CURRENCY, get_base_currency_fields
+
+
+class Command(BaseCommand):
+    help = 'Backfill exchange_rate and base_amount on existing expenses in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows loaded and updated per batch')
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Recompute every expense instead of only rows missing a conversion'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        expenses = Expense.objects.all()
+        if not options['all']:
+            expenses = expenses.filter(
+                Q(base_amount__isnull=True) | Q(exchange_rate__isnull=True)
+            )
+
+        started = time.monotonic()
+        updated = 0
+        unconverted = 0
+        last_id = 0
+        while True:
+            # Keyset pagination keeps every batch an indexed range scan
+            rows = list(
+                expenses.filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'amount', 'currency', 'expense_date', *FACT_FIELDS)[:chunk_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            batch = []
+            # bulk_update skips the signals, so move the rollups and expire the dashboards here
+            delta = StatsDelta()
+            for expense_id, amount, currency, expense_date, *stored in rows:
+                fields = get_base_currency_fields(amount, currency, expense_date, COMPANY_CURRENCY)
+                if fields['exchange_rate'] is None:
+                    unconverted += 1
+                batch.append(Expense(id=expense_id, **fields))
+                converted = dict(zip(FACT_FIELDS, stored), base_amount=fields['base_amount'])
+                delta.move(fact(*stored), fact(*converted.values()))
+            with transaction.atomic():
+                Expense.objects.bulk_update(batch, ['exchange_rate', 'base_amount'])
+                delta.apply()
+                # The first three fact fields are the company, set and user
+                invalidate_dashboards([row[4] for row in rows], [row[5] for row in rows], [row[6] for row in rows])
+            updated += len(batch)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(f'Backfilled {updated} expenses in {elapsed:.1f}s')
+        )
+        if unconverted:
+            self.stdout.write(
+                self.style.WARNING(f'{unconverted} expenses have no stored rate and keep their original amount')
+            )
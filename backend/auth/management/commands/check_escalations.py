@@ -2,21 +2,48 @@
 Django management command to check for expense escalations
 Run this command via cron job every hour
 """
+import time
+
 from django.core.management.base import BaseCommand
-from auth.workflow import check_escalations
+from auth.escalation import ESCALATION_LEASE
+from auth.leases import acquire_lease, can_skip_locked, default_owner, release_lease
+from auth.workflow import ESCALATION_CHUNK_SIZE, escalate_overdue_expenses
+
+LEASE_TTL = 900  # Seconds; longer than any single run
 
 
 class Command(BaseCommand):
     help = 'Check for expenses that need escalation'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=ESCALATION_CHUNK_SIZE,
+                            help='Expenses escalated per transaction')
+
     def handle(self, *args, **options):
-        escalated_count = check_escalations()
-        
-        if escalated_count > 0:
+        chunk_size = options['chunk_size']
+        # Without SKIP LOCKED, hosts running this on the same schedule take turns
+        owner = None if can_skip_locked() else default_owner()
+        if owner and not acquire_lease(ESCALATION_LEASE, owner, LEASE_TTL):
+            self.stdout.write(self.style.WARNING('Another worker holds the escalation lease; skipping this run'))
+            return
+
+        started = time.perf_counter()
+        try:
+            escalated_ids = escalate_overdue_expenses(chunk_size=chunk_size)
+        finally:
+            if owner:
+                release_lease(ESCALATION_LEASE, owner)
+        elapsed = time.perf_counter() - started
+
+        if escalated_ids:
+            chunks = -(-len(escalated_ids) // chunk_size)
             self.stdout.write(
-                self.style.SUCCESS(f'Successfully escalated {escalated_count} expenses')
+                self.style.SUCCESS(
+                    f'Successfully escalated {len(escalated_ids)} expenses in {elapsed:.2f}s '
+                    f'({len(escalated_ids) / elapsed:.0f} expenses/s, {chunks} chunks of up to {chunk_size})'
+                )
             )
         else:
             self.stdout.write(
-                self.style.SUCCESS('No expenses needed escalation')
+                self.style.SUCCESS(f'No expenses needed escalation ({elapsed:.2f}s)')
             )
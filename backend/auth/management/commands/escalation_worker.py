@@ -0,0 +1,42 @@
+"""
+Django management command that escalates expenses as they become overdue
+Run as a long-lived process (systemd, supervisord) instead of the hourly check_escalations cron job
+"""
+import signal
+
+from django.core.management.base import BaseCommand
+from auth.escalation import POLL_INTERVAL, RESYNC_INTERVAL, EscalationScheduler
+from auth.workflow import ESCALATION_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Escalate expenses at their escalation date'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL,
+                            help='Seconds between reads of new submissions')
+        parser.add_argument('--resync-interval', type=float, default=RESYNC_INTERVAL,
+                            help='Seconds between full reloads of the schedule')
+        parser.add_argument('--chunk-size', type=int, default=ESCALATION_CHUNK_SIZE,
+                            help='Expenses escalated per transaction')
+
+    def handle(self, *args, **options):
+        scheduler = EscalationScheduler(
+            poll_interval=options['poll_interval'],
+            resync_interval=options['resync_interval'],
+            chunk_size=options['chunk_size'],
+            on_escalated=self.report,
+        )
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: scheduler.stop())
+
+        self.stdout.write(self.style.SUCCESS('Escalation worker started'))
+        scheduler.run()
+        self.stdout.write(self.style.SUCCESS('Escalation worker stopped'))
+
+    def report(self, escalated_ids, delay):
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Escalated {len(escalated_ids)} expenses ({delay.total_seconds():.1f}s after their escalation date)'
+            )
+        )
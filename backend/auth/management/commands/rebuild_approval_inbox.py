@@ -0,0 +1,30 @@
+"""
+Django management command to reconcile the approval inbox with expenses
+Run after a crash, a restore or any bulk change made outside the workflow
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from auth.inbox import rebuild_inbox
+from auth.models import Company
+
+
+class Command(BaseCommand):
+    help = 'Rebuild ApprovalInbox rows from open expenses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help='Only rebuild this company id')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows written per statement')
+
+    def handle(self, *args, **options):
+        company = None
+        if options['company'] is not None:
+            try:
+                company = Company.objects.get(pk=options['company'])
+            except Company.DoesNotExist:
+                raise CommandError(f"Company {options['company']} not found")
+
+        with transaction.atomic():
+            fixed, removed = rebuild_inbox(company, options['chunk_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Approval inbox rebuilt: {fixed} added or corrected, {removed} removed'))
@@ -0,0 +1,30 @@
+"""
+Django management command to recompute the daily and monthly rollups
+Run after a crash, a restore or any bulk change made outside the workflow
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from auth.models import Company
+from auth.rollups import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild ExpenseDailyStats and CompanyMonthlyStats rows from expenses and users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help='Only rebuild this company id')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows read and written per statement')
+
+    def handle(self, *args, **options):
+        company = None
+        if options['company'] is not None:
+            try:
+                company = Company.objects.get(pk=options['company'])
+            except Company.DoesNotExist:
+                raise CommandError(f"Company {options['company']} not found")
+
+        with transaction.atomic():
+            daily, monthly = rebuild_stats(company, options['chunk_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Expense rollup rebuilt: {daily} daily rows, {monthly} monthly rows'))
@@ -0,0 +1,21 @@
+"""
+Django management command to refresh the stored countries/currencies snapshot
+The data changes very rarely, so running this weekly (or after a deploy) is enough
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from auth.reference_data import refresh_countries_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Fetch countries and currencies from restcountries.com and store a local snapshot'
+
+    def handle(self, *args, **options):
+        try:
+            snapshot = refresh_countries_snapshot()
+        except Exception as e:
+            raise CommandError(f'Failed to refresh countries snapshot: {e}')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Stored countries snapshot ({len(snapshot.payload)} bytes, etag {snapshot.etag[:12]})')
+        )
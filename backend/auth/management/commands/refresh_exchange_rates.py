@@ -0,0 +1,57 @@
+"""
+Django management command to refresh stored exchange rates
+Run this command via cron job (e.g. every few hours) so that currency
+conversion never has to call the rate provider on the request path
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from auth.exchange_rates import get_provider, get_setting, save_rates
+
+
+class Command(BaseCommand):
+    help = 'Fetch exchange rates for the configured base currencies and store them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base', action='append', dest='bases',
+            help='Base currency to refresh (repeatable, defaults to EXCHANGE_RATES BASE_CURRENCIES)'
+        )
+        parser.add_argument('--provider', help='Dotted path of the provider class to use')
+        parser.add_argument(
+            '--history', action='store_true',
+            help='Load every dated table the provider offers (providers with fetch_history only)'
+        )
+        parser.add_argument(
+            '--provider-options', default=None,
+            help='JSON object of keyword arguments for the provider, e.g. \'{"path": "rates.json"}\''
+        )
+
+    def handle(self, *args, **options):
+        bases = options['bases'] or get_setting('BASE_CURRENCIES')
+        provider_options = json.loads(options['provider_options']) if options['provider_options'] else None
+        provider = get_provider(options['provider'], provider_options)
+
+        failures = 0
+        for base in bases:
+            try:
+                if options['history']:
+                    tables = provider.fetch_history(base)
+                else:
+                    tables = [provider.fetch(base)]
+            except Exception as e:
+                failures += 1
+                self.stderr.write(self.style.ERROR(f'Failed to fetch rates for {base}: {e}'))
+                continue
+
+            for data in tables:
+                as_of = data.get('as_of') or timezone.now()
+                count = save_rates(base, data['rates'], as_of)
+                self.stdout.write(
+                    self.style.SUCCESS(f'Stored {count} rates for {base} as of {as_of:%Y-%m-%d %H:%M}')
+                )
+
+        if failures == len(bases):
+            raise CommandError('No exchange rates were refreshed')
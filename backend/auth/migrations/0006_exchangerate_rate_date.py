@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+def populate_rate_date(apps, schema_editor):
+    ExchangeRate = apps.get_model('expense_auth', 'ExchangeRate')
+    for rate in ExchangeRate.objects.all().only('id', 'as_of'):
+        ExchangeRate.objects.filter(pk=rate.pk).update(rate_date=rate.as_of.date())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense_auth', '0005_exchangerate'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='exchangerate',
+            name='unique_exchange_rate_pair',
+        ),
+        migrations.AddField(
+            model_name='exchangerate',
+            name='rate_date',
+            field=models.DateField(help_text='Day this rate applies to', null=True),
+        ),
+        migrations.RunPython(populate_rate_date, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='exchangerate',
+            name='rate_date',
+            field=models.DateField(help_text='Day this rate applies to'),
+        ),
+        migrations.AddConstraint(
+            model_name='exchangerate',
+            constraint=models.UniqueConstraint(fields=('base_currency', 'target_currency', 'rate_date'), name='unique_exchange_rate_day'),
+        ),
+    ]
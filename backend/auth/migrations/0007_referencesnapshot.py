@@ -0,0 +1,24 @@
+# Generated by Django 4.2.21 on 2026-10-17 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense_auth', '0006_exchangerate_rate_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferenceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('payload', models.TextField(help_text='Raw JSON document')),
+                ('etag', models.CharField(help_text='SHA-256 of the payload', max_length=64)),
+                ('source_url', models.URLField(max_length=500)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+# Legacy default bands started at 5001 and 25001, leaving 5000 < x < 5001
+# and 25000 < x < 25001 unmatched
+LEGACY_STARTS = {
+    'Medium Amount - Manager to Admin': (Decimal('5001'), Decimal('5000.01')),
+    'High Amount - Manager to Admin': (Decimal('25001'), Decimal('25000.01')),
+}
+
+
+def close_default_rule_gaps(apps, schema_editor):
+    ApprovalRule = apps.get_model('expense_auth', 'ApprovalRule')
+    for name, (old_min, new_min) in LEGACY_STARTS.items():
+        for rule in ApprovalRule.objects.filter(name=name, min_amount=old_min):
+            # Only widen the band when no other rule already covers the gap
+            covered = ApprovalRule.objects.filter(
+                company_id=rule.company_id, is_active=True, min_amount__lt=old_min
+            ).filter(
+                models.Q(max_amount__gte=new_min) | models.Q(max_amount__isnull=True)
+            ).exclude(pk=rule.pk).exists()
+            if not covered:
+                rule.min_amount = new_min
+                rule.save(update_fields=['min_amount'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense_auth', '0007_referencesnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(close_default_rule_gaps, migrations.RunPython.noop),
+    ]
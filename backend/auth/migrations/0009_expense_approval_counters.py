@@ -0,0 +1,88 @@
+# Generated by Django 4.2.21 on 2026-10-17 02:35
+
+import math
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def record_count(ApprovalRecord, **filters):
+    counts = ApprovalRecord.objects.filter(
+        expense=OuterRef('pk'), role__in=['manager', 'admin'], **filters
+    ).order_by().values('expense').annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def backfill_approval_counters(apps, schema_editor):
+    Expense = apps.get_model('expense_auth', 'Expense')
+    ApprovalRecord = apps.get_model('expense_auth', 'ApprovalRecord')
+    User = apps.get_model('expense_auth', 'User')
+
+    Expense.objects.update(
+        approval_count=record_count(ApprovalRecord, status='approved'),
+        approval_record_count=record_count(ApprovalRecord),
+    )
+
+    # Open expenses have had no approvals in their current stage, since an
+    # approval used to advance the stage immediately; only the quorum is set
+    managers = dict(
+        User.objects.filter(role='manager', user_set__isnull=False)
+        .values_list('user_set').annotate(total=Count('pk')).order_by()
+    )
+    admins = dict(
+        User.objects.filter(role='admin', company__isnull=False)
+        .values_list('company').annotate(total=Count('pk')).order_by()
+    )
+    by_quorum = defaultdict(list)
+    open_expenses = Expense.objects.filter(status__in=['pending', 'in_progress']).values_list(
+        'pk', 'current_stage', 'user__user_set', 'company', 'approval_rule__percentage_required'
+    )
+    for pk, stage, user_set_id, company_id, percentage in open_expenses.iterator():
+        if stage == 'manager':
+            pool = managers.get(user_set_id, 0)
+        elif stage == 'admin':
+            pool = admins.get(company_id, 0)
+        else:
+            pool = 0
+        by_quorum[max(1, math.ceil(pool * (percentage or 100) / 100))].append(pk)
+    for quorum, pks in by_quorum.items():
+        for start in range(0, len(pks), 500):
+            Expense.objects.filter(pk__in=pks[start:start + 500]).update(stage_quorum=quorum)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense_auth', '0008_close_default_rule_gaps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='approvalrecord',
+            name='stage',
+            field=models.CharField(blank=True, help_text='Workflow stage the record was made in', max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='approval_count',
+            field=models.PositiveIntegerField(default=0, help_text='Approvals by managers and admins'),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='approval_record_count',
+            field=models.PositiveIntegerField(default=0, help_text='Approval records by managers and admins'),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='stage_approval_count',
+            field=models.PositiveIntegerField(default=0, help_text='Approvals in the current stage'),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='stage_quorum',
+            field=models.PositiveIntegerField(default=1, help_text='Approvals needed to complete the current stage'),
+        ),
+        migrations.RunPython(backfill_approval_counters, migrations.RunPython.noop),
+    ]
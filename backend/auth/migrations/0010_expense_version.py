@@ -0,0 +1,18 @@
+# Generated by Django 4.2.21 on 2026-10-17 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense_auth', '0009_expense_approval_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='version',
+            field=models.PositiveIntegerField(default=0, help_text='Bumped on every workflow change, for compare-and-swap updates'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.21 on 2026-10-17 02:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_inbox(apps, schema_editor):
+    Expense = apps.get_model('expense_auth', 'Expense')
+    ApprovalInbox = apps.get_model('expense_auth', 'ApprovalInbox')
+    waiting = Expense.objects.filter(
+        status__in=['pending', 'in_progress'], current_stage__in=['manager', 'admin']
+    ).values_list('pk', 'company_id', 'current_stage', 'user__user_set_id', 'submission_date')
+    batch = []
+    for pk, company_id, stage, user_set_id, submission_date in waiting.iterator(chunk_size=2000):
+        batch.append(ApprovalInbox(
+            expense_id=pk, company_id=company_id, stage=stage,
+            user_set_id=user_set_id, submission_date=submission_date
+        ))
+        if len(batch) >= 2000:
+            ApprovalInbox.objects.bulk_create(batch)
+            batch = []
+    ApprovalInbox.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense_auth', '0010_expense_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApprovalInbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(max_length=20)),
+                ('submission_date', models.DateTimeField()),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='approval_inbox', to='expense_auth.company')),
+                ('expense', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entry', to='expense_auth.expense')),
+                ('user_set', models.ForeignKey(blank=True, help_text="Submitter's set, which scopes the manager stage", null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='approval_inbox', to='expense_auth.userset')),
+            ],
+            options={
+                'verbose_name': 'Approval Inbox Entry',
+                'verbose_name_plural': 'Approval Inbox',
+                'indexes': [models.Index(fields=['user_set', 'stage', 'submission_date'], name='inbox_set_stage_idx'), models.Index(fields=['company', 'stage', 'submission_date'], name='inbox_company_stage_idx')],
+            },
+        ),
+        migrations.RunPython(populate_inbox, migrations.RunPython.noop),
+    ]
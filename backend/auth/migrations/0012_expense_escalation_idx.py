@@ -0,0 +1,17 @@
+# Generated by Django 4.2.21 on 2026-10-17 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense_auth', '0011_approvalinbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['escalated', 'escalation_date'], name='expense_escalation_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.21 on 2026-10-17 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense_auth', '0012_expense_escalation_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkerLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('owner', models.CharField(help_text='Host and process holding the lease', max_length=255)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+    ]
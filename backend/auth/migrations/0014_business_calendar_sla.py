@@ -0,0 +1,50 @@
+# Generated by Django 4.2.21 on 2026-10-17 02:51
+
+import auth.models
+import datetime
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense_auth', '0013_workerlease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BusinessCalendar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timezone', models.CharField(default='UTC', help_text='IANA time zone, e.g. Europe/Berlin', max_length=64)),
+                ('workday_start', models.TimeField(default=datetime.time(9, 0))),
+                ('workday_end', models.TimeField(default=datetime.time(17, 0))),
+                ('workdays', models.JSONField(default=auth.models.default_workdays, help_text='ISO weekdays worked, 1 = Monday')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='business_calendar', to='expense_auth.company')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='approvalrule',
+            name='sla_hours',
+            field=models.PositiveIntegerField(default=48, help_text='Hours before a pending expense escalates, counted in business hours with a calendar', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.CreateModel(
+            name='Holiday',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('name', models.CharField(blank=True, max_length=200)),
+                ('calendar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holidays', to='expense_auth.businesscalendar')),
+            ],
+            options={
+                'ordering': ['date'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='holiday',
+            constraint=models.UniqueConstraint(fields=('calendar', 'date'), name='unique_calendar_holiday'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.21 on 2026-10-17 02:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense_auth', '0014_business_calendar_sla'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['user', '-submission_date'], name='expense_user_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.21 on 2026-10-17 03:05
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def populate_stats(apps, schema_editor):
+    Expense = apps.get_model('expense_auth', 'Expense')
+    ExpenseDailyStats = apps.get_model('expense_auth', 'ExpenseDailyStats')
+    totals = {}
+    expenses = Expense.objects.values_list(
+        'company_id', 'user__user_set_id', 'user_id', 'category_id', 'status', 'submission_date', 'base_amount', 'approved_at'
+    )
+    for company_id, user_set_id, user_id, category_id, status, submitted, base_amount, approved_at in expenses.iterator(chunk_size=2000):
+        key = (company_id, user_set_id, user_id, category_id, status, timezone.localdate(submitted))
+        row = totals.setdefault(key, [0, Decimal('0'), 0, 0])
+        row[0] += 1
+        row[1] += base_amount or 0
+        if approved_at is not None:
+            row[2] += 1
+            row[3] += int((approved_at - submitted).total_seconds())
+    ExpenseDailyStats.objects.bulk_create([
+        ExpenseDailyStats(
+            company_id=company_id, user_set_id=user_set_id, user_id=user_id, category_id=category_id, status=status,
+            day=day, count=count, amount=amount, processed=processed, processing_seconds=seconds
+        )
+        for (company_id, user_set_id, user_id, category_id, status, day), (count, amount, processed, seconds) in totals.items()
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense_auth', '0015_expense_user_recent_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20)),
+                ('day', models.DateField(help_text='Submission day')),
+                ('count', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, help_text='Sum of base amounts', max_digits=14)),
+                ('processed', models.IntegerField(default=0, help_text='Expenses with a decision date')),
+                ('processing_seconds', models.BigIntegerField(default=0, help_text='Submission to decision, summed over processed expenses')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='expense_stats', to='expense_auth.expensecategory')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expense_stats', to='expense_auth.company')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expense_stats', to=settings.AUTH_USER_MODEL)),
+                ('user_set', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='expense_stats', to='expense_auth.userset')),
+            ],
+            options={
+                'verbose_name': 'Expense Daily Stats',
+                'verbose_name_plural': 'Expense Daily Stats',
+                'indexes': [models.Index(fields=['company', 'day'], name='stats_company_day_idx'), models.Index(fields=['user_set', 'day'], name='stats_set_day_idx'), models.Index(fields=['user', 'day'], name='stats_user_day_idx')],
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
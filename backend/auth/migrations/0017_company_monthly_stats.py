@@ -0,0 +1,78 @@
+# Generated by Django 4.2.21 on 2026-10-17 03:09
+
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def populate_monthly_stats(apps, schema_editor):
+    ExpenseDailyStats = apps.get_model('expense_auth', 'ExpenseDailyStats')
+    CompanyMonthlyStats = apps.get_model('expense_auth', 'CompanyMonthlyStats')
+    User = apps.get_model('expense_auth', 'User')
+    totals = {}
+
+    def month_row(company_id, day):
+        return totals.setdefault((company_id, day.replace(day=1)), {
+            'users_joined': 0, 'expenses': 0, 'amount': Decimal('0'), 'rejected_amount': Decimal('0'),
+            'approved': 0, 'rejected': 0, 'processed': 0, 'processing_seconds': 0,
+        })
+
+    daily = ExpenseDailyStats.objects.values_list(
+        'company_id', 'day', 'status', 'count', 'amount', 'processed', 'processing_seconds'
+    )
+    for company_id, day, status, count, amount, processed, seconds in daily.iterator(chunk_size=2000):
+        row = month_row(company_id, day)
+        row['expenses'] += count
+        row['amount'] += amount
+        row['processed'] += processed
+        row['processing_seconds'] += seconds
+        if status == 'approved':
+            row['approved'] += count
+        elif status == 'rejected':
+            row['rejected'] += count
+            row['rejected_amount'] += amount
+    joined = User.objects.filter(company__isnull=False).values_list('company_id', 'date_joined')
+    for company_id, date_joined in joined.iterator(chunk_size=2000):
+        month_row(company_id, timezone.localdate(date_joined))['users_joined'] += 1
+
+    CompanyMonthlyStats.objects.bulk_create([
+        CompanyMonthlyStats(company_id=company_id, month=month, **row)
+        for (company_id, month), row in totals.items()
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expense_auth', '0016_expense_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyMonthlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('users_joined', models.IntegerField(default=0)),
+                ('expenses', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, help_text='Sum of base amounts', max_digits=16)),
+                ('rejected_amount', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('approved', models.IntegerField(default=0)),
+                ('rejected', models.IntegerField(default=0)),
+                ('processed', models.IntegerField(default=0, help_text='Expenses with a decision date')),
+                ('processing_seconds', models.BigIntegerField(default=0, help_text='Submission to decision, summed over processed expenses')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_stats', to='expense_auth.company')),
+            ],
+            options={
+                'verbose_name': 'Company Monthly Stats',
+                'verbose_name_plural': 'Company Monthly Stats',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='companymonthlystats',
+            constraint=models.UniqueConstraint(fields=('company', 'month'), name='unique_company_month_stats'),
+        ),
+        migrations.RunPython(populate_monthly_stats, migrations.RunPython.noop),
+    ]
@@ -2,7 +2,10 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 from django.core.validators import MinValueValidator
+from django.core.exceptions import ValidationError
+from datetime import time
 from decimal import Decimal
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 
 class Company(models.Model):
@@ -41,6 +44,49 @@ class Company(models.Model):
         verbose_name_plural = "Companies"
 
 
+def default_workdays():
+    return [1, 2, 3, 4, 5]
+
+
+class BusinessCalendar(models.Model):
+    """Working hours a company's approval SLAs are counted in"""
+    company = models.OneToOneField(Company, on_delete=models.CASCADE, related_name='business_calendar')
+    timezone = models.CharField(max_length=64, default='UTC', help_text="IANA time zone, e.g. Europe/Berlin")
+    workday_start = models.TimeField(default=time(9, 0))
+    workday_end = models.TimeField(default=time(17, 0))
+    workdays = models.JSONField(default=default_workdays, help_text="ISO weekdays worked, 1 = Monday")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def clean(self):
+        try:
+            ZoneInfo(self.timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValidationError({'timezone': f'Unknown time zone: {self.timezone}'})
+        if self.workday_end <= self.workday_start:
+            raise ValidationError({'workday_end': 'Workday must end after it starts.'})
+        if not self.workdays or any(day not in range(1, 8) for day in self.workdays):
+            raise ValidationError({'workdays': 'Give at least one ISO weekday between 1 and 7.'})
+
+    def __str__(self):
+        return f"{self.company.name} calendar ({self.timezone})"
+
+
+class Holiday(models.Model):
+    """Day off in a business calendar"""
+    calendar = models.ForeignKey(BusinessCalendar, on_delete=models.CASCADE, related_name='holidays')
+    date = models.DateField()
+    name = models.CharField(max_length=200, blank=True)
+
+    def __str__(self):
+        return f"{self.name or 'Holiday'} ({self.date})"
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['calendar', 'date'], name='unique_calendar_holiday'),
+        ]
+
+
 class UserSet(models.Model):
     """User Set model for grouping users with managers and employees"""
     name = models.CharField(max_length=200)
@@ -150,6 +196,13 @@ class Expense(models.Model):
     current_stage = models.CharField(max_length=20, default='manager', help_text="Current approval stage")
     approval_rule = models.ForeignKey('ApprovalRule', on_delete=models.SET_NULL, null=True, blank=True)
     
+    # Approval counters, maintained by the workflow
+    approval_count = models.PositiveIntegerField(default=0, help_text="Approvals by managers and admins")
+    approval_record_count = models.PositiveIntegerField(default=0, help_text="Approval records by managers and admins")
+    stage_approval_count = models.PositiveIntegerField(default=0, help_text="Approvals in the current stage")
+    stage_quorum = models.PositiveIntegerField(default=1, help_text="Approvals needed to complete the current stage")
+    version = models.PositiveIntegerField(default=0, help_text="Bumped on every workflow change, for compare-and-swap updates")
+    
     # Auto-escalation fields
     escalation_date = models.DateTimeField(null=True, blank=True, help_text="When to escalate if not approved")
     escalated = models.BooleanField(default=False)
@@ -179,6 +232,10 @@ class Expense(models.Model):
         verbose_name = "Expense"
         verbose_name_plural = "Expenses"
         ordering = ['-submission_date']
+        indexes = [
+            models.Index(fields=['escalated', 'escalation_date'], name='expense_escalation_idx'),
+            models.Index(fields=['user', '-submission_date'], name='expense_user_recent_idx'),
+        ]
 
 
 class Receipt(models.Model):
@@ -222,6 +279,10 @@ class ApprovalRule(models.Model):
     percentage_required = models.IntegerField(default=100, help_text="Percentage of approvers required")
     admin_override = models.BooleanField(default=True)
     urgent_bypass = models.BooleanField(default=True, help_text="Skip manager for urgent expenses")
+    sla_hours = models.PositiveIntegerField(
+        default=48, validators=[MinValueValidator(1)],
+        help_text="Hours before a pending expense escalates, counted in business hours with a calendar"
+    )
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='approval_rules')
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -246,6 +307,7 @@ class ApprovalRecord(models.Model):
     expense = models.ForeignKey(Expense, on_delete=models.CASCADE, related_name='approval_records')
     approver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='approval_records')
     role = models.CharField(max_length=20, choices=User.ROLE_CHOICES)
+    stage = models.CharField(max_length=20, null=True, blank=True, help_text="Workflow stage the record was made in")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     comment = models.TextField(blank=True, null=True)
     approved_at = models.DateTimeField(null=True, blank=True)
@@ -256,3 +318,116 @@ class ApprovalRecord(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+
+
+class ApprovalInbox(models.Model):
+    """Open expense waiting at an approval stage, kept in step with Expense by the workflow"""
+    expense = models.OneToOneField(Expense, on_delete=models.CASCADE, related_name='inbox_entry')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='approval_inbox')
+    stage = models.CharField(max_length=20)
+    user_set = models.ForeignKey(UserSet, on_delete=models.SET_NULL, null=True, blank=True, related_name='approval_inbox',
+                                 help_text="Submitter's set, which scopes the manager stage")
+    submission_date = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.expense_id} at {self.stage}"
+
+    class Meta:
+        verbose_name = "Approval Inbox Entry"
+        verbose_name_plural = "Approval Inbox"
+        indexes = [
+            models.Index(fields=['user_set', 'stage', 'submission_date'], name='inbox_set_stage_idx'),
+            models.Index(fields=['company', 'stage', 'submission_date'], name='inbox_company_stage_idx'),
+        ]
+
+
+class ExpenseDailyStats(models.Model):
+    """Expenses submitted on one day, per submitter, category and status, kept in step with Expense"""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='expense_stats')
+    user_set = models.ForeignKey(UserSet, on_delete=models.SET_NULL, null=True, blank=True, related_name='expense_stats')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='expense_stats')
+    category = models.ForeignKey(ExpenseCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name='expense_stats')
+    status = models.CharField(max_length=20)
+    day = models.DateField(help_text="Submission day")
+
+    count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text="Sum of base amounts")
+    processed = models.IntegerField(default=0, help_text="Expenses with a decision date")
+    processing_seconds = models.BigIntegerField(default=0, help_text="Submission to decision, summed over processed expenses")
+
+    def __str__(self):
+        return f"{self.user_id} {self.status} on {self.day}: {self.count}"
+
+    class Meta:
+        verbose_name = "Expense Daily Stats"
+        verbose_name_plural = "Expense Daily Stats"
+        indexes = [
+            models.Index(fields=['company', 'day'], name='stats_company_day_idx'),
+            models.Index(fields=['user_set', 'day'], name='stats_set_day_idx'),
+            models.Index(fields=['user', 'day'], name='stats_user_day_idx'),
+        ]
+
+
+class CompanyMonthlyStats(models.Model):
+    """Users who joined and expenses submitted in one calendar month, kept in step with User and Expense"""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='monthly_stats')
+    month = models.DateField(help_text="First day of the month")
+
+    users_joined = models.IntegerField(default=0)
+    expenses = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0, help_text="Sum of base amounts")
+    rejected_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    approved = models.IntegerField(default=0)
+    rejected = models.IntegerField(default=0)
+    processed = models.IntegerField(default=0, help_text="Expenses with a decision date")
+    processing_seconds = models.BigIntegerField(default=0, help_text="Submission to decision, summed over processed expenses")
+
+    def __str__(self):
+        return f"{self.company_id} {self.month:%Y-%m}"
+
+    class Meta:
+        verbose_name = "Company Monthly Stats"
+        verbose_name_plural = "Company Monthly Stats"
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'month'], name='unique_company_month_stats'),
+        ]
+
+
+class WorkerLease(models.Model):
+    """Named lease held by one worker process until it expires or is released"""
+    name = models.CharField(max_length=100, unique=True)
+    owner = models.CharField(max_length=255, help_text="Host and process holding the lease")
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} held by {self.owner}"
+
+
+class ExchangeRate(models.Model):
+    """Daily exchange rate between two currencies as published by the rate provider"""
+    base_currency = models.CharField(max_length=3)
+    target_currency = models.CharField(max_length=3)
+    rate = models.DecimalField(max_digits=18, decimal_places=8)
+    rate_date = models.DateField(help_text="Day this rate applies to")
+    as_of = models.DateTimeField(help_text="When the provider published this rate")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"1 {self.base_currency} = {self.rate} {self.target_currency} ({self.rate_date})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['base_currency', 'target_currency', 'rate_date'], name='unique_exchange_rate_day'),
+        ]
+
+
+class ReferenceSnapshot(models.Model):
+    """Locally stored copy of a rarely changing upstream dataset"""
+    key = models.CharField(max_length=100, unique=True)
+    payload = models.TextField(help_text="Raw JSON document")
+    etag = models.CharField(max_length=64, help_text="SHA-256 of the payload")
+    source_url = models.URLField(max_length=500)
+    fetched_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.key} ({self.fetched_at:%Y-%m-%d})"
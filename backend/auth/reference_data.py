@@ -0,0 +1,123 @@
+"""
+Locally stored reference datasets (countries and their currencies)
+
+Upstream data that changes roughly never is copied into ReferenceSnapshot by
+the refresh_countries management command, never from the request path.
+Requests are served from a pre-encoded in-process copy with a strong ETag
+and a pre-compressed gzip body.
+"""
+import gzip
+import hashlib
+import json
+import logging
+
+from django.utils import timezone
+
+from . import http_client
+from .exchange_rates import RateCache
+from .models import ReferenceSnapshot
+
+
+logger = logging.getLogger(__name__)
+
+COUNTRIES_KEY = 'countries-currencies'
+COUNTRIES_URL = 'https://restcountries.com/v3.1/all?fields=name,currencies'
+SNAPSHOT_TTL = 300  # Seconds before a process re-reads the stored snapshot
+
+snapshot_cache = RateCache(maxsize=16, ttl=SNAPSHOT_TTL)
+
+
+class EncodedSnapshot:
+    """
+    A snapshot ready to be written to the wire as is
+    """
+
+    def __init__(self, payload, fetched_at):
+        self.body = payload.encode('utf-8')
+        self.gzip_body = gzip.compress(self.body, compresslevel=9, mtime=0)
+        digest = hashlib.sha256(self.body).hexdigest()
+        # Strong ETags must differ between the identity and gzip representations
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+        self.fetched_at = fetched_at
+
+
+def fetch_countries():
+    """
+    Download countries and currencies from restcountries.com
+    """
+    data = http_client.get_json(COUNTRIES_URL)
+    if not isinstance(data, list):
+        raise ValueError('Unexpected countries payload')
+    return data
+
+
+def store_snapshot(key, data, source_url):
+    """
+    Store a JSON document as the snapshot for key
+    """
+    payload = json.dumps(data, separators=(',', ':'), ensure_ascii=False, sort_keys=True)
+    snapshot, _ = ReferenceSnapshot.objects.update_or_create(
+        key=key,
+        defaults={
+            'payload': payload,
+            'etag': hashlib.sha256(payload.encode('utf-8')).hexdigest(),
+            'source_url': source_url,
+            'fetched_at': timezone.now(),
+        }
+    )
+    snapshot_cache.clear()
+    return snapshot
+
+
+def refresh_countries_snapshot():
+    """
+    Fetch the countries dataset from upstream and store it
+    """
+    return store_snapshot(COUNTRIES_KEY, fetch_countries(), COUNTRIES_URL)
+
+
+def _load_countries_snapshot():
+    snapshot = ReferenceSnapshot.objects.filter(key=COUNTRIES_KEY).first()
+    if snapshot is None:
+        # Raised rather than returned, so the absence is not cached
+        raise LookupError(f"No {COUNTRIES_KEY} snapshot stored; run the refresh_countries command")
+    return EncodedSnapshot(snapshot.payload, snapshot.fetched_at)
+
+
+def get_countries_snapshot():
+    """
+    Get the encoded countries snapshot, or None when none is stored
+
+    The request path never calls upstream: snapshots are only fetched by the
+    refresh_countries command.
+    """
+    try:
+        return snapshot_cache.get_or_load(COUNTRIES_KEY, _load_countries_snapshot)
+    except LookupError as e:
+        logger.error("Countries snapshot unavailable: %s", e)
+        return None
+
+
+def accepts_gzip(accept_encoding):
+    """
+    Whether an Accept-Encoding header allows a gzip response
+    """
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        name, *params = [part.strip() for part in coding.split(';')]
+        if not name:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.lower()] = quality
+    for name in ('gzip', 'x-gzip'):
+        if name in qualities:
+            return qualities[name] > 0
+    return qualities.get('*', 0) > 0
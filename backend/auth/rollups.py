@@ -0,0 +1,264 @@
+"""
+Daily expense rollups for the dashboards
+
+ExpenseDailyStats holds one row per company, user set, user, category, status
+and submission day with the number of expenses, their base amount, how many
+have been decided and the time that took. Every write that creates an
+expense, changes its status or deletes it applies the difference to the
+rollup in the same transaction, so a dashboard sums a few hundred rollup
+rows instead of scanning Expense.
+
+CompanyMonthlyStats rolls the same changes, plus users joining, up to one
+row per company and calendar month, which is all period-over-period growth
+figures need. rebuild_stats recomputes both tables from Expense and User
+after a crash or a bulk data fix.
+
+Daily rows are matched on their key in Python rather than through a unique
+constraint, as the set and category may be NULL. Should two writers insert
+the same new key at once the two rows simply add up. Monthly rows are unique
+per company and month and updated with in-place increments.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+
+from .dashboard_cache import invalidate_dashboards
+from .models import CompanyMonthlyStats, Expense, ExpenseDailyStats, User
+
+
+KEY_FIELDS = ['company_id', 'user_set_id', 'user_id', 'category_id', 'status', 'day']
+MEASURES = ['count', 'amount', 'processed', 'processing_seconds']
+MONTHLY_MEASURES = [
+    'users_joined', 'expenses', 'amount', 'rejected_amount', 'approved', 'rejected', 'processed', 'processing_seconds'
+]
+# Expense columns read to compute a fact, in fact() argument order
+FACT_FIELDS = [
+    'company_id', 'user__user_set_id', 'user_id', 'category_id', 'status', 'submission_date', 'base_amount', 'approved_at'
+]
+
+
+def fact(company_id, user_set_id, user_id, category_id, status, submission_date, base_amount, approved_at):
+    """
+    The rollup key and measures one expense contributes
+    """
+    key = (company_id, user_set_id, user_id, category_id, status, timezone.localdate(submission_date))
+    seconds = 0
+    if approved_at is not None:
+        seconds = int((approved_at - submission_date).total_seconds())
+    return key, (1, base_amount or Decimal('0'), int(approved_at is not None), seconds)
+
+
+def _user_set_id(expense):
+    if Expense.user.is_cached(expense):
+        return expense.user.user_set_id
+    # The submitter may already be gone when its expenses are cascade-deleted
+    return User.objects.filter(pk=expense.user_id).values_list('user_set_id', flat=True).first()
+
+
+def expense_fact(expense):
+    """
+    The rollup key and measures of an expense instance as it is now
+    """
+    return fact(
+        expense.company_id, _user_set_id(expense), expense.user_id, expense.category_id, expense.status,
+        expense.submission_date, expense.base_amount, expense.approved_at
+    )
+
+
+def stored_fact(expense_id):
+    """
+    The rollup key and measures of an expense as stored, or None if it is not
+    """
+    row = Expense.objects.filter(pk=expense_id).values_list(*FACT_FIELDS).first()
+    return fact(*row) if row else None
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def _monthly_change(status, count, amount, processed, seconds):
+    # A daily change expressed in MONTHLY_MEASURES
+    rejected = count if status == 'rejected' else 0
+    return (
+        0, count, amount, amount if rejected else Decimal('0'),
+        count if status == 'approved' else 0, rejected, processed, seconds
+    )
+
+
+def _row_key(row):
+    return tuple(getattr(row, field) for field in KEY_FIELDS)
+
+
+def _lock(rows):
+    if transaction.get_connection().features.has_select_for_update:
+        return rows.select_for_update()
+    return rows
+
+
+class StatsDelta:
+    """
+    Changes to ExpenseDailyStats and CompanyMonthlyStats, accumulated per key and written together
+    """
+
+    def __init__(self):
+        self.changes = defaultdict(lambda: [0, Decimal('0'), 0, 0])
+        self.users = defaultdict(int)  # (company_id, month) -> users joined
+
+    def add(self, fact, sign=1):
+        key, measures = fact
+        change = self.changes[key]
+        for i, value in enumerate(measures):
+            change[i] += sign * value
+
+    def remove(self, fact):
+        self.add(fact, -1)
+
+    def add_user(self, company_id, date_joined, sign=1):
+        """
+        Record a user joining a company, or leaving it with sign -1
+        """
+        if company_id is not None:
+            self.users[(company_id, month_of(timezone.localdate(date_joined)))] += sign
+
+    def move(self, before, after):
+        """
+        Record an expense going from one fact to another; either may be None
+        """
+        if before == after:
+            return
+        if before is not None:
+            self.remove(before)
+        if after is not None:
+            self.add(after)
+
+    def monthly_changes(self):
+        """
+        The accumulated changes rolled up per company and month
+        """
+        monthly = defaultdict(lambda: [0, 0, Decimal('0'), Decimal('0'), 0, 0, 0, 0])
+        for (company_id, _, _, _, status, day), change in self.changes.items():
+            totals = monthly[(company_id, month_of(day))]
+            for i, value in enumerate(_monthly_change(status, *change)):
+                totals[i] += value
+        for key, joined in self.users.items():
+            monthly[key][0] += joined
+        return {key: totals for key, totals in monthly.items() if any(totals)}
+
+    def apply(self):
+        """
+        Write the accumulated changes: one read, update and insert of daily
+        rows and one increment per company and month
+        """
+        changes = {key: change for key, change in self.changes.items() if any(change)}
+        monthly = self.monthly_changes()
+        self.changes.clear()
+        self.users.clear()
+        if not changes and not monthly:
+            return
+        with transaction.atomic():
+            if changes:
+                _apply_daily(changes)
+            _apply_monthly(monthly)
+
+
+def _apply_daily(changes):
+    rows = _lock(ExpenseDailyStats.objects.filter(
+        user_id__in={key[2] for key in changes}, day__in={key[5] for key in changes}
+    ))
+    existing = {}
+    for row in rows:
+        existing.setdefault(_row_key(row), row)
+
+    updated = []
+    created = []
+    for key, change in changes.items():
+        row = existing.get(key)
+        if row is not None:
+            for field, value in zip(MEASURES, change):
+                setattr(row, field, getattr(row, field) + value)
+            updated.append(row)
+        elif change[0] > 0:
+            created.append(ExpenseDailyStats(**dict(zip(KEY_FIELDS + MEASURES, key + tuple(change)))))
+        # A decrement with no row to take it from was already dropped
+        # with its user or company; there is nothing left to correct
+
+    if updated:
+        ExpenseDailyStats.objects.bulk_update(updated, MEASURES)
+    if created:
+        ExpenseDailyStats.objects.bulk_create(created)
+
+
+def _apply_monthly(changes):
+    # Few keys per write (usually one), each an atomic increment in place
+    for (company_id, month), change in changes.items():
+        increments = {
+            field: models.F(field) + value for field, value in zip(MONTHLY_MEASURES, change) if value
+        }
+        for attempt in range(2):
+            if CompanyMonthlyStats.objects.filter(company_id=company_id, month=month).update(**increments):
+                break
+            if min(change) < 0:
+                # Nothing to take away from; the row went with its company
+                break
+            try:
+                with transaction.atomic():
+                    CompanyMonthlyStats.objects.create(
+                        company_id=company_id, month=month, **dict(zip(MONTHLY_MEASURES, change))
+                    )
+                break
+            except IntegrityError:
+                # Another writer created the month's row first; add to it instead
+                if attempt:
+                    raise
+
+
+def move_user_stats(user):
+    """
+    Re-scope a user's rollup rows after they moved to another set
+    """
+    ExpenseDailyStats.objects.filter(user=user).update(user_set=user.user_set_id)
+
+
+def rebuild_stats(company=None, chunk_size=2000):
+    """
+    Recompute ExpenseDailyStats and CompanyMonthlyStats from Expense and User
+
+    Returns the number of daily and monthly rollup rows written. The
+    dashboards of every user involved are expired.
+    """
+    expenses = Expense.objects.all()
+    users = User.objects.filter(company__isnull=False)
+    stats = ExpenseDailyStats.objects.all()
+    monthly_stats = CompanyMonthlyStats.objects.all()
+    if company is not None:
+        expenses = expenses.filter(company=company)
+        users = users.filter(company=company)
+        stats = stats.filter(company=company)
+        monthly_stats = monthly_stats.filter(company=company)
+
+    delta = StatsDelta()
+    for row in expenses.values_list(*FACT_FIELDS).iterator(chunk_size=chunk_size):
+        delta.add(fact(*row))
+    scopes = ([], [], [])
+    rows = users.values_list('company_id', 'date_joined', 'user_set_id', 'pk').iterator(chunk_size=chunk_size)
+    for company_id, date_joined, user_set_id, user_id in rows:
+        delta.add_user(company_id, date_joined)
+        for ids, pk in zip(scopes, (company_id, user_set_id, user_id)):
+            ids.append(pk)
+    monthly = delta.monthly_changes()
+
+    stats.delete()
+    monthly_stats.delete()
+    ExpenseDailyStats.objects.bulk_create([
+        ExpenseDailyStats(**dict(zip(KEY_FIELDS + MEASURES, key + tuple(change))))
+        for key, change in delta.changes.items()
+    ], batch_size=chunk_size)
+    CompanyMonthlyStats.objects.bulk_create([
+        CompanyMonthlyStats(company_id=company_id, month=month, **dict(zip(MONTHLY_MEASURES, change)))
+        for (company_id, month), change in monthly.items()
+    ], batch_size=chunk_size)
+    invalidate_dashboards(*scopes)
+    return len(delta.changes), len(monthly)
@@ -0,0 +1,163 @@
+"""
+Compiled approval-rule index
+
+Each company's active ApprovalRule rows are compiled into a sorted list of
+disjoint amount segments, so picking the rule for a submission is a bisect
+over in-process data instead of one or two ORM queries. Compiled sets are
+kept in a VersionedCache per company, which signals invalidate whenever a
+rule is saved or deleted.
+
+Rule writes are validated against the rest of the company's rules with an
+interval sweep, so overlapping bands are rejected and every amount maps to at
+most one rule.
+"""
+from bisect import bisect_right
+from decimal import Decimal
+
+from .models import ApprovalRule
+from .versioned_cache import VersionedCache
+
+
+AMOUNT_STEP = Decimal('0.01')  # Smallest difference between two amounts
+
+rule_sets = VersionedCache('approval_rules')  # company_id -> CompiledRuleSet
+
+
+class CompiledRuleSet:
+    """
+    Immutable lookup structure for one company's active rules
+
+    Segment starts are ``(amount, after)`` keys: ``after=0`` starts a segment
+    at the amount itself, ``after=1`` just above it (a band's closed max).
+    Each segment stores the rule the SQL lookup would have returned for any
+    amount inside it: the matching rule with the lowest min_amount.
+    """
+
+    def __init__(self, rules):
+        rules = sorted(rules, key=lambda rule: (rule.min_amount, rule.pk or 0))
+        self.rules = rules
+        self.urgent_rule = next((rule for rule in rules if rule.urgent_bypass), None)
+
+        points = {(rule.min_amount, 0) for rule in rules}
+        points.update((rule.max_amount, 1) for rule in rules if rule.max_amount is not None)
+
+        self.starts = []
+        self.answers = []
+        for value, after in sorted(points):
+            self.starts.append((value, after))
+            self.answers.append(self._covering_rule(rules, value, after))
+
+    @staticmethod
+    def _covering_rule(rules, value, after):
+        for rule in rules:
+            if rule.min_amount > value:
+                break
+            if rule.max_amount is not None and (rule.max_amount < value or (after and rule.max_amount == value)):
+                continue
+            return rule
+        return None
+
+    def match(self, amount, urgent=False):
+        if urgent and self.urgent_rule:
+            return self.urgent_rule
+        index = bisect_right(self.starts, (amount, 0)) - 1
+        if index < 0:
+            return None
+        return self.answers[index]
+
+
+def invalidate_rules(company_id):
+    """
+    Drop the compiled rules for a company in every process
+    """
+    rule_sets.invalidate(company_id)
+
+
+def get_rule_set(company_id):
+    """
+    Get the compiled rule set for a company, rebuilding it when stale
+    """
+    return rule_sets.get(
+        company_id, lambda: CompiledRuleSet(ApprovalRule.objects.filter(company_id=company_id, is_active=True))
+    )
+
+
+def _amount(value):
+    return None if value is None else str(Decimal(value).quantize(AMOUNT_STEP))
+
+
+def _rule_ref(rule):
+    return {'id': rule.pk, 'name': rule.name}
+
+
+def _bands_overlap(first, second):
+    if first.max_amount is not None and first.max_amount < second.min_amount:
+        return False
+    if second.max_amount is not None and second.max_amount < first.min_amount:
+        return False
+    return True
+
+
+def _overlap(first, second):
+    maxes = [value for value in (first.max_amount, second.max_amount) if value is not None]
+    return {
+        'rules': [_rule_ref(first), _rule_ref(second)],
+        'from': _amount(max(first.min_amount, second.min_amount)),
+        'to': _amount(min(maxes)) if maxes else None,
+    }
+
+
+def _gap(start, end):
+    return {'from': _amount(start), 'to': _amount(end)}
+
+
+def check_rule_set(rules):
+    """
+    Sweep a set of rules in amount order and report overlapping bands and
+    amounts no rule covers
+    
+    Gaps are reported from zero upwards; a ``to`` of None means unbounded.
+    """
+    rules = sorted(rules, key=lambda rule: (rule.min_amount, rule.pk or 0))
+    overlaps = []
+    gaps = []
+    open_rules = []  # Rules whose band reaches the current sweep position
+    covered_to = Decimal('0') - AMOUNT_STEP  # Highest amount covered so far, None when unbounded
+
+    for rule in rules:
+        open_rules = [
+            other for other in open_rules
+            if other.max_amount is None or other.max_amount >= rule.min_amount
+        ]
+        overlaps.extend(_overlap(other, rule) for other in open_rules)
+
+        if covered_to is not None and rule.min_amount > covered_to + AMOUNT_STEP:
+            gaps.append(_gap(covered_to + AMOUNT_STEP, rule.min_amount - AMOUNT_STEP))
+        if rule.max_amount is None:
+            covered_to = None
+        elif covered_to is not None:
+            covered_to = max(covered_to, rule.max_amount)
+        open_rules.append(rule)
+
+    if covered_to is not None:
+        gaps.append(_gap(max(covered_to + AMOUNT_STEP, Decimal('0')), None))
+
+    return {'valid': not overlaps, 'overlaps': overlaps, 'gaps': gaps}
+
+
+def check_rule_change(company_id, rule):
+    """
+    Check a new or changed rule against the company's other active rules
+    
+    Only overlaps involving the rule itself are reported, so rules that
+    already overlap each other do not block unrelated edits.
+    """
+    others = list(ApprovalRule.objects.filter(company_id=company_id, is_active=True).exclude(pk=rule.pk))
+    rules = others + [rule] if rule.is_active else others
+    report = check_rule_set(rules)
+    if rule.is_active:
+        report['overlaps'] = [_overlap(other, rule) for other in others if _bands_overlap(other, rule)]
+    else:
+        report['overlaps'] = []
+    report['valid'] = not report['overlaps']
+    return report
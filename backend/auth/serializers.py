@@ -3,7 +3,9 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.db import transaction
-from .models import User, Company, UserSet, Expense, ExpenseCategory, Receipt, ApprovalRule, ApprovalRecord
+from .models import (
+    User, Company, UserSet, Expense, ExpenseCategory, Receipt, ApprovalRule, ApprovalRecord, BusinessCalendar, Holiday
+)
 
 
 class CompanySerializer(serializers.ModelSerializer):
@@ -323,6 +325,18 @@ class ExpenseSerializer(serializers.ModelSerializer):
                  'submission_date', 'created_at', 'updated_at']
         read_only_fields = ['id', 'submission_date', 'created_at', 'updated_at', 
                            'approved_by', 'approved_at', 'exchange_rate', 'base_amount']
+    
+    def update(self, instance, validated_data):
+        """Keep the base currency amount in step with amount, currency and date"""
+        from .workflow import get_base_currency_fields
+        
+        if {'amount', 'currency', 'expense_date'} & set(validated_data):
+            validated_data.update(get_base_currency_fields(
+                validated_data.get('amount', instance.amount),
+                validated_data.get('currency', instance.currency),
+                validated_data.get('expense_date', instance.expense_date)
+            ))
+        return super().update(instance, validated_data)
 
 
 class ExpenseCreateSerializer(serializers.ModelSerializer):
@@ -336,6 +350,8 @@ class ExpenseCreateSerializer(serializers.ModelSerializer):
                  'category_id', 'priority', 'tags', 'notes', 'receipt_file']
     
     def create(self, validated_data):
+        from .workflow import get_base_currency_fields
+        
         receipt_file = validated_data.pop('receipt_file', None)
         category_id = validated_data.pop('category_id', None)
         
@@ -352,6 +368,11 @@ class ExpenseCreateSerializer(serializers.ModelSerializer):
             except ExpenseCategory.DoesNotExist:
                 raise serializers.ValidationError("Invalid category ID")
         
+        # Convert to the company currency at the expense date
+        validated_data.update(get_base_currency_fields(
+            validated_data['amount'], validated_data.get('currency', 'USD'), validated_data['expense_date']
+        ))
+        
         # Create expense
         expense = Expense.objects.create(**validated_data)
         
@@ -368,6 +389,55 @@ class ExpenseCreateSerializer(serializers.ModelSerializer):
         return expense
 
 
+class CurrencyConversionSerializer(serializers.Serializer):
+    """Serializer for one entry of a batch currency conversion"""
+    amount = serializers.DecimalField(max_digits=14, decimal_places=2)
+    date = serializers.DateField(required=False, allow_null=True, default=None)
+    
+    def get_fields(self):
+        # 'from' is a Python keyword, so these fields cannot be declared as attributes
+        fields = super().get_fields()
+        fields['from'] = serializers.CharField(min_length=3, max_length=3)
+        fields['to'] = serializers.CharField(min_length=3, max_length=3, default='USD')
+        return fields
+    
+    def validate(self, attrs):
+        attrs['from'] = attrs['from'].upper()
+        attrs['to'] = attrs['to'].upper()
+        return attrs
+
+
+class BulkActionFilterSerializer(serializers.Serializer):
+    """Serializer for selecting expenses from the approver's pending queue"""
+    status = serializers.ChoiceField(choices=['pending', 'in_progress'], required=False)
+    user_set = serializers.IntegerField(required=False)
+    category = serializers.IntegerField(required=False)
+    min_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+
+class BulkApprovalActionSerializer(serializers.Serializer):
+    """Serializer for approving, rejecting or overriding many expenses at once"""
+    action = serializers.ChoiceField(choices=['approve', 'reject', 'override'])
+    decision = serializers.ChoiceField(choices=['approve', 'reject'], required=False)
+    comment = serializers.CharField(required=False, allow_blank=True, default='')
+    expense_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    filter = BulkActionFilterSerializer(required=False)
+    
+    def validate(self, attrs):
+        user = self.context['request'].user
+        if ('expense_ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError("Provide either expense_ids or filter.")
+        if attrs['action'] == 'override':
+            if user.role != 'admin':
+                raise serializers.ValidationError("Only admins can override")
+            if 'decision' not in attrs:
+                raise serializers.ValidationError({'decision': 'Required for override.'})
+        return attrs
+
+
 class OCRDataSerializer(serializers.Serializer):
     """Serializer for OCR extracted data"""
     text = serializers.CharField()
@@ -382,9 +452,68 @@ class ApprovalRuleSerializer(serializers.ModelSerializer):
     class Meta:
         model = ApprovalRule
         fields = ['id', 'name', 'min_amount', 'max_amount', 'sequence', 'percentage_required', 
-                 'admin_override', 'urgent_bypass', 'is_active', 'created_at', 'updated_at']
+                 'admin_override', 'urgent_bypass', 'sla_hours', 'is_active', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def validate(self, attrs):
+        min_amount = attrs.get('min_amount', getattr(self.instance, 'min_amount', None))
+        max_amount = attrs.get('max_amount', getattr(self.instance, 'max_amount', None))
+        if max_amount is not None and min_amount is not None and max_amount < min_amount:
+            raise serializers.ValidationError({'max_amount': 'Maximum amount must not be less than minimum amount.'})
+        return attrs
+
+
+class HolidaySerializer(serializers.ModelSerializer):
+    """Serializer for Holiday model"""
+    
+    class Meta:
+        model = Holiday
+        fields = ['date', 'name']
+
+
+class BusinessCalendarSerializer(serializers.ModelSerializer):
+    """Serializer for a company's business calendar; holidays are replaced as a whole"""
+    holidays = HolidaySerializer(many=True, required=False)
+    
+    class Meta:
+        model = BusinessCalendar
+        fields = ['timezone', 'workday_start', 'workday_end', 'workdays', 'holidays', 'updated_at']
+        read_only_fields = ['updated_at']
+    
+    def validate(self, attrs):
+        from django.core.exceptions import ValidationError as DjangoValidationError
+        
+        values = {field: value for field, value in attrs.items() if field != 'holidays'}
+        calendar = BusinessCalendar(**{
+            field: values.get(field, getattr(self.instance, field, BusinessCalendar._meta.get_field(field).get_default()))
+            for field in ['timezone', 'workday_start', 'workday_end', 'workdays']
+        })
+        try:
+            calendar.clean()
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.message_dict)
+        dates = [holiday['date'] for holiday in attrs.get('holidays', [])]
+        if len(dates) != len(set(dates)):
+            raise serializers.ValidationError({'holidays': 'Each date can only be listed once.'})
+        return attrs
+    
+    @transaction.atomic
+    def save(self, **kwargs):
+        holidays = self.validated_data.pop('holidays', None)
+        calendar = super().save(**kwargs)
+        if holidays is not None:
+            calendar.holidays.all().delete()
+            Holiday.objects.bulk_create([Holiday(calendar=calendar, **holiday) for holiday in holidays])
+        return calendar
+
+
+class RuleSimulationSerializer(serializers.Serializer):
+    """Serializer for a what-if simulation of proposed approval rules"""
+    rules = ApprovalRuleSerializer(many=True, allow_empty=False)
+    sla_hours = serializers.IntegerField(min_value=1, required=False)
+    date_from = serializers.DateField(required=False, allow_null=True, default=None)
+    date_to = serializers.DateField(required=False, allow_null=True, default=None)
+
 
 class ApprovalRecordSerializer(serializers.ModelSerializer):
     """Serializer for ApprovalRecord model"""
@@ -405,6 +534,7 @@ class WorkflowExpenseSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     approval_records = ApprovalRecordSerializer(many=True, read_only=True)
     approval_rule_name = serializers.CharField(source='approval_rule.name', read_only=True)
+    converted_amount = serializers.DecimalField(source='base_amount', max_digits=10, decimal_places=2, coerce_to_string=False, read_only=True)
     next_approver = serializers.SerializerMethodField()
     approval_percentage = serializers.SerializerMethodField()
     
@@ -412,7 +542,8 @@ class WorkflowExpenseSerializer(serializers.ModelSerializer):
         model = Expense
         fields = ['id', 'title', 'description', 'amount', 'currency', 'converted_amount', 
                  'expense_date', 'submission_date', 'status', 'priority', 'urgent', 
-                 'current_stage', 'escalation_date', 'escalated', 'user_name', 'user_username',
+                 'current_stage', 'stage_approval_count', 'stage_quorum', 'escalation_date',
+                 'escalated', 'user_name', 'user_username',
                  'category_name', 'approval_records', 'approval_rule_name', 'next_approver',
                  'approval_percentage', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
@@ -420,6 +551,10 @@ class WorkflowExpenseSerializer(serializers.ModelSerializer):
     def get_next_approver(self, obj):
         """Get the next approver for the expense"""
         from .workflow import get_next_approver
+        # List views pass an ApproverResolver so lookups need no queries
+        resolver = self.context.get('approver_resolver')
+        if resolver is not None:
+            return resolver.next_approver(obj, obj.current_stage)
         return get_next_approver(obj, obj.current_stage)
     
     def get_approval_percentage(self, obj):
@@ -438,34 +573,21 @@ class ExpenseSubmissionSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         """Create expense with workflow setup"""
-        from .workflow import convert_currency, get_applicable_rule, setup_escalation
+        from .workflow import plan_submission
         
         user = self.context['request'].user
         validated_data['user'] = user
         validated_data['company'] = user.company
         
-        # Convert currency if needed
-        amount = validated_data['amount']
-        currency = validated_data['currency']
-        company_currency = 'USD'  # Default company currency
-        
-        if currency != company_currency:
-            converted_amount = convert_currency(amount, currency, company_currency)
-            validated_data['converted_amount'] = converted_amount
-        
-        # Get applicable rule
-        rule = get_applicable_rule(amount, user.company, validated_data.get('urgent', False))
-        if rule:
-            validated_data['approval_rule'] = rule
-            validated_data['current_stage'] = rule.sequence[0] if rule.sequence else 'manager'
+        # Every workflow field is known before the row is written
+        validated_data.update(plan_submission(
+            user, validated_data['amount'], validated_data.get('currency', 'USD'),
+            validated_data['expense_date'], validated_data.get('urgent', False)
+        ))
         
-        # Create expense
-        expense = super().create(validated_data)
-        
-        # Setup escalation
-        setup_escalation(expense)
-        
-        return expense
+        # One INSERT, plus the inbox row it gets in the same transaction
+        with transaction.atomic():
+            return super().create(validated_data)
 
 
 class ApprovalActionSerializer(serializers.Serializer):
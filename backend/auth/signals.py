@@ -0,0 +1,159 @@
+"""
+Signal handlers keeping derived, cached data in step with model writes
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .business_calendar import invalidate_calendar
+from .dashboard_cache import invalidate_dashboards
+from .exchange_rates import invalidate_rates
+from .inbox import move_user_inbox, sync_inbox
+from .models import ApprovalRecord, ApprovalRule, BusinessCalendar, ExchangeRate, Expense, Holiday, User
+from .rollups import StatsDelta, expense_fact, move_user_stats, stored_fact
+from .rules import invalidate_rules
+
+
+@receiver([post_save, post_delete], sender=ApprovalRule)
+def invalidate_approval_rules(sender, instance, **kwargs):
+    """Recompile the company's rule index after any rule change"""
+    invalidate_rules(instance.company_id)
+
+
+@receiver([post_save, post_delete], sender=BusinessCalendar)
+def invalidate_business_calendar(sender, instance, **kwargs):
+    """Recompile the company's business calendar after it changes"""
+    invalidate_calendar(instance.company_id)
+
+
+@receiver([post_save, post_delete], sender=Holiday)
+def invalidate_holiday_calendar(sender, instance, **kwargs):
+    """Recompile the company's business calendar after a holiday changes"""
+    company_id = BusinessCalendar.objects.filter(pk=instance.calendar_id).values_list('company_id', flat=True).first()
+    # When the whole calendar is deleted its own signal does this
+    if company_id is not None:
+        invalidate_calendar(company_id)
+
+
+@receiver([post_save, post_delete], sender=ExchangeRate)
+def invalidate_exchange_rates(sender, instance, **kwargs):
+    """Reload cached rates after a rate is edited outside save_rates"""
+    invalidate_rates()
+
+
+@receiver(post_save, sender=Expense)
+def sync_expense_inbox(sender, instance, raw=False, **kwargs):
+    """Keep the approval inbox row in step with a saved expense"""
+    if not raw:
+        sync_inbox([instance])
+
+
+@receiver(pre_save, sender=Expense)
+def remember_expense_stats(sender, instance, raw=False, **kwargs):
+    """Read the stored expense so the rollup can be moved off it after the save"""
+    if not raw and instance.pk is not None:
+        instance._stats_before = stored_fact(instance.pk)
+
+
+@receiver(post_save, sender=Expense)
+def update_expense_stats(sender, instance, created, raw=False, **kwargs):
+    """Move the expense's contribution to the daily rollup"""
+    if raw:
+        return
+    delta = StatsDelta()
+    delta.move(None if created else getattr(instance, '_stats_before', None), expense_fact(instance))
+    delta.apply()
+
+
+@receiver(post_delete, sender=Expense)
+def remove_expense_stats(sender, instance, **kwargs):
+    """Take a deleted expense out of the daily rollup"""
+    delta = StatsDelta()
+    delta.remove(expense_fact(instance))
+    delta.apply()
+
+
+@receiver(pre_save, sender=User)
+def remember_user_membership(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Read the stored company and set so a user moving is moved in the inbox, rollups and dashboards"""
+    instance._stored_membership = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is None or {'company', 'user_set'} & set(update_fields):
+        instance._stored_membership = User.objects.filter(pk=instance.pk).values_list(
+            'company_id', 'date_joined', 'user_set_id'
+        ).first()
+
+
+@receiver(post_save, sender=User)
+def update_user_stats(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Count a user joining a company in the monthly rollup"""
+    if raw or (update_fields is not None and 'company' not in update_fields):
+        return
+    stored = None if created else getattr(instance, '_stored_membership', None)
+    before = stored[:2] if stored else None
+    after = (instance.company_id, instance.date_joined)
+    if before == after:
+        return
+    delta = StatsDelta()
+    if before is not None:
+        delta.add_user(*before, sign=-1)
+    delta.add_user(*after)
+    delta.apply()
+
+
+@receiver(post_save, sender=User)
+def move_user_expenses(sender, instance, created, raw=False, **kwargs):
+    """Re-scope the user's inbox entries and rollup rows after they moved to another set"""
+    stored = getattr(instance, '_stored_membership', None)
+    if raw or created or stored is None or stored[2] == instance.user_set_id:
+        return
+    move_user_inbox(instance)
+    move_user_stats(instance)
+
+
+@receiver(post_delete, sender=User)
+def remove_user_stats(sender, instance, **kwargs):
+    """Take a deleted user out of the monthly rollup"""
+    delta = StatsDelta()
+    delta.add_user(instance.company_id, instance.date_joined, sign=-1)
+    delta.apply()
+
+
+def _invalidate_expense_dashboards(expense):
+    key, _ = expense_fact(expense)
+    invalidate_dashboards([key[0]], [key[1]], [key[2]])
+
+
+@receiver([post_save, post_delete], sender=Expense)
+def invalidate_expense_dashboards(sender, instance, raw=False, **kwargs):
+    """Expire the cached dashboards showing the expense"""
+    if not raw:
+        _invalidate_expense_dashboards(instance)
+
+
+@receiver([post_save, post_delete], sender=ApprovalRecord)
+def invalidate_approval_dashboards(sender, instance, raw=False, **kwargs):
+    """Expire the cached dashboards showing the approved expense"""
+    if raw:
+        return
+    if ApprovalRecord.expense.is_cached(instance):
+        _invalidate_expense_dashboards(instance.expense)
+        return
+    # The expense may already be gone when its records are cascade-deleted
+    row = Expense.objects.filter(pk=instance.expense_id).values_list('company_id', 'user__user_set_id', 'user_id').first()
+    if row:
+        invalidate_dashboards(*([pk] for pk in row))
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_dashboards(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Expire the cached dashboards counting or showing the user"""
+    if raw or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    company_ids = [instance.company_id]
+    user_set_ids = [instance.user_set_id]
+    stored = getattr(instance, '_stored_membership', None)
+    if stored:
+        company_ids.append(stored[0])
+        user_set_ids.append(stored[2])
+    invalidate_dashboards(company_ids, user_set_ids, [instance.pk])
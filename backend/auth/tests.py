@@ -1,3 +1,1586 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, models
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from . import business_calendar, exchange_rates
+from .checks import check_shared_cache
+from .business_calendar import escalation_deadline
+from .dashboard_cache import get_or_render
+from .escalation import ESCALATION_LEASE, EscalationScheduler
+from .exchange_rates import (
+    FileRateProvider, RateCache, RateSeries, convert_many, get_rate, rate_cache, save_rates
+)
+from .http_client import CircuitBreaker, CircuitOpenError, OutboundClient, UpstreamError
+from .leases import acquire_lease, release_lease
+from .models import (
+    ApprovalInbox, ApprovalRecord, ApprovalRule, BusinessCalendar, Company, CompanyMonthlyStats, Expense, ExpenseDailyStats,
+    ExchangeRate, Holiday, ReferenceSnapshot, User, UserSet, WorkerLease
+)
+from .reference_data import COUNTRIES_KEY, COUNTRIES_URL, snapshot_cache, store_snapshot
+from .rollups import expense_fact, rebuild_stats
+from .rules import check_rule_set, get_rule_set, rule_sets
+from .workflow import (
+    ApproverResolver, StaleWorkflowState, advance_workflow, calculate_approval_percentage, check_escalations,
+    convert_currency, create_default_rules, escalate_overdue_expenses, get_applicable_rule, get_next_approver,
+    run_workflow_write, save_workflow_state, workflow_metrics
+)
+
+
+STATIC_RATES = {
+    'PROVIDER': 'auth.exchange_rates.StaticRateProvider',
+    'PROVIDER_OPTIONS': {'rates': {'USD': {'EUR': '0.80', 'GBP': '0.75', 'INR': '83.00'}}},
+    'BASE_CURRENCIES': ['USD'],
+}
+
+
+class WorkflowFixtureMixin:
+    """Company with an admin, one user set with a manager and an employee, and default rules"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(
+            name='Acme', address='1 Main St', phone='+1234567890',
+            email='acme@example.com', industry='Tech', size='11-50'
+        )
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass',
+            role='admin', company=cls.company, is_company_admin=True
+        )
+        cls.user_set = UserSet.objects.create(name='Sales', company=cls.company)
+        cls.manager = User.objects.create_user(
+            username='manager', email='manager@example.com', password='pass',
+            role='manager', company=cls.company, user_set=cls.user_set
+        )
+        cls.user_set.manager = cls.manager
+        cls.user_set.save()
+        cls.employee = User.objects.create_user(
+            username='employee', email='employee@example.com', password='pass',
+            role='employee', company=cls.company, user_set=cls.user_set
+        )
+        create_default_rules(cls.company)
+
+    def setUp(self):
+        # Cached dashboard responses outlive each test's rolled back writes
+        cache.clear()
+
+    def make_expense(self, **kwargs):
+        values = {
+            'user': self.employee, 'company': self.company, 'title': 'Taxi',
+            'amount': Decimal('100.00'), 'expense_date': date(2025, 1, 15),
+        }
+        values.update(kwargs)
+        values.setdefault('base_amount', values['amount'])
+        return Expense.objects.create(**values)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+
+class RateCacheTests(TestCase):
+    def test_expired_entries_are_reloaded(self):
+        cache = RateCache(ttl=0)
+        cache.set('key', 1)
+        time.sleep(0.001)
+        self.assertIsNone(cache.get('key'))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = RateCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+
+    def test_concurrent_misses_load_once(self):
+        cache = RateCache()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.05)
+            return Decimal('1.5')
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_load(('EUR', 'USD'), loader)))
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [Decimal('1.5')] * 10)
+
+
+@override_settings(EXCHANGE_RATES=STATIC_RATES)
+class ConvertCurrencyTests(TestCase):
+    def setUp(self):
+        rate_cache.clear()
+        call_command('refresh_exchange_rates', stdout=StringIO())
+
+    def test_refresh_command_stores_rates_from_provider(self):
+        self.assertEqual(ExchangeRate.objects.filter(base_currency='USD').count(), 3)
+        self.assertEqual(ExchangeRate.objects.get(target_currency='EUR').rate, Decimal('0.80'))
+
+    def test_refresh_command_upserts_existing_rows(self):
+        call_command(
+            'refresh_exchange_rates', stdout=StringIO(),
+            provider_options=json.dumps({'rates': {'USD': {'EUR': '0.90'}}})
+        )
+        self.assertEqual(ExchangeRate.objects.filter(base_currency='USD').count(), 3)
+        self.assertEqual(ExchangeRate.objects.get(target_currency='EUR').rate, Decimal('0.90'))
+
+    def test_converts_direct_inverse_and_cross_rates(self):
+        self.assertEqual(convert_currency(100, 'USD', 'EUR'), Decimal('80.00'))
+        self.assertEqual(convert_currency(80, 'EUR', 'USD'), Decimal('100.00'))
+        self.assertEqual(convert_currency(75, 'GBP', 'EUR'), Decimal('80.00'))
+
+    def test_cached_rate_needs_no_queries(self):
+        get_rate('EUR', 'USD')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_rate('EUR', 'USD'), Decimal('1') / Decimal('0.80'))
+
+    def test_rates_saved_by_another_process_replace_a_cached_miss(self):
+        self.assertIsNone(get_rate('EUR', 'JPY'))
+        # Another process stores the rates: only the shared version tells this one
+        with mock.patch.object(rate_cache, 'clear'):
+            save_rates('USD', {'JPY': Decimal('150')}, timezone.now())
+        self.assertEqual(get_rate('EUR', 'JPY'), Decimal('150') / Decimal('0.80'))
+
+    def test_conversion_never_calls_provider(self):
+        with mock.patch('auth.exchange_rates.StaticRateProvider.fetch') as fetch:
+            convert_currency(10, 'INR', 'USD')
+        fetch.assert_not_called()
+
+    def test_unknown_currency_falls_back_to_original_amount(self):
+        self.assertEqual(convert_currency(42, 'XYZ', 'USD'), Decimal('42'))
+
+
+@override_settings(EXCHANGE_RATES=STATIC_RATES)
+class HistoricalRateTests(TestCase):
+    def setUp(self):
+        rate_cache.clear()
+        for day, rate in [(1, '0.90'), (10, '0.80'), (20, '0.70')]:
+            as_of = timezone.make_aware(datetime(2025, 1, day))
+            save_rates('USD', {'EUR': Decimal(rate)}, as_of)
+
+    def test_rate_series_bisects_to_latest_rate_on_or_before_date(self):
+        series = RateSeries([(date(2025, 1, 1), Decimal('1.5')), (date(2025, 1, 5), Decimal('2.25'))])
+        self.assertEqual(series.rate_on(date(2024, 12, 1)), Decimal('1.5'))
+        self.assertEqual(series.rate_on(date(2025, 1, 4)), Decimal('1.5'))
+        self.assertEqual(series.rate_on(date(2025, 1, 5)), Decimal('2.25'))
+        self.assertEqual(series.rate_on(None), Decimal('2.25'))
+
+    def test_converts_at_expense_date(self):
+        self.assertEqual(convert_currency(100, 'USD', 'EUR', date(2025, 1, 5)), Decimal('90.00'))
+        self.assertEqual(convert_currency(100, 'USD', 'EUR', date(2025, 1, 15)), Decimal('80.00'))
+        self.assertEqual(convert_currency(100, 'USD', 'EUR'), Decimal('70.00'))
+
+    def test_convert_many_loads_each_pair_once(self):
+        rows = [(100, 'USD', 'EUR', date(2025, 1, day)) for day in range(1, 29)]
+        with self.assertNumQueries(1):
+            results = convert_many(rows)
+        self.assertEqual(results[0], (Decimal('90.00'), Decimal('0.9')))
+        self.assertEqual(results[-1], (Decimal('70.00'), Decimal('0.7')))
+
+    def test_history_command_loads_every_dated_table(self):
+        handle = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+        json.dump([
+            {'base': 'USD', 'date': '2024-06-01', 'rates': {'GBP': 0.79}},
+            {'base': 'USD', 'date': '2024-07-01', 'rates': {'GBP': 0.78}},
+        ], handle)
+        handle.close()
+        self.addCleanup(os.unlink, handle.name)
+
+        call_command(
+            'refresh_exchange_rates', '--history', stdout=StringIO(),
+            provider='auth.exchange_rates.FileRateProvider', provider_options=json.dumps({'path': handle.name})
+        )
+        self.assertEqual(ExchangeRate.objects.filter(target_currency='GBP').count(), 2)
+        self.assertEqual(get_rate('USD', 'GBP', date(2024, 6, 15)), Decimal('0.79'))
+
+
+class FileRateProviderTests(TestCase):
+    def _write(self, suffix, content):
+        handle = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False)
+        handle.write(content)
+        handle.close()
+        self.addCleanup(os.unlink, handle.name)
+        return handle.name
+
+    def test_reads_json_payload(self):
+        path = self._write('.json', json.dumps({'base': 'USD', 'date': '2025-10-04', 'rates': {'EUR': 0.85}}))
+        data = FileRateProvider(path).fetch('USD')
+        self.assertEqual(data['rates'], {'EUR': Decimal('0.85')})
+        self.assertEqual(data['as_of'].date().isoformat(), '2025-10-04')
+
+    def test_reads_csv_rows(self):
+        path = self._write('.csv', 'base,currency,rate\nUSD,EUR,0.85\nUSD,JPY,150.1\n')
+        data = FileRateProvider(path).fetch('USD')
+        self.assertEqual(data['rates'], {'EUR': Decimal('0.85'), 'JPY': Decimal('150.1')})
+
+
+@override_settings(EXCHANGE_RATES=STATIC_RATES)
+class BaseAmountTests(WorkflowFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        rate_cache.clear()
+        save_rates('USD', {'EUR': Decimal('0.80')}, timezone.make_aware(datetime(2025, 1, 1)))
+
+    def test_submission_stores_rate_and_base_amount(self):
+        response = self.client_for(self.employee).post(reverse('submit-expense'), {
+            'title': 'Hotel', 'amount': '80.00', 'currency': 'EUR', 'expense_date': '2025-01-15'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        expense = Expense.objects.get(title='Hotel')
+        self.assertEqual(expense.exchange_rate, Decimal('1.250000'))
+        self.assertEqual(expense.base_amount, Decimal('100.00'))
+        self.assertEqual(response.data['expense']['converted_amount'], Decimal('100.00'))
+
+    def test_rule_is_matched_on_the_base_amount(self):
+        # 4500 EUR is 5625 USD, inside the medium band
+        response = self.client_for(self.employee).post(reverse('submit-expense'), {
+            'title': 'Hotel', 'amount': '4500.00', 'currency': 'EUR', 'expense_date': '2025-01-15'
+        }, format='json')
+        self.assertEqual(response.data['expense']['approval_rule_name'], 'Medium Amount - Manager to Admin')
+
+    def test_plain_expense_creation_stores_base_amount(self):
+        response = self.client_for(self.employee).post(reverse('expense-list-create'), {
+            'title': 'Lunch', 'amount': '20.00', 'currency': 'USD', 'expense_date': '2025-01-15'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        expense = Expense.objects.get(title='Lunch')
+        self.assertEqual((expense.exchange_rate, expense.base_amount), (Decimal('1'), Decimal('20.00')))
+
+    def test_editing_amount_recomputes_base_amount(self):
+        expense = self.make_expense(currency='EUR', base_amount=None)
+        self.client_for(self.employee).patch(
+            reverse('expense-detail', args=[expense.id]), {'amount': '40.00'}, format='json'
+        )
+        expense.refresh_from_db()
+        self.assertEqual(expense.base_amount, Decimal('50.00'))
+
+    def test_backfill_command_converts_missing_rows(self):
+        eur = self.make_expense(currency='EUR', amount=Decimal('8.00'), base_amount=None)
+        usd = self.make_expense(amount=Decimal('5.00'), base_amount=None)
+        call_command('backfill_base_amounts', chunk_size=1, stdout=StringIO())
+        eur.refresh_from_db()
+        usd.refresh_from_db()
+        self.assertEqual(eur.base_amount, Decimal('10.00'))
+        self.assertEqual(usd.base_amount, Decimal('5.00'))
+
+    def test_backfill_command_updates_rollups_and_dashboards(self):
+        client = self.client_for(self.employee)
+        self.make_expense(currency='EUR', amount=Decimal('8.00'), base_amount=None)
+        self.assertEqual(client.get(reverse('employee-dashboard')).data['total_submitted'], Decimal('0'))
+
+        call_command('backfill_base_amounts', stdout=StringIO())
+
+        self.assertEqual(ExpenseDailyStats.objects.get().amount, Decimal('10.00'))
+        self.assertEqual(CompanyMonthlyStats.objects.get().amount, Decimal('10.00'))
+        self.assertEqual(client.get(reverse('employee-dashboard')).data['total_submitted'], Decimal('10.00'))
+
+    def test_admin_dashboard_sums_base_amounts(self):
+        self.make_expense(currency='EUR', amount=Decimal('80.00'), base_amount=Decimal('100.00'))
+        self.make_expense(amount=Decimal('50.00'))
+        response = self.client_for(self.admin).get(reverse('admin-dashboard'))
+        self.assertEqual(response.data['monthly_expenses'], Decimal('150.00'))
+
+
+@override_settings(EXCHANGE_RATES=STATIC_RATES)
+class BatchConversionTests(WorkflowFixtureMixin, TestCase):
+    def setUp(self):
+        rate_cache.clear()
+        save_rates('USD', {'EUR': Decimal('0.90')}, timezone.make_aware(datetime(2025, 1, 1)))
+        save_rates('USD', {'EUR': Decimal('0.80')}, timezone.make_aware(datetime(2025, 2, 1)))
+
+    def test_converts_objects_and_tuples_in_one_response(self):
+        response = self.client_for(self.employee).post(reverse('convert-currencies'), {'conversions': [
+            {'amount': '90.00', 'from': 'eur', 'to': 'USD', 'date': '2025-01-15'},
+            ['80.00', 'EUR', 'USD', '2025-02-15'],
+            ['10.00', 'USD', 'XYZ', None],
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([result['converted_amount'] for result in results], [Decimal('100.00'), Decimal('100.00'), None])
+        self.assertEqual(results[0]['from'], 'EUR')
+        self.assertEqual([result['rate'] for result in results], [Decimal('1') / Decimal('0.9'), Decimal('1') / Decimal('0.8'), None])
+
+    def test_each_rate_is_resolved_once(self):
+        with mock.patch('auth.exchange_rates._rate', wraps=exchange_rates._rate) as resolve:
+            self.client_for(self.employee).post(reverse('convert-currencies'), [
+                ['90.00', 'EUR', 'USD', '2025-01-15'], ['80.00', 'EUR', 'USD', '2025-02-15'],
+            ], format='json')
+        self.assertEqual(resolve.call_count, 2)
+
+    def test_rejects_invalid_entries(self):
+        response = self.client_for(self.employee).post(
+            reverse('convert-currencies'), [{'amount': 'abc', 'from': 'EUR'}], format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class CountriesSnapshotTests(WorkflowFixtureMixin, TestCase):
+    COUNTRIES = [{'name': {'common': 'France'}, 'currencies': {'EUR': {'name': 'Euro', 'symbol': '€'}}}]
+
+    def setUp(self):
+        snapshot_cache.clear()
+        self.client = self.client_for(self.employee)
+
+    def test_serves_snapshot_with_etag_and_answers_304(self):
+        store_snapshot(COUNTRIES_KEY, self.COUNTRIES, COUNTRIES_URL)
+        response = self.client.get(reverse('countries-currencies'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), self.COUNTRIES)
+
+        revalidated = self.client.get(reverse('countries-currencies'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b'')
+
+    def test_serves_precompressed_gzip(self):
+        store_snapshot(COUNTRIES_KEY, self.COUNTRIES, COUNTRIES_URL)
+        response = self.client.get(reverse('countries-currencies'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content)), self.COUNTRIES)
+
+    def test_gzip_refused_by_q_value_is_not_served(self):
+        store_snapshot(COUNTRIES_KEY, self.COUNTRIES, COUNTRIES_URL)
+        for header in ['gzip;q=0, identity', 'br, *;q=0.5, gzip; q=0.0', 'identity']:
+            response = self.client.get(reverse('countries-currencies'), HTTP_ACCEPT_ENCODING=header)
+            self.assertNotIn('Content-Encoding', response, header)
+            self.assertEqual(json.loads(response.content), self.COUNTRIES)
+        response = self.client.get(reverse('countries-currencies'), HTTP_ACCEPT_ENCODING='br;q=1, *;q=0.1')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_missing_snapshot_answers_503_without_calling_upstream(self):
+        with mock.patch('auth.reference_data.fetch_countries') as fetch:
+            with self.assertLogs('auth.reference_data', 'ERROR'):
+                self.assertEqual(self.client.get(reverse('countries-currencies')).status_code, 503)
+        fetch.assert_not_called()
+        # The absence is not cached: a snapshot stored by another process is served next
+        ReferenceSnapshot.objects.create(
+            key=COUNTRIES_KEY, payload=json.dumps(self.COUNTRIES), etag='x',
+            source_url=COUNTRIES_URL, fetched_at=timezone.now()
+        )
+        response = self.client.get(reverse('countries-currencies'))
+        self.assertEqual(json.loads(response.content), self.COUNTRIES)
+
+    def test_cached_snapshot_needs_no_queries(self):
+        store_snapshot(COUNTRIES_KEY, self.COUNTRIES, COUNTRIES_URL)
+        self.client.get(reverse('countries-currencies'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('countries-currencies'))
+
+    def test_refresh_command_stores_upstream_data(self):
+        with mock.patch('auth.reference_data.fetch_countries', return_value=self.COUNTRIES):
+            call_command('refresh_countries', stdout=StringIO())
+        self.assertEqual(json.loads(ReferenceSnapshot.objects.get(key=COUNTRIES_KEY).payload), self.COUNTRIES)
+
+
+class OutboundClientTests(TestCase):
+    def make_client(self, **config):
+        config.setdefault('BACKOFF_BASE', 0)
+        return OutboundClient(config)
+
+    def response(self, status_code, payload=None):
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = json.dumps(payload or {}).encode()
+        return response
+
+    def test_retries_connection_errors_then_succeeds(self):
+        client = self.make_client(MAX_RETRIES=2)
+        with mock.patch.object(client.session, 'request', side_effect=[
+            requests.ConnectionError('reset'), self.response(200, {'ok': True})
+        ]) as request:
+            self.assertEqual(client.get_json('https://api.example.com/x'), {'ok': True})
+        self.assertEqual(request.call_count, 2)
+
+    def test_uses_per_host_timeout(self):
+        client = self.make_client(HOST_TIMEOUTS={'slow.example.com': (1, 60)})
+        with mock.patch.object(client.session, 'request', return_value=self.response(200)) as request:
+            client.get_json('https://slow.example.com/data')
+            client.get_json('https://api.example.com/data')
+        self.assertEqual(request.call_args_list[0].kwargs['timeout'], (1, 60))
+        self.assertEqual(request.call_args_list[1].kwargs['timeout'], client.config['TIMEOUT'])
+
+    def test_circuit_opens_and_fails_fast(self):
+        client = self.make_client(MAX_RETRIES=0, BREAKER_FAILURE_THRESHOLD=2, BREAKER_RESET_TIMEOUT=60)
+        with mock.patch.object(client.session, 'request', side_effect=requests.Timeout('slow')) as request:
+            for _ in range(2):
+                with self.assertRaises(UpstreamError):
+                    client.get_json('https://down.example.com/')
+            with self.assertRaises(CircuitOpenError):
+                client.get_json('https://down.example.com/')
+        self.assertEqual(request.call_count, 2)
+
+    def test_half_open_trial_closes_circuit_on_success(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_trial_reopens_circuit_on_any_request_error(self):
+        client = self.make_client(MAX_RETRIES=2, BREAKER_FAILURE_THRESHOLD=1, BREAKER_RESET_TIMEOUT=0)
+        breaker = client.breaker_for('flaky.example.com')
+        breaker.record_failure()
+        error = requests.exceptions.ChunkedEncodingError('truncated')
+        with mock.patch.object(client.session, 'request', side_effect=error) as request:
+            with self.assertRaises(UpstreamError):
+                client.get_json('https://flaky.example.com/')
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+
+class ApprovalRuleIndexTests(WorkflowFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        rule_sets.clear()
+
+    def orm_lookup(self, amount, urgent=False):
+        # The query get_applicable_rule used to run
+        rules = ApprovalRule.objects.filter(company=self.company, is_active=True).order_by('min_amount', 'pk')
+        if urgent and rules.filter(urgent_bypass=True).exists():
+            return rules.filter(urgent_bypass=True).first()
+        return rules.filter(min_amount__lte=amount).filter(
+            Q(max_amount__gte=amount) | Q(max_amount__isnull=True)
+        ).first()
+
+    def test_warm_lookup_needs_no_queries(self):
+        get_applicable_rule(Decimal('100.00'), self.company)
+        with self.assertNumQueries(0):
+            rule = get_applicable_rule(Decimal('100.00'), self.company)
+        self.assertEqual(rule.min_amount, Decimal('0'))
+
+    def test_matches_orm_lookup_for_overlapping_and_gapped_rules(self):
+        ApprovalRule.objects.filter(company=self.company).update(urgent_bypass=False)
+        ApprovalRule.objects.create(
+            name='Overlap', min_amount=Decimal('4000'), max_amount=Decimal('6000'),
+            sequence=['manager'], company=self.company, urgent_bypass=False
+        )
+        ApprovalRule.objects.filter(company=self.company, min_amount__gt=Decimal('20000')).update(
+            min_amount=Decimal('30000')
+        )
+        rule_sets.clear()
+        amounts = ['0', '0.01', '3999.99', '4000', '5000', '5000.01', '5001', '6000', '6000.01',
+                   '25000', '25000.01', '29999.99', '30000', '1000000']
+        for amount in map(Decimal, amounts):
+            for urgent in (False, True):
+                self.assertEqual(get_applicable_rule(amount, self.company, urgent), self.orm_lookup(amount, urgent), amount)
+
+    def test_urgent_expenses_use_bypass_rule(self):
+        rule = ApprovalRule.objects.filter(company=self.company, urgent_bypass=True).order_by('min_amount').first()
+        self.assertEqual(get_applicable_rule(Decimal('30000'), self.company, urgent=True), rule)
+
+    def test_saving_a_rule_invalidates_the_index(self):
+        get_rule_set(self.company.pk)
+        ApprovalRule.objects.create(
+            name='Tiny', min_amount=Decimal('-10'), max_amount=Decimal('-1'),
+            sequence=['manager'], company=self.company
+        )
+        self.assertEqual(get_applicable_rule(Decimal('-5'), self.company).name, 'Tiny')
+
+    def test_deleting_a_rule_invalidates_the_index(self):
+        rule = get_applicable_rule(Decimal('100'), self.company)
+        rule.delete()
+        self.assertIsNone(get_applicable_rule(Decimal('100'), self.company))
+
+    def test_evicted_version_never_revives_a_stale_index(self):
+        get_rule_set(self.company.pk)
+        # Another process changes the rules and bumps the version, which is then evicted
+        ApprovalRule.objects.filter(company=self.company).update(is_active=False)
+        cache.set(f'approval_rules:version:{self.company.pk}', 'other', None)
+        cache.delete(f'approval_rules:version:{self.company.pk}')
+        self.assertIsNone(get_applicable_rule(Decimal('100'), self.company))
+
+
+class RuleSetValidationTests(WorkflowFixtureMixin, TestCase):
+    def rule_payload(self, **kwargs):
+        payload = {
+            'name': 'Travel', 'min_amount': '100.00', 'max_amount': '200.00',
+            'sequence': ['manager'], 'percentage_required': 100,
+            'admin_override': True, 'urgent_bypass': False, 'is_active': True,
+        }
+        payload.update(kwargs)
+        return payload
+
+    def test_default_rules_leave_no_gaps_or_overlaps(self):
+        report = check_rule_set(ApprovalRule.objects.filter(company=self.company))
+        self.assertEqual(report, {'valid': True, 'overlaps': [], 'gaps': []})
+        self.assertEqual(get_applicable_rule(Decimal('5000.50'), self.company).name, 'Medium Amount - Manager to Admin')
+
+    def test_sweep_reports_gaps_and_overlaps(self):
+        rules = [
+            ApprovalRule(pk=1, name='A', min_amount=Decimal('10'), max_amount=Decimal('100')),
+            ApprovalRule(pk=2, name='B', min_amount=Decimal('50'), max_amount=Decimal('150')),
+            ApprovalRule(pk=3, name='C', min_amount=Decimal('200'), max_amount=Decimal('300')),
+        ]
+        report = check_rule_set(rules)
+        self.assertFalse(report['valid'])
+        self.assertEqual(report['overlaps'], [{
+            'rules': [{'id': 1, 'name': 'A'}, {'id': 2, 'name': 'B'}], 'from': '50.00', 'to': '100.00'
+        }])
+        self.assertEqual(report['gaps'], [
+            {'from': '0.00', 'to': '9.99'},
+            {'from': '150.01', 'to': '199.99'},
+            {'from': '300.01', 'to': None},
+        ])
+
+    def test_create_rejects_overlapping_band(self):
+        response = self.client_for(self.admin).post(
+            reverse('create-approval-rule'), self.rule_payload(), format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['overlaps'][0]['rules'][0]['name'], 'Low Amount - Manager Only')
+        self.assertFalse(ApprovalRule.objects.filter(name='Travel').exists())
+
+    def test_update_is_checked_against_other_rules_only(self):
+        rule = ApprovalRule.objects.get(company=self.company, name='Low Amount - Manager Only')
+        client = self.client_for(self.admin)
+        url = reverse('approval-rule-detail', args=[rule.id])
+
+        response = client.put(url, self.rule_payload(name=rule.name, min_amount='0.00', max_amount='4000.00'), format='json')
+        self.assertEqual(response.status_code, 200)
+
+        response = client.put(url, self.rule_payload(name=rule.name, min_amount='0.00', max_amount='6000.00'), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['gaps'], [])
+
+    def test_inverted_band_is_rejected(self):
+        ApprovalRule.objects.filter(company=self.company).delete()
+        response = self.client_for(self.admin).post(
+            reverse('create-approval-rule'), self.rule_payload(min_amount='300.00'), format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('max_amount', response.data)
+
+    def test_validate_endpoint_reports_gaps(self):
+        ApprovalRule.objects.filter(company=self.company, max_amount__isnull=True).delete()
+        response = self.client_for(self.admin).get(reverse('validate-approval-rules'))
+        self.assertEqual(response.data['gaps'], [{'from': '25000.01', 'to': None}])
+
+
+class RuleSimulationTests(WorkflowFixtureMixin, TestCase):
+    def setUp(self):
+        submitted = timezone.now() - timezone.timedelta(days=10)
+        for amount in ['100.00', '5000.00', '5000.50', '30000.00']:
+            expense = self.make_expense(amount=Decimal(amount), status='approved')
+            Expense.objects.filter(pk=expense.pk).update(submission_date=submitted)
+            expense.approval_records.create(
+                approver=self.manager, role='manager', status='approved',
+                approved_at=submitted + timezone.timedelta(hours=10)
+            )
+        urgent = self.make_expense(amount=Decimal('200.00'), urgent=True, status='approved')
+        Expense.objects.filter(pk=urgent.pk).update(submission_date=submitted)
+        urgent.approval_records.create(
+            approver=self.admin, role='admin', status='approved',
+            approved_at=submitted + timezone.timedelta(hours=30)
+        )
+
+    def simulate(self, rules, **kwargs):
+        return self.client_for(self.admin).post(
+            reverse('simulate-approval-rules'), dict(rules=rules, **kwargs), format='json'
+        )
+
+    def band(self, name, min_amount, max_amount, sequence, urgent_bypass=False):
+        return {
+            'name': name, 'min_amount': min_amount, 'max_amount': max_amount,
+            'sequence': sequence, 'urgent_bypass': urgent_bypass,
+        }
+
+    def test_routes_expenses_to_proposed_bands(self):
+        response = self.simulate([
+            self.band('Small', '0.00', '1000.00', ['manager'], urgent_bypass=True),
+            self.band('Large', '1000.01', None, ['manager', 'admin']),
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([rule['expenses'] for rule in response.data['rules']], [2, 3])
+        self.assertEqual(response.data['unmatched'], 0)
+        self.assertEqual(response.data['admin_stage']['expenses'], 3)
+        self.assertEqual(response.data['baseline']['expenses'], 5)
+
+    def test_projects_escalations_from_stage_durations(self):
+        # Manager took 10h everywhere and admin 30h, so only manager+admin sequences breach 36h
+        response = self.simulate([
+            self.band('Small', '0.00', '1000.00', ['manager']),
+            self.band('Large', '1000.01', None, ['manager', 'admin']),
+        ], sla_hours=36)
+        self.assertEqual(response.data['escalations']['projected'], 3)
+        self.assertEqual(response.data['sequences'], [
+            {'sequence': ['manager'], 'expenses': 2, 'amount': 300.0},
+            {'sequence': ['manager', 'admin'], 'expenses': 3, 'amount': 40000.5},
+        ])
+
+    def test_each_rule_escalates_under_its_own_sla(self):
+        small = dict(self.band('Small', '0.00', '1000.00', ['manager']), sla_hours=8)
+        large = dict(self.band('Large', '1000.01', None, ['manager', 'admin']), sla_hours=48)
+        response = self.simulate([small, large])
+        # Manager took 10h on the two small expenses; 40h stays under the large band's 48h
+        self.assertEqual(response.data['escalations']['projected'], 2)
+        self.assertEqual([rule['sla_hours'] for rule in response.data['rules']], [8, 48])
+        self.assertFalse(response.data['escalations']['business_hours'])
+
+    def test_quorum_stage_time_spans_all_its_decisions(self):
+        submitted = timezone.now() - timezone.timedelta(days=10)
+        expense = self.make_expense(amount=Decimal('300.00'), status='approved')
+        Expense.objects.filter(pk=expense.pk).update(submission_date=submitted)
+        for hours in (40, 50):
+            expense.approval_records.create(
+                approver=self.manager, role='manager', status='approved',
+                approved_at=submitted + timezone.timedelta(hours=hours)
+            )
+        response = self.simulate([self.band('Small', '0.00', None, ['manager'])], sla_hours=48)
+        # The second manager decided 10h after the first, but the stage took 50h
+        self.assertEqual(response.data['escalations']['projected'], 1)
+
+    def test_slas_count_business_hours_with_a_calendar(self):
+        BusinessCalendar.objects.create(company=self.company)
+        friday_afternoon = datetime(2025, 1, 3, 15, tzinfo=timezone.utc)
+        Expense.objects.filter(company=self.company).update(submission_date=friday_afternoon)
+        ApprovalRecord.objects.filter(role='manager').update(approved_at=friday_afternoon + timezone.timedelta(hours=10))
+        ApprovalRecord.objects.filter(role='admin').update(approved_at=friday_afternoon + timezone.timedelta(hours=30))
+        response = self.simulate([
+            self.band('Small', '0.00', '1000.00', ['manager']),
+            self.band('Large', '1000.01', None, ['manager', 'admin']),
+        ], sla_hours=36)
+        # 40 wall-clock hours from Friday 15:00 are only 2 business hours
+        self.assertEqual(response.data['escalations']['projected'], 0)
+        self.assertTrue(response.data['escalations']['business_hours'])
+
+    def test_reports_unmatched_amounts_and_gaps(self):
+        response = self.simulate([self.band('Small', '0.00', '5000.00', ['manager'])])
+        self.assertEqual(response.data['unmatched'], 2)
+        self.assertEqual(response.data['gaps'], [{'from': '5000.01', 'to': None}])
+
+    def test_rejects_overlapping_proposals(self):
+        response = self.simulate([
+            self.band('A', '0.00', '1000.00', ['manager']),
+            self.band('B', '500.00', None, ['admin']),
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.data['overlaps']), 1)
+
+    def test_requires_admin(self):
+        response = self.client_for(self.manager).post(reverse('simulate-approval-rules'), {}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class BulkActionTests(WorkflowFixtureMixin, TestCase):
+    def queued_expense(self, amount='100.00', **kwargs):
+        amount = Decimal(amount)
+        return self.make_expense(
+            amount=amount, approval_rule=get_applicable_rule(amount, self.company), **kwargs
+        )
+
+    def bulk(self, user, **payload):
+        return self.client_for(user).post(reverse('bulk-expense-action'), payload, format='json')
+
+    def test_manager_approves_a_batch(self):
+        small = self.queued_expense('100.00')
+        medium = self.queued_expense('10000.00')
+        response = self.bulk(self.manager, action='approve', expense_ids=[small.id, medium.id, 999999])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['processed'], 2)
+        self.assertEqual([result['status'] for result in response.data['results']], ['Approved', 'In Progress', 'Error'])
+        self.assertEqual(response.data['results'][1]['next_approver'], 'admin')
+        small.refresh_from_db()
+        medium.refresh_from_db()
+        self.assertEqual((small.status, medium.status, medium.current_stage), ('approved', 'in_progress', 'admin'))
+        self.assertEqual(small.approval_records.get().id, response.data['results'][0]['approval_record_id'])
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def run(size):
+            ids = [self.queued_expense().id for _ in range(size)]
+            client = self.client_for(self.manager)
+            with CaptureQueriesContext(connection) as queries:
+                client.post(reverse('bulk-expense-action'), {'action': 'approve', 'expense_ids': ids}, format='json')
+            return len(queries)
+
+        # The first batch creates the day's rollup rows, later ones update them
+        run(1)
+        self.assertEqual(run(2), run(20))
+
+    def test_reports_expenses_the_approver_cannot_act_on(self):
+        other_set = UserSet.objects.create(name='Ops', company=self.company)
+        outsider = User.objects.create_user(
+            username='outsider', password='pass', role='employee', company=self.company, user_set=other_set
+        )
+        foreign = self.queued_expense(user=outsider)
+        done = self.queued_expense(status='approved')
+        response = self.bulk(self.manager, action='reject', comment='No', expense_ids=[foreign.id, done.id])
+
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual(response.data['results'][0]['message'], 'You can only act on expenses from your set')
+        self.assertEqual(response.data['results'][1]['message'], 'Expense is already approved')
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.status, 'pending')
+        # Rows the approver may not act on keep their version, so no other writer is made to retry
+        self.assertEqual(foreign.version, 0)
+
+    def test_only_written_expenses_get_a_new_version(self):
+        small = self.queued_expense('100.00')
+        done = self.queued_expense(status='approved')
+        self.bulk(self.manager, action='approve', expense_ids=[small.id, done.id])
+
+        self.assertEqual(Expense.objects.get(pk=small.pk).version, 1)
+        self.assertEqual(Expense.objects.get(pk=done.pk).version, 0)
+
+    def test_lost_race_answers_409(self):
+        expense = self.queued_expense()
+        with mock.patch('auth.views.bulk_advance_workflow', side_effect=StaleWorkflowState('changed')):
+            response = self.bulk(self.manager, action='approve', expense_ids=[expense.id])
+        self.assertEqual(response.status_code, 409)
+
+    def test_filter_selects_from_the_approver_queue(self):
+        queued = [self.queued_expense('10000.00', current_stage='admin', status='in_progress') for _ in range(3)]
+        self.queued_expense('100.00')
+        response = self.bulk(self.admin, action='approve', filter={'min_amount': '5000.00'})
+
+        self.assertEqual(response.data['processed'], 3)
+        self.assertEqual({result['expense_id'] for result in response.data['results']}, {e.id for e in queued})
+
+    def test_admin_override(self):
+        expense = self.queued_expense()
+        response = self.bulk(self.admin, action='override', decision='reject', comment='Dup', expense_ids=[expense.id])
+
+        self.assertEqual(response.data['results'][0]['status'], 'Overridden')
+        expense.refresh_from_db()
+        self.assertEqual((expense.status, expense.rejection_reason), ('rejected', 'Dup'))
+
+    def test_only_admins_override(self):
+        expense = self.queued_expense()
+        response = self.bulk(self.manager, action='override', decision='approve', expense_ids=[expense.id])
+        self.assertEqual(response.status_code, 400)
+
+
+class ApproverResolverTests(WorkflowFixtureMixin, TestCase):
+    def test_matches_get_next_approver(self):
+        orphan_set = UserSet.objects.create(name='Ops', company=self.company)
+        orphan = User.objects.create_user(
+            username='orphan', password='pass', role='employee', company=self.company, user_set=orphan_set
+        )
+        expenses = [self.make_expense(), self.make_expense(user=orphan)]
+        resolver = ApproverResolver.for_user(self.admin)
+        for expense in expenses:
+            for stage in ['manager', 'admin', 'finance']:
+                with self.assertNumQueries(0):
+                    resolved = resolver.next_approver(expense, stage)
+                self.assertEqual(resolved, get_next_approver(expense, stage))
+
+    def test_list_views_query_count_does_not_grow_with_rows(self):
+        def count_queries(url, user):
+            client = self.client_for(user)
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        for url, user in [(reverse('pending-approvals-workflow'), self.manager), (reverse('expense-history'), self.admin)]:
+            self.make_expense().approval_records.create(approver=self.manager, role='manager', status='pending')
+            few = count_queries(url, user)
+            for _ in range(5):
+                self.make_expense().approval_records.create(approver=self.manager, role='manager', status='pending')
+            self.assertEqual(count_queries(url, user), few)
+
+
+class ApprovalQuorumTests(WorkflowFixtureMixin, TestCase):
+    def setUp(self):
+        self.second_manager = User.objects.create_user(
+            username='manager2', password='pass', role='manager', company=self.company, user_set=self.user_set
+        )
+
+    def submit(self, amount='100.00'):
+        response = self.client_for(self.employee).post(reverse('submit-expense'), {
+            'title': 'Hotel', 'amount': amount, 'currency': 'USD', 'expense_date': '2025-01-15'
+        }, format='json')
+        return Expense.objects.get(pk=response.data['expense']['id'])
+
+    def approve(self, user, expense):
+        return self.client_for(user).post(reverse('approve-expense-workflow', args=[expense.id]), {}, format='json').data
+
+    def test_stage_waits_for_quorum_of_managers(self):
+        expense = self.submit('10000.00')
+        self.assertEqual(expense.stage_quorum, 2)
+
+        first = self.approve(self.manager, expense)
+        self.assertEqual((first['status'], first['current_stage']), ('In Progress', 'manager'))
+        self.assertEqual((first['approvals'], first['approvals_required']), (1, 2))
+
+        second = self.approve(self.second_manager, expense)
+        self.assertEqual(second['current_stage'], 'admin')
+        expense.refresh_from_db()
+        self.assertEqual((expense.stage_approval_count, expense.stage_quorum), (0, 1))
+        self.assertEqual((expense.approval_count, expense.approval_record_count), (2, 2))
+
+    def test_percentage_required_lowers_quorum(self):
+        for rule in ApprovalRule.objects.filter(company=self.company):
+            rule.percentage_required = 50
+            rule.save()
+        expense = self.submit()
+        self.assertEqual(expense.stage_quorum, 1)
+        self.assertEqual(self.approve(self.manager, expense)['status'], 'Approved')
+
+    def test_an_approver_counts_once_per_stage(self):
+        expense = self.submit()
+        self.approve(self.manager, expense)
+        result = self.approve(self.manager, expense)
+        self.assertEqual(result['message'], 'You have already approved this stage')
+        expense.refresh_from_db()
+        self.assertEqual(expense.stage_approval_count, 1)
+
+    def test_percentage_is_read_from_counters(self):
+        expense = self.submit()
+        self.client_for(self.manager).post(reverse('reject-expense-workflow', args=[expense.id]), {}, format='json')
+        expense.refresh_from_db()
+        with self.assertNumQueries(0):
+            self.assertEqual(calculate_approval_percentage(expense), 0)
+        self.assertEqual(expense.approval_record_count, 1)
+
+    def test_override_counts_as_a_record(self):
+        expense = self.submit()
+        self.approve(self.manager, expense)
+        self.client_for(self.admin).post(
+            reverse('admin-override-expense', args=[expense.id]), {'action': 'approve'}, format='json'
+        )
+        expense.refresh_from_db()
+        self.assertEqual(calculate_approval_percentage(expense), 50)
+
+
+class WorkflowConcurrencyTests(WorkflowFixtureMixin, TestCase):
+    def setUp(self):
+        workflow_metrics.reset()
+
+    def queued_expense(self):
+        amount = Decimal('100.00')
+        return self.make_expense(amount=amount, approval_rule=get_applicable_rule(amount, self.company))
+
+    def test_save_rejects_a_stale_version(self):
+        expense = self.queued_expense()
+        before = expense_fact(expense)
+        Expense.objects.filter(pk=expense.pk).update(version=models.F('version') + 1)
+        expense.status = 'approved'
+        with self.assertRaises(StaleWorkflowState):
+            save_workflow_state(expense, before)
+        expense.refresh_from_db()
+        self.assertEqual(expense.status, 'pending')
+
+    def test_conflicting_write_is_retried(self):
+        attempts = []
+
+        def write():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise StaleWorkflowState()
+            return 'done'
+
+        self.assertEqual(run_workflow_write(write), 'done')
+        self.assertEqual(workflow_metrics.snapshot()['conflicts'], 1)
+
+    def test_second_approver_sees_the_committed_state(self):
+        second_manager = User.objects.create_user(
+            username='manager2', password='pass', role='manager', company=self.company, user_set=self.user_set
+        )
+        expense = self.queued_expense()
+        stale_copy = Expense.objects.get(pk=expense.pk)
+
+        self.assertEqual(advance_workflow(expense, self.manager, 'approved')['status'], 'Approved')
+        result = advance_workflow(stale_copy, second_manager, 'approved')
+
+        self.assertEqual(result['message'], 'Expense is already approved')
+        expense.refresh_from_db()
+        self.assertEqual((expense.approval_count, expense.version), (1, 1))
+        self.assertEqual(expense.approval_records.count(), 1)
+
+    def test_bulk_action_claims_versions(self):
+        expense = self.queued_expense()
+        self.client_for(self.manager).post(
+            reverse('bulk-expense-action'), {'action': 'approve', 'expense_ids': [expense.id]}, format='json'
+        )
+        expense.refresh_from_db()
+        self.assertEqual(expense.version, 1)
+
+
+class WorkflowLockRetryTests(TransactionTestCase):
+    def setUp(self):
+        workflow_metrics.reset()
+
+    def test_database_locked_errors_are_retried(self):
+        calls = []
+
+        def write():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'done'
+
+        self.assertEqual(run_workflow_write(write), 'done')
+        metrics = workflow_metrics.snapshot()
+        self.assertEqual(metrics['lock_retries'], 2)
+        self.assertGreater(metrics['lock_wait_seconds'], 0)
+
+    def test_other_operational_errors_are_raised(self):
+        def write():
+            raise OperationalError('no such table')
+
+        with self.assertRaises(OperationalError):
+            run_workflow_write(write)
+
+
+class ApprovalInboxTests(WorkflowFixtureMixin, TestCase):
+    def submit(self, amount='100.00'):
+        response = self.client_for(self.employee).post(reverse('submit-expense'), {
+            'title': 'Hotel', 'amount': amount, 'currency': 'USD', 'expense_date': '2025-01-15'
+        }, format='json')
+        return Expense.objects.get(pk=response.data['expense']['id'])
+
+    def test_inbox_follows_the_workflow(self):
+        expense = self.submit('10000.00')
+        entry = ApprovalInbox.objects.get(expense=expense)
+        self.assertEqual((entry.stage, entry.user_set_id), ('manager', self.user_set.id))
+
+        self.client_for(self.manager).post(reverse('approve-expense-workflow', args=[expense.id]), {}, format='json')
+        self.assertEqual(ApprovalInbox.objects.get(expense=expense).stage, 'admin')
+
+        self.client_for(self.admin).post(reverse('approve-expense-workflow', args=[expense.id]), {}, format='json')
+        self.assertFalse(ApprovalInbox.objects.filter(expense=expense).exists())
+
+    def test_escalation_moves_entry_to_admin(self):
+        expense = self.submit()
+        Expense.objects.filter(pk=expense.pk).update(escalation_date=timezone.now() - timezone.timedelta(hours=1))
+        check_escalations()
+        self.assertEqual(ApprovalInbox.objects.get(expense=expense).stage, 'admin')
+
+    def test_pending_count_is_one_query(self):
+        self.submit()
+        self.submit()
+        client = self.client_for(self.manager)
+        with self.assertNumQueries(1):
+            response = client.get(reverse('pending-approval-count'))
+        self.assertEqual(response.data, {'count': 2})
+        self.assertEqual(len(client.get(reverse('pending-approvals-workflow')).data), 2)
+
+    def test_moving_a_user_rescopes_their_entries(self):
+        expense = self.submit()
+        other_set = UserSet.objects.create(name='Ops', company=self.company)
+        self.client_for(self.admin).patch(
+            reverse('update-user-set', args=[self.employee.id]), {'set_id': other_set.id}, format='json'
+        )
+        self.assertEqual(ApprovalInbox.objects.get(expense=expense).user_set, other_set)
+
+    def test_new_set_manager_takes_their_entries_along(self):
+        lead = User.objects.create_user(
+            username='lead', password='pass', role='manager', company=self.company, user_set=self.user_set
+        )
+        expense = self.make_expense(user=lead)
+        response = self.client_for(self.admin).post(
+            reverse('user-set-list-create'), {'name': 'Ops', 'manager_id': lead.id}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 201)
+        new_set = UserSet.objects.get(name='Ops')
+        self.assertEqual(ApprovalInbox.objects.get(expense=expense).user_set, new_set)
+        self.assertEqual(ExpenseDailyStats.objects.get(user=lead).user_set, new_set)
+
+    def test_rebuild_command_reconciles_drift(self):
+        waiting = self.submit()
+        done = self.make_expense(status='approved')
+        ApprovalInbox.objects.filter(expense=waiting).delete()
+        ApprovalInbox.objects.create(
+            expense=done, company=self.company, stage='manager', submission_date=done.submission_date
+        )
+
+        out = StringIO()
+        call_command('rebuild_approval_inbox', stdout=out)
+
+        self.assertIn('1 added or corrected, 1 removed', out.getvalue())
+        self.assertEqual(list(ApprovalInbox.objects.values_list('expense_id', flat=True)), [waiting.id])
+
+
+class EscalationTests(WorkflowFixtureMixin, TestCase):
+    def make_overdue(self, count, **kwargs):
+        overdue = timezone.now() - timezone.timedelta(hours=1)
+        return [self.make_expense(escalation_date=overdue, **kwargs) for _ in range(count)]
+
+    def test_escalates_in_chunks_and_returns_ids(self):
+        expenses = self.make_overdue(5, approval_rule=ApprovalRule.objects.get(company=self.company, min_amount=0))
+        Expense.objects.filter(pk=expenses[0].pk).update(stage_approval_count=1)
+        waiting = self.make_expense(escalation_date=timezone.now() + timezone.timedelta(hours=1))
+        done = self.make_overdue(1, status='approved')[0]
+
+        escalated_ids = escalate_overdue_expenses(chunk_size=2)
+
+        self.assertEqual(escalated_ids, [expense.pk for expense in expenses])
+        for expense in Expense.objects.filter(pk__in=escalated_ids):
+            self.assertEqual((expense.current_stage, expense.status, expense.escalated), ('admin', 'in_progress', True))
+            self.assertEqual((expense.stage_approval_count, expense.stage_quorum, expense.version), (0, 1, 1))
+        self.assertEqual(ApprovalInbox.objects.filter(expense_id__in=escalated_ids, stage='admin').count(), 5)
+        self.assertFalse(Expense.objects.get(pk=waiting.pk).escalated)
+        self.assertFalse(Expense.objects.get(pk=done.pk).escalated)
+        self.assertEqual(escalate_overdue_expenses(), [])
+
+    def test_escalation_keeps_partial_admin_quorum(self):
+        second_admin = User.objects.create_user(
+            username='admin2', password='pass', role='admin', company=self.company, is_company_admin=True
+        )
+        rule = ApprovalRule.objects.get(company=self.company, min_amount=Decimal('5000.01'))
+        expense = self.make_expense(
+            amount=Decimal('10000.00'), approval_rule=rule, status='in_progress', current_stage='admin', stage_quorum=2,
+            escalation_date=timezone.now() + timezone.timedelta(hours=1)
+        )
+        advance_workflow(expense, self.admin, 'approved')
+        Expense.objects.filter(pk=expense.pk).update(escalation_date=timezone.now() - timezone.timedelta(hours=1))
+
+        self.assertEqual(escalate_overdue_expenses(), [expense.pk])
+        expense.refresh_from_db()
+        self.assertEqual((expense.escalated, expense.stage_approval_count, expense.stage_quorum), (True, 1, 2))
+
+        result = advance_workflow(expense, second_admin, 'approved')
+        expense.refresh_from_db()
+        self.assertEqual((result['status'], expense.status), ('Approved', 'approved'))
+
+    def test_queries_grow_with_chunks_not_rows(self):
+        counts = []
+        # The first run creates the day's rollup rows, later ones update them
+        for rows in (1, 5, 40):
+            self.make_overdue(rows)
+            with CaptureQueriesContext(connection) as queries:
+                escalate_overdue_expenses(chunk_size=50)
+            counts.append(len(queries))
+        self.assertEqual(counts[1], counts[2])
+
+    def test_command_reports_throughput(self):
+        self.make_overdue(3)
+        out = StringIO()
+        call_command('check_escalations', '--chunk-size', '2', stdout=out)
+        self.assertIn('Successfully escalated 3 expenses', out.getvalue())
+        self.assertIn('expenses/s', out.getvalue())
+
+    def test_view_returns_escalated_ids(self):
+        expenses = self.make_overdue(2)
+        response = self.client_for(self.admin).post(reverse('check-escalations'))
+        self.assertEqual(response.data['escalated_count'], 2)
+        self.assertEqual(response.data['escalated_ids'], [expense.pk for expense in expenses])
+
+    def test_view_only_escalates_the_admins_company(self):
+        other = Company.objects.create(
+            name='Other Co', address='2 Main St', phone='+1234567891',
+            email='other@example.com', industry='Tech', size='11-50'
+        )
+        outsider = User.objects.create_user(username='outsider', password='pass', role='employee', company=other)
+        foreign = self.make_overdue(1, user=outsider, company=other)[0]
+        own = self.make_overdue(1)[0]
+
+        response = self.client_for(self.admin).post(reverse('check-escalations'))
+
+        self.assertEqual(response.data['escalated_ids'], [own.pk])
+        self.assertFalse(Expense.objects.get(pk=foreign.pk).escalated)
+
+
+class EscalationSchedulerTests(WorkflowFixtureMixin, TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.escalated = []
+        self.scheduler = EscalationScheduler(
+            poll_interval=5, resync_interval=300, on_escalated=lambda ids, delay: self.escalated.append((ids, delay))
+        )
+
+    def at(self, seconds):
+        return self.now + timezone.timedelta(seconds=seconds)
+
+    def test_resync_fires_backlog_and_sleeps_until_next_due(self):
+        overdue = self.make_expense(escalation_date=self.at(-60))
+        soon = self.make_expense(escalation_date=self.at(3))
+        later = self.make_expense(escalation_date=self.at(3600))
+
+        wait = self.scheduler.run_once(self.now)
+
+        self.assertEqual(self.escalated[0][0], [overdue.pk])
+        self.assertEqual(self.escalated[0][1], timezone.timedelta(seconds=60))
+        self.assertEqual(wait, 3)
+        self.assertEqual(set(self.scheduler.due), {soon.pk})
+        self.assertNotIn(later.pk, self.scheduler.due)
+
+        self.scheduler.run_once(self.at(3))
+        self.assertTrue(Expense.objects.get(pk=soon.pk).escalated)
+        self.assertFalse(Expense.objects.get(pk=later.pk).escalated)
+
+    def test_change_feed_schedules_new_submissions(self):
+        self.assertEqual(self.scheduler.run_once(self.now), 5)
+        expense = self.make_expense(escalation_date=self.at(7))
+
+        self.assertEqual(self.scheduler.run_once(self.at(1)), 5)
+        self.assertEqual(self.scheduler.run_once(self.at(6)), 1)
+        self.scheduler.run_once(self.at(7))
+
+        self.assertEqual(self.escalated, [([expense.pk], timezone.timedelta(0))])
+        self.assertEqual(ApprovalInbox.objects.get(expense=expense).stage, 'admin')
+
+    def test_decided_expenses_are_not_escalated(self):
+        expense = self.make_expense(escalation_date=self.at(2))
+        self.scheduler.run_once(self.now)
+        Expense.objects.filter(pk=expense.pk).update(status='approved')
+
+        self.scheduler.run_once(self.at(2))
+
+        self.assertFalse(Expense.objects.get(pk=expense.pk).escalated)
+        self.assertEqual(self.escalated, [])
+        self.assertEqual(self.scheduler.heap, [])
+
+    def test_idle_poll_is_one_query(self):
+        self.scheduler.run_once(self.now)
+        with self.assertNumQueries(1):
+            self.scheduler.run_once(self.at(1))
+
+
+class WorkerLeaseTests(WorkflowFixtureMixin, TestCase):
+    def test_lease_is_exclusive_until_it_expires(self):
+        now = timezone.now()
+        self.assertTrue(acquire_lease('job', 'node-a', 60, now))
+        self.assertFalse(acquire_lease('job', 'node-b', 60, now))
+        self.assertTrue(acquire_lease('job', 'node-a', 60, now + timezone.timedelta(seconds=30)))
+        self.assertFalse(acquire_lease('job', 'node-b', 60, now + timezone.timedelta(seconds=60)))
+
+        self.assertTrue(acquire_lease('job', 'node-b', 60, now + timezone.timedelta(seconds=91)))
+        self.assertEqual(WorkerLease.objects.get(name='job').owner, 'node-b')
+
+    def test_released_lease_can_be_taken(self):
+        acquire_lease('job', 'node-a', 60)
+        release_lease('job', 'node-b')
+        self.assertFalse(acquire_lease('job', 'node-b', 60))
+        release_lease('job', 'node-a')
+        self.assertTrue(acquire_lease('job', 'node-b', 60))
+
+    def test_standby_scheduler_does_not_escalate(self):
+        expense = self.make_expense(escalation_date=timezone.now() - timezone.timedelta(minutes=1))
+        active = EscalationScheduler(owner='node-a')
+        standby = EscalationScheduler(owner='node-b')
+
+        now = timezone.now()
+        acquire_lease(ESCALATION_LEASE, 'node-a', 60, now)
+        self.assertEqual(standby.run_once(now), 5)
+        self.assertFalse(Expense.objects.get(pk=expense.pk).escalated)
+
+        active.run_once(now)
+        self.assertTrue(Expense.objects.get(pk=expense.pk).escalated)
+
+    def test_command_skips_while_another_node_holds_the_lease(self):
+        self.make_expense(escalation_date=timezone.now() - timezone.timedelta(minutes=1))
+        acquire_lease(ESCALATION_LEASE, 'other-node', 60)
+        out = StringIO()
+        call_command('check_escalations', stdout=out)
+        self.assertIn('Another worker holds the escalation lease', out.getvalue())
+        self.assertEqual(Expense.objects.filter(escalated=True).count(), 0)
+
+
+class BusinessCalendarTests(WorkflowFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        business_calendar.calendars.clear()
+        self.rule = ApprovalRule.objects.get(company=self.company, min_amount=0)
+
+    def utc(self, *args):
+        return datetime(*args, tzinfo=timezone.utc)
+
+    def deadline(self, start, hours):
+        self.rule.sla_hours = hours
+        return escalation_deadline(self.company.id, self.rule, start)
+
+    def test_without_calendar_sla_is_wall_clock(self):
+        self.assertEqual(self.deadline(self.utc(2025, 1, 3, 15), 8), self.utc(2025, 1, 3, 23))
+
+    def test_weekends_and_holidays_are_skipped(self):
+        calendar = BusinessCalendar.objects.create(company=self.company)
+        friday_afternoon = self.utc(2025, 1, 3, 15)
+        self.assertEqual(self.deadline(friday_afternoon, 8), self.utc(2025, 1, 6, 15))
+        self.assertEqual(self.deadline(self.utc(2025, 1, 4, 12), 1), self.utc(2025, 1, 6, 10))
+
+        Holiday.objects.create(calendar=calendar, date=date(2025, 1, 6), name='Founders Day')
+        self.assertEqual(self.deadline(friday_afternoon, 8), self.utc(2025, 1, 7, 15))
+
+    def test_company_time_zone(self):
+        BusinessCalendar.objects.create(company=self.company, timezone='America/New_York')
+        # Friday 16:00 in New York, two business hours left: Monday 10:00 New York
+        self.assertEqual(self.deadline(self.utc(2025, 1, 3, 21), 2), self.utc(2025, 1, 6, 15))
+
+    def test_sla_beyond_the_horizon(self):
+        BusinessCalendar.objects.create(company=self.company)
+        deadline = self.deadline(self.utc(2025, 1, 6, 9), 5000)
+        self.assertLess(deadline.weekday(), 5)
+        self.assertEqual((deadline.hour, deadline.minute), (17, 0))
+        self.assertGreater(deadline, self.utc(2027, 1, 6))
+
+    def test_submission_sets_deadline_in_the_insert(self):
+        BusinessCalendar.objects.create(company=self.company)
+        self.rule.sla_hours = 4
+        self.rule.save()
+        client = self.client_for(self.employee)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(reverse('submit-expense'), {
+                'title': 'Hotel', 'amount': '100.00', 'currency': 'USD', 'expense_date': '2025-01-15'
+            }, format='json')
+
+        expense = Expense.objects.get(pk=response.data['expense']['id'])
+        self.assertAlmostEqual(
+            expense.escalation_date, escalation_deadline(self.company.id, self.rule, expense.submission_date),
+            delta=timezone.timedelta(seconds=1)
+        )
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE "expense_auth_expense"')])
+
+    def test_calendar_endpoint_validates_and_replaces_holidays(self):
+        client = self.client_for(self.admin)
+        self.assertEqual(client.get(reverse('business-calendar')).status_code, 404)
+
+        response = client.put(reverse('business-calendar'), {
+            'timezone': 'Mars/Olympus', 'workday_start': '09:00', 'workday_end': '17:00'
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('timezone', response.data)
+
+        response = client.put(reverse('business-calendar'), {
+            'timezone': 'Europe/Berlin', 'workdays': [1, 2, 3, 4],
+            'holidays': [{'date': '2025-01-06', 'name': 'Epiphany'}]
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = client.put(reverse('business-calendar'), {
+            'holidays': [{'date': '2025-01-07', 'name': 'Closed'}]
+        }, format='json')
+        self.assertEqual(response.data['workdays'], [1, 2, 3, 4])
+        self.assertEqual(list(Holiday.objects.values_list('date', flat=True)), [date(2025, 1, 7)])
+        self.assertEqual(client.get(reverse('business-calendar')).data['timezone'], 'Europe/Berlin')
+
+
+class SubmissionPipelineTests(WorkflowFixtureMixin, TestCase):
+    def setUp(self):
+        rule_sets.clear()
+        business_calendar.calendars.clear()
+        request = mock.Mock(user=User.objects.select_related('company').get(pk=self.employee.pk))
+        self.context = {'request': request}
+
+    def submit(self, **data):
+        from .serializers import ExpenseSubmissionSerializer
+
+        values = {'title': 'Hotel', 'amount': '100.00', 'currency': 'USD', 'expense_date': '2025-01-15'}
+        values.update(data)
+        serializer = ExpenseSubmissionSerializer(data=values, context=self.context)
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_submission_is_one_insert_with_warm_caches(self):
+        self.submit()
+        with CaptureQueriesContext(connection) as queries:
+            expense = self.submit(amount='10000.00')
+
+        # Pool count, expense INSERT, inbox upsert, reading and updating the day's
+        # rollup row and incrementing the month's
+        statements = [query['sql'] for query in queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(len(statements), 6)
+        self.assertEqual(sum(sql.startswith('INSERT INTO "expense_auth_expense"') for sql in statements), 1)
+        self.assertFalse([sql for sql in statements if sql.startswith('UPDATE "expense_auth_expense"')])
+        self.assertEqual((expense.current_stage, expense.approval_rule.name), ('manager', 'Medium Amount - Manager to Admin'))
+        self.assertIsNotNone(expense.escalation_date)
+
+
+class ExpenseStatsTests(WorkflowFixtureMixin, TestCase):
+    def totals(self):
+        # Rollup figures per key, ignoring rows that were emptied
+        rows = ExpenseDailyStats.objects.values('user_set', 'user', 'category', 'status', 'day').annotate(
+            count=models.Sum('count'), amount=models.Sum('amount'),
+            processed=models.Sum('processed'), seconds=models.Sum('processing_seconds'),
+        ).filter(count__gt=0)
+        monthly = CompanyMonthlyStats.objects.order_by('company', 'month').values_list(
+            'company', 'month', 'users_joined', 'expenses', 'amount', 'rejected_amount', 'approved', 'rejected',
+            'processed', 'processing_seconds'
+        )
+        return sorted(tuple(row.values()) for row in rows), list(monthly)
+
+    def assertMatchesRebuild(self):
+        maintained = self.totals()
+        rebuild_stats()
+        self.assertEqual(maintained, self.totals())
+
+    def queued_expense(self, amount='100.00'):
+        amount = Decimal(amount)
+        return self.make_expense(amount=amount, approval_rule=get_applicable_rule(amount, self.company))
+
+    def test_creates_and_transitions_are_rolled_up(self):
+        approved = self.queued_expense()
+        rejected = self.queued_expense('200.00')
+        self.queued_expense('300.00')
+        escalated = self.make_expense(escalation_date=timezone.now() - timezone.timedelta(hours=1))
+
+        advance_workflow(approved, self.manager, 'approved')
+        self.client_for(self.manager).post(
+            reverse('bulk-expense-action'), {'action': 'reject', 'expense_ids': [rejected.id], 'comment': 'No'},
+            format='json'
+        )
+        escalate_overdue_expenses()
+
+        by_status = dict(
+            ExpenseDailyStats.objects.values_list('status').annotate(count=models.Sum('count')).filter(count__gt=0)
+        )
+        self.assertEqual(by_status, {'pending': 1, 'approved': 1, 'rejected': 1, 'in_progress': 1})
+        self.assertEqual(
+            ExpenseDailyStats.objects.filter(status='in_progress').get(count=1).amount, escalated.base_amount
+        )
+        self.assertEqual(ExpenseDailyStats.objects.aggregate(models.Sum('processed'))['processed__sum'], 2)
+        self.assertMatchesRebuild()
+
+    def test_saves_and_deletes_are_rolled_up(self):
+        expense = self.make_expense()
+        expense.status = 'approved'
+        expense.approved_at = expense.submission_date + timezone.timedelta(hours=2)
+        expense.base_amount = Decimal('80.00')
+        expense.save()
+        self.make_expense(amount=Decimal('5.00')).delete()
+
+        row = ExpenseDailyStats.objects.get(status='approved')
+        self.assertEqual((row.count, row.amount, row.processed, row.processing_seconds), (1, Decimal('80.00'), 1, 7200))
+        self.assertMatchesRebuild()
+
+    def test_moving_a_user_moves_their_rows(self):
+        self.make_expense()
+        other = UserSet.objects.create(name='Support', company=self.company)
+        response = self.client_for(self.admin).patch(
+            reverse('update-user-set', args=[self.employee.id]), {'set_id': other.id}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ExpenseDailyStats.objects.get(user=self.employee).user_set_id, other.id)
+        self.assertMatchesRebuild()
+
+    def test_rebuild_command_restores_missing_rows(self):
+        self.make_expense()
+        self.make_expense(status='approved')
+        ExpenseDailyStats.objects.all().delete()
+        out = StringIO()
+
+        call_command('rebuild_expense_stats', stdout=out)
+
+        self.assertIn('2 daily rows, 1 monthly rows', out.getvalue())
+        self.assertEqual(ExpenseDailyStats.objects.aggregate(models.Sum('count'))['count__sum'], 2)
+
+    def test_monthly_rollup_follows_users_and_decisions(self):
+        month = CompanyMonthlyStats.objects.get(company=self.company)
+        self.assertEqual((month.users_joined, month.expenses), (3, 0))
+
+        expense = self.queued_expense('250.00')
+        advance_workflow(expense, self.manager, 'rejected', 'No receipt')
+        joined = User.objects.create_user(username='new', email='new@example.com', password='pass', role='employee')
+        joined.company = self.company
+        joined.save()
+        User.objects.get(username='manager').delete()
+
+        month.refresh_from_db()
+        self.assertEqual((month.users_joined, month.expenses, month.rejected), (3, 1, 1))
+        self.assertEqual(month.rejected_amount, Decimal('250.00'))
+        self.assertMatchesRebuild()
+
+    def test_manager_dashboard_reads_the_rollup(self):
+        self.make_expense()
+        self.make_expense(status='approved', approved_at=timezone.now(), approved_by=self.manager)
+        self.make_expense(status='rejected')
+
+        data = self.client_for(self.manager).get(reverse('manager-dashboard')).data
+
+        self.assertEqual((data['pending_count'], data['approved_count'], data['rejected_count']), (1, 1, 1))
+        self.assertEqual((data['total_expenses'], data['today_approvals'], data['team_members_count']), (3, 1, 2))
+
+
+class EmployeeDashboardTests(WorkflowFixtureMixin, TestCase):
+    def test_summary_is_one_aggregate(self):
+        self.make_expense(amount=Decimal('10.00'))
+        self.make_expense(amount=Decimal('20.00'), status='approved')
+        self.make_expense(amount=Decimal('30.00'), status='approved')
+        self.make_expense(amount=Decimal('40.00'), status='rejected')
+        self.make_expense(amount=Decimal('50.00'), status='in_progress')
+        client = self.client_for(self.employee)
+
+        # The summary aggregate and the recent expenses
+        with self.assertNumQueries(2):
+            response = client.get(reverse('employee-dashboard'))
+
+        data = response.data
+        self.assertEqual(
+            (data['total_submitted'], data['pending_amount'], data['approved_amount'], data['rejected_amount']),
+            (Decimal('150.00'), Decimal('10.00'), Decimal('50.00'), Decimal('40.00'))
+        )
+        self.assertEqual((data['pending_count'], data['approved_count'], data['rejected_count']), (1, 2, 1))
+        self.assertEqual(data['total_expenses'], 5)
+        self.assertEqual(len(data['recent_expenses']), 5)
+
+    def test_empty_summary_is_zero(self):
+        data = self.client_for(self.employee).get(reverse('employee-dashboard')).data
+        self.assertEqual((data['total_submitted'], data['approved_count'], data['recent_expenses']), (0, 0, []))
+
+
+class AdminDashboardTests(WorkflowFixtureMixin, TestCase):
+    def make_decided(self, status, amount, days):
+        expense = self.make_expense(status=status, amount=Decimal(amount))
+        Expense.objects.filter(pk=expense.pk).update(approved_at=expense.submission_date + timezone.timedelta(days=days))
+        return expense
+
+    def test_metrics_come_from_grouped_aggregates(self):
+        self.make_expense(amount=Decimal('10.00'))
+        self.make_expense(amount=Decimal('15.00'), status='in_progress')
+        self.make_decided('approved', '20.00', 1)
+        self.make_decided('approved', '30.00', 3.5)
+        self.make_decided('rejected', '40.00', 1.5)
+        old = self.make_expense(amount=Decimal('1000.00'), status='approved')
+        Expense.objects.filter(pk=old.pk).update(submission_date=timezone.now() - timezone.timedelta(days=62))
+        # The dates were changed behind the rollup's back
+        rebuild_stats()
+        client = self.client_for(self.admin)
+
+        # Users, the status histogram, the category breakdown and the monthly rollup
+        with self.assertNumQueries(4):
+            response = client.get(reverse('admin-dashboard'))
+
+        data = response.data
+        self.assertEqual((data['total_users'], data['recent_users']), (3, 3))
+        self.assertEqual((data['total_expenses_count'], data['pending_approvals'], data['total_processed']), (6, 1, 4))
+        self.assertEqual(data['monthly_expenses'], Decimal('75.00'))
+        self.assertEqual(data['rejected_amount'], Decimal('40.00'))
+        self.assertEqual((data['approval_rate'], data['rejection_rate']), (75.0, 25.0))
+        self.assertEqual(data['avg_processing_time'], 2.0)
+        self.assertEqual(data['expenses_by_category'][0]['amount'], Decimal('1075.00'))
+
+    def test_empty_company(self):
+        data = self.client_for(self.admin).get(reverse('admin-dashboard')).data
+        self.assertEqual((data['monthly_expenses'], data['avg_processing_time'], data['total_processed']), (0, 0, 0))
+
+    def test_growth_compares_this_month_with_the_last(self):
+        last_month = timezone.now().replace(day=1) - timezone.timedelta(days=3)
+        User.objects.filter(pk__in=[self.admin.pk, self.manager.pk]).update(date_joined=last_month)
+        for status_name, amount, days, submitted in [
+            ('approved', '100.00', 1, last_month), ('rejected', '50.00', 1, last_month), ('pending', '100.00', 0, last_month),
+            ('approved', '300.00', 2, None), ('approved', '100.00', 2, None), ('rejected', '100.00', 2, None),
+        ]:
+            expense = self.make_decided(status_name, amount, days) if days else self.make_expense(amount=Decimal(amount))
+            if submitted:
+                Expense.objects.filter(pk=expense.pk).update(
+                    submission_date=submitted,
+                    approved_at=submitted + timezone.timedelta(days=days) if days else None,
+                )
+        # The dates were changed behind the rollup's back
+        rebuild_stats()
+
+        data = self.client_for(self.admin).get(reverse('admin-dashboard')).data
+
+        self.assertEqual((data['user_growth'], data['expense_growth']), (50.0, 100.0))
+        self.assertEqual((data['approval_change'], data['processing_change']), (33.3, 100.0))
+
+    def test_growth_without_history_is_zero(self):
+        data = self.client_for(self.admin).get(reverse('admin-dashboard')).data
+        self.assertEqual(
+            (data['user_growth'], data['expense_growth'], data['approval_change'], data['processing_change']), (0, 0, 0, 0)
+        )
+
+
+class DashboardCacheTests(WorkflowFixtureMixin, TestCase):
+    def test_repeat_requests_are_served_from_the_cache(self):
+        self.make_expense()
+        client = self.client_for(self.employee)
+        first = client.get(reverse('employee-dashboard')).data
+
+        with self.assertNumQueries(0):
+            second = client.get(reverse('employee-dashboard')).data
+
+        self.assertEqual(first, second)
+
+    def test_expense_and_approval_writes_expire_the_dashboards(self):
+        expense = self.make_expense(approval_rule=get_applicable_rule(Decimal('100.00'), self.company))
+        employee = self.client_for(self.employee)
+        manager = self.client_for(self.manager)
+        self.assertEqual(employee.get(reverse('employee-dashboard')).data['total_expenses'], 1)
+        self.assertEqual(manager.get(reverse('manager-dashboard')).data['pending_count'], 1)
+
+        self.make_expense()
+        advance_workflow(expense, self.manager, 'approved')
+
+        self.assertEqual(employee.get(reverse('employee-dashboard')).data['total_expenses'], 2)
+        self.assertEqual(manager.get(reverse('manager-dashboard')).data['approved_count'], 1)
+
+    def test_user_writes_expire_the_dashboards(self):
+        manager = self.client_for(self.manager)
+        self.assertEqual(manager.get(reverse('manager-dashboard')).data['team_members_count'], 2)
+        admin = self.client_for(self.admin)
+        self.assertEqual(admin.get(reverse('admin-dashboard')).data['total_users'], 3)
+
+        User.objects.create_user(
+            username='new', email='new@example.com', password='pass',
+            role='employee', company=self.company, user_set=self.user_set
+        )
+        self.assertEqual(manager.get(reverse('manager-dashboard')).data['team_members_count'], 3)
+        self.assertEqual(admin.get(reverse('admin-dashboard')).data['total_users'], 4)
+
+        self.manager.role = 'employee'
+        self.manager.save()
+        self.assertEqual(manager.get(reverse('manager-dashboard')).status_code, 403)
+
+    def test_concurrent_misses_render_once(self):
+        renders = []
+
+        def render():
+            renders.append(1)
+            time.sleep(0.2)
+            return Response({'total': 1})
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_render('dashboard:test', render).data))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(renders), 1)
+        self.assertEqual(results, [{'total': 1}] * 5)
+
+    def test_error_responses_are_not_cached(self):
+        renders = []
+
+        def render():
+            renders.append(1)
+            return Response({'error': 'Nope'}, status=403)
+
+        get_or_render('dashboard:error', render)
+        get_or_render('dashboard:error', render)
+        self.assertEqual(len(renders), 2)
+
+    def test_check_requires_a_shared_cache_outside_debug(self):
+        with override_settings(DEBUG=False):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ['expense_auth.W001'])
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache:6379/0'}}
+        with override_settings(DEBUG=False, CACHES=redis):
+            self.assertEqual(check_shared_cache(None), [])
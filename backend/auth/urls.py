@@ -29,6 +29,7 @@ urlpatterns = [
     path('receipts/ocr/', views.process_receipt_ocr, name='process-receipt-ocr'),
     path('countries-currencies/', views.get_countries_currencies, name='countries-currencies'),
     path('exchange-rates/', views.get_exchange_rates, name='exchange-rates'),
+    path('exchange-rates/convert/', views.convert_currencies, name='convert-currencies'),
     
     # Expense Approval endpoints
     path('pending-approvals/', views.get_pending_approvals, name='pending-approvals'),
@@ -43,13 +44,18 @@ urlpatterns = [
     # Workflow API endpoints
     path('expenses/submit/', views.submit_expense, name='submit-expense'),
     path('expenses/pending/', views.get_pending_approvals_workflow, name='pending-approvals-workflow'),
+    path('expenses/pending/count/', views.get_pending_approval_count, name='pending-approval-count'),
     path('expenses/<int:expense_id>/approve-workflow/', views.approve_expense_workflow, name='approve-expense-workflow'),
     path('expenses/<int:expense_id>/reject-workflow/', views.reject_expense_workflow, name='reject-expense-workflow'),
     path('expenses/<int:expense_id>/override/', views.admin_override_expense, name='admin-override-expense'),
+    path('expenses/bulk-action/', views.bulk_expense_action, name='bulk-expense-action'),
     path('expenses/history/', views.get_expense_history, name='expense-history'),
     path('approval-rules/', views.get_approval_rules, name='approval-rules'),
     path('approval-rules/create/', views.create_approval_rule, name='create-approval-rule'),
+    path('approval-rules/validate/', views.validate_approval_rules, name='validate-approval-rules'),
+    path('approval-rules/simulate/', views.simulate_approval_rules, name='simulate-approval-rules'),
     path('approval-rules/<int:rule_id>/', views.approval_rule_detail, name='approval-rule-detail'),
     path('approval-rules/setup-default/', views.setup_default_rules, name='setup-default-rules'),
+    path('business-calendar/', views.business_calendar, name='business-calendar'),
     path('escalations/check/', views.check_escalations_view, name='check-escalations'),
 ]
@@ -0,0 +1,116 @@
+"""
+Per-process caches invalidated through versions in the shared Django cache
+
+Data that is read on every request but changes rarely (compiled rule sets,
+business calendars, dashboard responses, exchange rates) is kept close to
+the code that uses it and stamped with a version stored in the default
+cache. A write bumps the version, and every process rebuilds on its next
+read once it sees a version its copy was not built under.
+
+Versions are random tokens rather than counters: shared backends do not
+increment atomically and may give an incremented key the default timeout.
+A missing version is seeded with a fresh token, so an evicted key never
+matches a copy built under an older one.
+
+This only reaches other processes when the default cache is shared by all
+of them, which is why settings require Redis or Memcached outside
+development (see CACHES).
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def new_version():
+    return uuid.uuid4().hex
+
+
+def read_versions(keys):
+    """
+    The current version under each key, seeding those that have none
+    """
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, new_version(), None)
+            versions[key] = cache.get(key)
+    return versions
+
+
+def read_version(key):
+    return read_versions([key])[key]
+
+
+def bump_versions(keys):
+    """
+    Give each key a version nothing was built under yet
+    """
+    if keys:
+        version = new_version()
+        cache.set_many({key: version for key in keys}, None)
+
+
+class VersionedCache:
+    """
+    Values built per process and key, rebuilt whenever the key's version moves
+
+    A key invalidated inside a transaction is rebuilt from the database on
+    every read until the transaction ends, so neither this process nor any
+    other keeps a value built from rows that may still roll back.
+    """
+
+    def __init__(self, prefix):
+        self.version_key = prefix + ':version:{key}'
+        self._values = {}  # key -> (version, value)
+        self._dirty = set()  # Keys with changes not yet committed
+
+    def _version_key(self, key):
+        return self.version_key.format(key=key)
+
+    def version(self, key):
+        return read_version(self._version_key(key))
+
+    def _committed(self, key):
+        self._dirty.discard(key)
+        bump_versions([self._version_key(key)])
+
+    def invalidate(self, key):
+        """
+        Drop the value for a key in every process
+        """
+        self._values.pop(key, None)
+        self._dirty.add(key)
+        bump_versions([self._version_key(key)])
+        # Bump again once the write is visible, so no process can keep a
+        # value built from pre-commit rows under the new version
+        transaction.on_commit(lambda: self._committed(key))
+
+    def get(self, key, build, usable=None):
+        """
+        Get the value for a key, calling build() when it is stale
+
+        usable(value) may reject an up-to-date value that does not serve
+        this particular read.
+        """
+        if key in self._dirty:
+            if transaction.get_connection().in_atomic_block:
+                # The data changed in a transaction that may still roll back
+                return build()
+            # The change was rolled back; drop anything built from it
+            self._committed(key)
+
+        version = self.version(key)
+        entry = self._values.get(key)
+        if entry and entry[0] == version and (usable is None or usable(entry[1])):
+            return entry[1]
+        value = build()
+        self._values[key] = (version, value)
+        return value
+
+    def clear(self):
+        """
+        Forget every value built by this process
+        """
+        self._values.clear()
+        self._dirty.clear()
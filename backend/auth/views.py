@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
@@ -5,19 +7,34 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import authenticate
 from django.db import transaction, models
-from .models import User, Company, UserSet, Expense, ExpenseCategory, ApprovalRule, ApprovalRecord
+from django.db.models import Prefetch
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse
+from django.utils.http import http_date, parse_etags
+from .models import (
+    User, Company, UserSet, Expense, ExpenseCategory, ApprovalRule, ApprovalRecord, BusinessCalendar, ExpenseDailyStats,
+    CompanyMonthlyStats
+)
 from .serializers import (
     UserRegistrationSerializer, UserSerializer, LoginSerializer, CompanySerializer, 
     CustomTokenObtainPairSerializer, UserSetSerializer, UserSetCreateSerializer,
     UserCreateSerializer, UserRoleUpdateSerializer, UserSetUpdateSerializer , 
     ExpenseSerializer, ExpenseCreateSerializer, ExpenseCategorySerializer,
     ApprovalRuleSerializer, ApprovalRecordSerializer, WorkflowExpenseSerializer,
-    ExpenseSubmissionSerializer, ApprovalActionSerializer
+    ExpenseSubmissionSerializer, ApprovalActionSerializer, CurrencyConversionSerializer,
+    RuleSimulationSerializer, BulkApprovalActionSerializer, BusinessCalendarSerializer
 )
 from .workflow import (
     convert_currency, get_applicable_rule, advance_workflow, admin_override,
-    setup_escalation, check_escalations, create_default_rules
+    setup_escalation, escalate_overdue_expenses, create_default_rules, bulk_advance_workflow,
+    ApproverResolver, StaleWorkflowState
 )
+from .dashboard_cache import cached_dashboard
+from .exchange_rates import convert_many, get_rate_table
+from .inbox import inbox_for
+from .reference_data import accepts_gzip, get_countries_snapshot
+from .rule_simulator import simulate_for_company
+from .rules import check_rule_change, check_rule_set
 
 
 class CompanyRegistrationView(generics.CreateAPIView):
@@ -269,6 +286,7 @@ def update_user_set(request, user_id):
             
             # Move user to new set
             user.user_set = new_set
+            # Signals move the user's inbox entries and rollup rows along
             user.save()
             
             return Response({
@@ -467,35 +485,93 @@ def process_receipt_ocr(request):
 def get_countries_currencies(request):
     """
     API endpoint for getting countries and their currencies
+    
+    Served from the locally stored snapshot with a strong ETag, so clients
+    revalidating with If-None-Match get a 304, and gzip when accepted.
     """
-    import requests
+    snapshot = get_countries_snapshot()
+    if snapshot is None:
+        return Response({'error': 'Countries data is not available yet'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
     
-    try:
-        response = requests.get('https://restcountries.com/v3.1/all?fields=name,currencies')
-        if response.status_code == 200:
-            return Response(response.json(), status=status.HTTP_200_OK)
-        else:
-            return Response({'error': 'Failed to fetch countries data'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    use_gzip = accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    etag = snapshot.gzip_etag if use_gzip else snapshot.etag
+    
+    if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if '*' in if_none_match or snapshot.etag in if_none_match or snapshot.gzip_etag in if_none_match:
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = HttpResponse(snapshot.gzip_body if use_gzip else snapshot.body, content_type='application/json')
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+    
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(snapshot.fetched_at.timestamp())
+    response['Cache-Control'] = 'private, max-age=3600'
+    response['Vary'] = 'Accept-Encoding'
+    return response
 
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_exchange_rates(request):
     """
-    API endpoint for getting exchange rates
+    API endpoint for getting exchange rates from the local rate table
     """
-    import requests
+    base = request.GET.get('base', 'USD').upper()
+    table = get_rate_table(base)
+    if not table['as_of']:
+        return Response({'error': f'No exchange rates available for {base}'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
     
-    try:
-        response = requests.get('https://api.exchangerate-api.com/v4/latest/USD')
-        if response.status_code == 200:
-            return Response(response.json(), status=status.HTTP_200_OK)
-        else:
-            return Response({'error': 'Failed to fetch exchange rates'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return Response({
+        'base': table['base'],
+        'date': table['as_of'].date().isoformat(),
+        'time_last_updated': int(table['as_of'].timestamp()),
+        'rates': table['rates']
+    }, status=status.HTTP_200_OK)
+
+
+MAX_BATCH_CONVERSIONS = 1000
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def convert_currencies(request):
+    """
+    API endpoint for converting a batch of amounts from the local rate table
+    
+    Accepts {"conversions": [...]} or a bare list, where each entry is either
+    {"amount", "from", "to", "date"} or an [amount, from, to, date] array.
+    """
+    items = request.data.get('conversions') if isinstance(request.data, dict) else request.data
+    if not isinstance(items, list):
+        return Response({'error': 'Expected a list of conversions'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > MAX_BATCH_CONVERSIONS:
+        return Response({'error': f'At most {MAX_BATCH_CONVERSIONS} conversions per request'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    items = [
+        dict(zip(['amount', 'from', 'to', 'date'], item)) if isinstance(item, (list, tuple)) else item
+        for item in items
+    ]
+    serializer = CurrencyConversionSerializer(data=items, many=True)
+    if not serializer.is_valid():
+        return Response({'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+    
+    conversions = serializer.validated_data
+    converted = convert_many(
+        (item['amount'], item['from'], item['to'], item['date']) for item in conversions
+    )
+    results = []
+    for item, (converted_amount, rate) in zip(conversions, converted):
+        results.append({
+            'amount': item['amount'],
+            'from': item['from'],
+            'to': item['to'],
+            'date': item['date'],
+            'rate': rate,
+            'converted_amount': converted_amount
+        })
+    
+    return Response({'results': results}, status=status.HTTP_200_OK)
 
 
 # Expense Approval Views
@@ -611,6 +687,7 @@ def get_my_expenses(request):
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@cached_dashboard('user')
 def get_employee_dashboard_data(request):
     """
     API endpoint for employees to get dashboard summary data
@@ -618,41 +695,71 @@ def get_employee_dashboard_data(request):
     if request.user.role != 'employee':
         return Response({'error': 'Only employees can access dashboard data'}, status=status.HTTP_403_FORBIDDEN)
     
-    # Get all expenses from the employee
-    all_expenses = Expense.objects.filter(user=request.user)
-    
-    # Calculate statistics
-    total_submitted = sum(expense.amount for expense in all_expenses)
-    pending_amount = sum(expense.amount for expense in all_expenses.filter(status='pending'))
-    approved_amount = sum(expense.amount for expense in all_expenses.filter(status='approved'))
-    rejected_amount = sum(expense.amount for expense in all_expenses.filter(status='rejected'))
+    # Calculate statistics in the company currency from the employee's daily rollup
+    summary = ExpenseDailyStats.objects.filter(user=request.user).aggregate(
+        total_submitted=amount_sum(),
+        pending_amount=amount_sum(status='pending'),
+        approved_amount=amount_sum(status='approved'),
+        rejected_amount=amount_sum(status='rejected'),
+        pending_count=count_sum(status='pending'),
+        approved_count=count_sum(status='approved'),
+        rejected_count=count_sum(status='rejected'),
+        total_expenses=count_sum(),
+    )
     
     # Get recent expenses (last 5)
-    recent_expenses = all_expenses[:5]
-    
-    # Calculate counts
-    pending_count = all_expenses.filter(status='pending').count()
-    approved_count = all_expenses.filter(status='approved').count()
-    rejected_count = all_expenses.filter(status='rejected').count()
+    recent_expenses = Expense.objects.filter(user=request.user).select_related(
+        'user', 'category', 'approved_by', 'receipt'
+    )[:5]
     
     # Serialize recent expenses
     recent_expenses_serializer = ExpenseSerializer(recent_expenses, many=True)
     
-    return Response({
-        'total_submitted': total_submitted,
-        'pending_amount': pending_amount,
-        'approved_amount': approved_amount,
-        'rejected_amount': rejected_amount,
-        'pending_count': pending_count,
-        'approved_count': approved_count,
-        'rejected_count': rejected_count,
-        'recent_expenses': recent_expenses_serializer.data,
-        'total_expenses': all_expenses.count()
-    }, status=status.HTTP_200_OK)
+    return Response(dict(summary, recent_expenses=recent_expenses_serializer.data), status=status.HTTP_200_OK)
+
+
+def amount_sum(**conditions):
+    """
+    Sum of rollup amounts, optionally only over rows matching conditions, and 0 when there are none
+    """
+    total = models.Sum('amount', filter=models.Q(**conditions) if conditions else None)
+    return Coalesce(total, models.Value(Decimal('0')), output_field=models.DecimalField())
+
+
+def count_sum(**conditions):
+    """
+    Number of expenses counted by rollup rows matching conditions
+    """
+    return Coalesce(models.Sum('count', filter=models.Q(**conditions) if conditions else None), 0)
+
+
+def percent_change(current, previous):
+    """
+    Relative change from previous to current in percent, 0 when either is missing or previous is 0
+    """
+    if current is None or not previous:
+        return 0
+    return round(float((current - previous) / previous * 100), 1)
+
+
+def monthly_approval_rate(month):
+    """
+    Share of a month's decided expenses that were approved, or None before any decision
+    """
+    decided = month.approved + month.rejected
+    return month.approved / decided * 100 if decided else None
+
+
+def monthly_processing_time(month):
+    """
+    Average seconds from submission to decision over a month's expenses, or None before any decision
+    """
+    return month.processing_seconds / month.processed if month.processed else None
 
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@cached_dashboard('set', 'user')
 def get_manager_dashboard_data(request):
     """
     API endpoint for managers to get dashboard summary data
@@ -668,10 +775,13 @@ def get_manager_dashboard_data(request):
         user__user_set=request.user.user_set
     ).order_by('-submission_date')
     
-    # Calculate statistics
-    pending_count = all_expenses.filter(status='pending').count()
-    approved_count = all_expenses.filter(status='approved').count()
-    rejected_count = all_expenses.filter(status='rejected').count()
+    # Calculate statistics from the set's daily rollup
+    counts = ExpenseDailyStats.objects.filter(user_set=request.user.user_set).aggregate(
+        pending_count=count_sum(status='pending'),
+        approved_count=count_sum(status='approved'),
+        rejected_count=count_sum(status='rejected'),
+        total_expenses=count_sum(),
+    )
     
     # Get unique team members
     team_members = User.objects.filter(user_set=request.user.user_set).count()
@@ -691,18 +801,19 @@ def get_manager_dashboard_data(request):
     recent_approvals_serializer = ExpenseSerializer(recent_approvals, many=True)
     
     return Response({
-        'pending_count': pending_count,
-        'approved_count': approved_count,
-        'rejected_count': rejected_count,
+        'pending_count': counts['pending_count'],
+        'approved_count': counts['approved_count'],
+        'rejected_count': counts['rejected_count'],
         'team_members_count': team_members,
         'today_approvals': today_approvals,
         'recent_approvals': recent_approvals_serializer.data,
-        'total_expenses': all_expenses.count()
+        'total_expenses': counts['total_expenses']
     }, status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
+@cached_dashboard('company', 'user')
 def get_admin_dashboard_data(request):
     """
     API endpoint for admins to get comprehensive dashboard data
@@ -710,52 +821,61 @@ def get_admin_dashboard_data(request):
     if request.user.role != 'admin':
         return Response({'error': 'Only admins can access dashboard data'}, status=status.HTTP_403_FORBIDDEN)
     
-    # Get all expenses from the admin's company
-    all_expenses = Expense.objects.filter(company=request.user.company)
+    # Get the daily rollup of the admin's company
+    company_stats = ExpenseDailyStats.objects.filter(company=request.user.company)
     
-    # Calculate basic statistics
-    total_users = User.objects.filter(company=request.user.company).count()
-    total_expenses_count = all_expenses.count()
-    pending_approvals = all_expenses.filter(status='pending').count()
-    
-    # Calculate monthly expenses (excluding rejected bills)
     from django.utils import timezone
     from datetime import timedelta
-    current_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    monthly_expenses = all_expenses.filter(
-        submission_date__gte=current_month
-    ).exclude(status='rejected')  # Exclude rejected bills from monthly expenses
-    monthly_total = sum(expense.amount for expense in monthly_expenses)
+    current_month = timezone.localdate().replace(day=1)
+    thirty_days_ago = timezone.now() - timedelta(days=30)
+    
+    # Users and those who joined in the last 30 days
+    users = User.objects.filter(company=request.user.company).aggregate(
+        total=models.Count('pk'),
+        recent=models.Count('pk', filter=models.Q(date_joined__gte=thirty_days_ago)),
+    )
+    
+    # One row per status: count, this month's spend, total spend and processing time
+    histogram = {
+        row['status']: row
+        for row in company_stats.order_by().values('status').annotate(
+            count=count_sum(),
+            monthly_amount=amount_sum(day__gte=current_month),
+            amount=amount_sum(),
+            processed=models.Sum('processed'),
+            processing_seconds=models.Sum('processing_seconds'),
+        )
+    }
+    
+    def by_status(status_name, key):
+        return histogram.get(status_name, {}).get(key) or 0
+    
+    total_expenses_count = sum(row['count'] for row in histogram.values())
+    pending_approvals = by_status('pending', 'count')
+    
+    # Monthly expenses in the company currency (excluding rejected bills)
+    monthly_total = sum(row['monthly_amount'] for name, row in histogram.items() if name != 'rejected')
     
     # Calculate approval metrics
-    approved_count = all_expenses.filter(status='approved').count()
-    rejected_count = all_expenses.filter(status='rejected').count()
+    approved_count = by_status('approved', 'count')
+    rejected_count = by_status('rejected', 'count')
     total_processed = approved_count + rejected_count
     
     approval_rate = (approved_count / total_processed * 100) if total_processed > 0 else 0
     rejection_rate = (rejected_count / total_processed * 100) if total_processed > 0 else 0
     
-    # Calculate average processing time
-    processed_expenses = all_expenses.filter(
-        status__in=['approved', 'rejected'],
-        approved_at__isnull=False
-    )
-    
+    # Average processing time of decided expenses, weighted across the two statuses
+    processed = [histogram[name] for name in ('approved', 'rejected') if by_status(name, 'processed')]
     avg_processing_days = 0
-    if processed_expenses.exists():
-        total_days = 0
-        for expense in processed_expenses:
-            if expense.approved_at:
-                days_diff = (expense.approved_at - expense.submission_date).days
-                total_days += days_diff
-        avg_processing_days = total_days / processed_expenses.count()
+    if processed:
+        total_seconds = sum(row['processing_seconds'] for row in processed)
+        avg_processing_days = total_seconds / 86400 / sum(row['processed'] for row in processed)
     
     # Get expenses by category (excluding rejected bills)
-    from django.db.models import Sum, Count
-    category_data = all_expenses.exclude(status='rejected').values('category__name').annotate(
-        total_amount=Sum('amount'),
-        count=Count('id')
-    ).order_by('-total_amount')
+    category_data = company_stats.exclude(status='rejected').values('category__name').annotate(
+        total_amount=models.Sum('amount'),
+        count=models.Sum('count')
+    ).filter(count__gt=0).order_by('-total_amount')
     
     # Calculate percentages
     total_category_amount = sum(item['total_amount'] or 0 for item in category_data)
@@ -770,25 +890,27 @@ def get_admin_dashboard_data(request):
             'count': item['count']
         })
     
-    # Get recent users (last 30 days)
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    recent_users = User.objects.filter(
-        company=request.user.company,
-        date_joined__gte=thirty_days_ago
-    ).count()
-    
-    # Calculate growth percentages (mock data for now - can be enhanced with historical data)
-    user_growth = 12  # Mock percentage
-    expense_growth = 8.2  # Mock percentage
-    approval_change = -15  # Mock percentage
-    processing_change = -22  # Mock percentage
+    # Month-over-month growth from the company's monthly rollup
+    previous_month = (current_month - timedelta(days=1)).replace(day=1)
+    months = {
+        row.month: row
+        for row in CompanyMonthlyStats.objects.filter(company=request.user.company, month__in=[current_month, previous_month])
+    }
+    this_month = months.get(current_month, CompanyMonthlyStats())
+    last_month = months.get(previous_month, CompanyMonthlyStats())
+    
+    user_growth = percent_change(users['total'], users['total'] - this_month.users_joined)
+    expense_growth = percent_change(
+        this_month.amount - this_month.rejected_amount, last_month.amount - last_month.rejected_amount
+    )
+    approval_change = percent_change(monthly_approval_rate(this_month), monthly_approval_rate(last_month))
+    processing_change = percent_change(monthly_processing_time(this_month), monthly_processing_time(last_month))
     
-    # Calculate rejected bills amount (for reference, not included in monthly expenses)
-    rejected_expenses = all_expenses.filter(status='rejected')
-    rejected_amount = sum(expense.amount for expense in rejected_expenses)
+    # Rejected bills amount (for reference, not included in monthly expenses)
+    rejected_amount = by_status('rejected', 'amount')
     
     return Response({
-        'total_users': total_users,
+        'total_users': users['total'],
         'monthly_expenses': monthly_total,  # Excludes rejected bills
         'pending_approvals': pending_approvals,
         'avg_processing_time': round(avg_processing_days, 1),
@@ -800,7 +922,7 @@ def get_admin_dashboard_data(request):
         'expense_growth': expense_growth,
         'approval_change': approval_change,
         'processing_change': processing_change,
-        'recent_users': recent_users,
+        'recent_users': users['recent'],
         'total_expenses_count': total_expenses_count,
         'rejected_amount': rejected_amount  # Separate metric for rejected bills
     }, status=status.HTTP_200_OK)
@@ -918,26 +1040,105 @@ def get_pending_approvals_workflow(request):
         # Get expenses from user's set
         if not user.user_set:
             return Response({'error': 'Manager not assigned to any set'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        expenses = Expense.objects.filter(
-            user__user_set=user.user_set,
-            status__in=['pending', 'in_progress'],
-            current_stage='manager'
-        ).order_by('-submission_date')
+    elif user.role != 'admin':
+        return Response({'error': 'Only managers and admins can view pending approvals'}, status=status.HTTP_403_FORBIDDEN)
     
-    elif user.role == 'admin':
-        # Get all expenses pending admin approval
-        expenses = Expense.objects.filter(
-            company=user.company,
-            status__in=['pending', 'in_progress'],
-            current_stage='admin'
-        ).order_by('-submission_date')
+    expenses = with_workflow_relations(get_approval_queue(user).order_by('-submission_date'))
+    serializer = WorkflowExpenseSerializer(
+        expenses, many=True, context={'approver_resolver': ApproverResolver.for_user(user)}
+    )
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+def with_workflow_relations(expenses):
+    """
+    Load everything WorkflowExpenseSerializer reads alongside the expenses
+    """
+    return expenses.select_related('user', 'category', 'approval_rule').prefetch_related(
+        Prefetch('approval_records', queryset=ApprovalRecord.objects.select_related('approver'))
+    )
+
+
+def get_approval_queue(user):
+    """
+    Get the expenses waiting for the user's approval
+    """
+    # Managers see their set's manager stage, admins the company's admin stage
+    return Expense.objects.filter(pk__in=inbox_for(user).values('expense_id'))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def get_pending_approval_count(request):
+    """
+    API endpoint for the number of expenses waiting for the user's approval
+    """
+    user = request.user
+    if user.role not in ['manager', 'admin']:
+        return Response({'error': 'Only managers and admins can view pending approvals'}, status=status.HTTP_403_FORBIDDEN)
+    
+    return Response({'count': inbox_for(user).count()}, status=status.HTTP_200_OK)
+
+
+MAX_BULK_ACTIONS = 1000
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def bulk_expense_action(request):
+    """
+    API endpoint for approving, rejecting or overriding many expenses at once
+    """
+    user = request.user
+    if user.role not in ['manager', 'admin']:
+        return Response({'error': 'Only managers and admins can approve expenses'}, status=status.HTTP_403_FORBIDDEN)
+    if user.role == 'manager' and not user.user_set:
+        return Response({'error': 'Manager not assigned to any set'}, status=status.HTTP_400_BAD_REQUEST)
     
+    serializer = BulkApprovalActionSerializer(data=request.data, context={'request': request})
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data
+    
+    if 'expense_ids' in data:
+        expense_ids = data['expense_ids']
     else:
-        return Response({'error': 'Only managers and admins can view pending approvals'}, status=status.HTTP_403_FORBIDDEN)
+        filters = data['filter']
+        expenses = get_approval_queue(user)
+        if 'status' in filters:
+            expenses = expenses.filter(status=filters['status'])
+        if 'user_set' in filters:
+            expenses = expenses.filter(user__user_set_id=filters['user_set'])
+        if 'category' in filters:
+            expenses = expenses.filter(category_id=filters['category'])
+        if 'min_amount' in filters:
+            expenses = expenses.filter(amount__gte=filters['min_amount'])
+        if 'max_amount' in filters:
+            expenses = expenses.filter(amount__lte=filters['max_amount'])
+        if 'date_from' in filters:
+            expenses = expenses.filter(submission_date__date__gte=filters['date_from'])
+        if 'date_to' in filters:
+            expenses = expenses.filter(submission_date__date__lte=filters['date_to'])
+        expense_ids = list(expenses.order_by('submission_date', 'id').values_list('id', flat=True)[:MAX_BULK_ACTIONS + 1])
+    
+    if len(expense_ids) > MAX_BULK_ACTIONS:
+        return Response(
+            {'error': f'At most {MAX_BULK_ACTIONS} expenses can be processed per request'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
-    serializer = WorkflowExpenseSerializer(expenses, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    try:
+        results = bulk_advance_workflow(
+            expense_ids, user, data['action'], data['comment'], data.get('decision')
+        )
+    except StaleWorkflowState as e:
+        return Response({'error': f'Expenses changed while being processed, try again: {e}'}, status=status.HTTP_409_CONFLICT)
+    failed = sum(1 for result in results if result['status'] == 'Error')
+    return Response({
+        'processed': len(results) - failed,
+        'failed': failed,
+        'results': results
+    }, status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
@@ -1057,7 +1258,10 @@ def get_expense_history(request):
     if date_to:
         expenses = expenses.filter(submission_date__date__lte=date_to)
     
-    serializer = WorkflowExpenseSerializer(expenses, many=True)
+    serializer = WorkflowExpenseSerializer(
+        with_workflow_relations(expenses), many=True,
+        context={'approver_resolver': ApproverResolver.for_user(user)}
+    )
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -1075,6 +1279,77 @@ def get_approval_rules(request):
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+def save_approval_rule(serializer, company, success_status):
+    """
+    Save a validated rule unless its band overlaps the company's other rules
+    """
+    data = serializer.validated_data
+    instance = serializer.instance
+    with transaction.atomic():
+        # Serialize rule writes per company so two overlapping bands cannot both pass the check
+        Company.objects.select_for_update().filter(pk=company.pk).first()
+        rule = ApprovalRule(
+            pk=getattr(instance, 'pk', None),
+            name=data.get('name', getattr(instance, 'name', '')),
+            min_amount=data.get('min_amount', getattr(instance, 'min_amount', None)),
+            max_amount=data.get('max_amount', getattr(instance, 'max_amount', None)),
+            is_active=data.get('is_active', getattr(instance, 'is_active', True)),
+        )
+        report = check_rule_change(company.pk, rule)
+        if not report['valid']:
+            return Response({
+                'error': 'Approval rule overlaps existing rules',
+                'overlaps': report['overlaps'],
+                'gaps': report['gaps'],
+            }, status=status.HTTP_400_BAD_REQUEST)
+        serializer.save(company=company)
+    return Response(serializer.data, status=success_status)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def validate_approval_rules(request):
+    """
+    API endpoint reporting overlaps and gaps in the company's active approval rules
+    """
+    if request.user.role != 'admin':
+        return Response({'error': 'Only admins can view approval rules'}, status=status.HTTP_403_FORBIDDEN)
+    
+    rules = ApprovalRule.objects.filter(company=request.user.company, is_active=True)
+    return Response(check_rule_set(rules), status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def simulate_approval_rules(request):
+    """
+    API endpoint replaying proposed approval rules against the company's expenses
+    """
+    if request.user.role != 'admin':
+        return Response({'error': 'Only admins can simulate approval rules'}, status=status.HTTP_403_FORBIDDEN)
+    
+    serializer = RuleSimulationSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    data = serializer.validated_data
+    rules = [ApprovalRule(**rule) for rule in data['rules']]
+    report = check_rule_set(rules)
+    if not report['valid']:
+        return Response({
+            'error': 'Proposed rules overlap',
+            'overlaps': report['overlaps'],
+            'gaps': report['gaps'],
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    result = simulate_for_company(
+        request.user.company, rules, data.get('sla_hours'),
+        data['date_from'], data['date_to']
+    )
+    result['gaps'] = report['gaps']
+    return Response(result, status=status.HTTP_200_OK)
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def create_approval_rule(request):
@@ -1086,8 +1361,7 @@ def create_approval_rule(request):
     
     serializer = ApprovalRuleSerializer(data=request.data)
     if serializer.is_valid():
-        serializer.save(company=request.user.company)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return save_approval_rule(serializer, request.user.company, status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -1112,8 +1386,7 @@ def approval_rule_detail(request, rule_id):
     elif request.method == 'PUT':
         serializer = ApprovalRuleSerializer(rule, data=request.data)
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return save_approval_rule(serializer, request.user.company, status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     elif request.method == 'DELETE':
@@ -1121,6 +1394,28 @@ def approval_rule_detail(request, rule_id):
         return Response({'message': 'Approval rule deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
 
 
+@api_view(['GET', 'PUT'])
+@permission_classes([permissions.IsAuthenticated])
+def business_calendar(request):
+    """
+    API endpoint for the company's business calendar, which SLA hours are counted in
+    """
+    if request.user.role != 'admin':
+        return Response({'error': 'Only admins can manage the business calendar'}, status=status.HTTP_403_FORBIDDEN)
+    
+    calendar = BusinessCalendar.objects.filter(company=request.user.company).first()
+    if request.method == 'GET':
+        if calendar is None:
+            return Response({'error': 'No business calendar configured'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(BusinessCalendarSerializer(calendar).data, status=status.HTTP_200_OK)
+    
+    serializer = BusinessCalendarSerializer(calendar, data=request.data, partial=calendar is not None)
+    if serializer.is_valid():
+        calendar = serializer.save(company=request.user.company)
+        return Response(BusinessCalendarSerializer(calendar).data, status=status.HTTP_200_OK)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def setup_default_rules(request):
@@ -1141,13 +1436,20 @@ def setup_default_rules(request):
 @permission_classes([permissions.IsAuthenticated])
 def check_escalations_view(request):
     """
-    API endpoint for checking escalations (can be called by cron job)
+    API endpoint for escalating the admin's own company's overdue expenses
+    
+    Other companies are left to the check_escalations command.
     """
     if request.user.role != 'admin':
         return Response({'error': 'Only admins can check escalations'}, status=status.HTTP_403_FORBIDDEN)
     
-    escalated_count = check_escalations()
+    try:
+        escalated_ids = escalate_overdue_expenses(company=request.user.company)
+    except Exception as e:
+        print(f"Error checking escalations: {e}")
+        escalated_ids = []
     return Response({
-        'message': f'{escalated_count} expenses escalated',
-        'escalated_count': escalated_count
+        'message': f'{len(escalated_ids)} expenses escalated',
+        'escalated_count': len(escalated_ids),
+        'escalated_ids': escalated_ids
     }, status=status.HTTP_200_OK)
@@ -1,65 +1,80 @@
 """
 Approval workflow engine for expense management system
 """
-import requests
-from decimal import Decimal
+import math
+import random
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_UP
 from django.utils import timezone
-from datetime import timedelta
-from django.db import transaction, models
-from .models import Expense, ApprovalRule, ApprovalRecord, User, Company
+from django.db import OperationalError, transaction, models
+from .models import Expense, ApprovalInbox, ApprovalRule, ApprovalRecord, User, UserSet, Company
+from .exchange_rates import convert, get_rate
+from .business_calendar import DEFAULT_SLA_HOURS, escalation_deadline
+from .dashboard_cache import invalidate_dashboards
+from .inbox import sync_inbox, upsert_entries
+from .rollups import StatsDelta, expense_fact, fact
+from .rules import check_rule_change, get_rule_set
 
 
-def convert_currency(amount, from_currency, to_currency='USD'):
+COMPANY_CURRENCY = 'USD'  # Default company currency
+ESCALATION_HOURS = DEFAULT_SLA_HOURS  # Hours before an unapproved expense escalates to admin, unless its rule says otherwise
+EXCHANGE_RATE_PLACES = Decimal('0.000001')  # Matches Expense.exchange_rate
+
+
+def convert_currency(amount, from_currency, to_currency='USD', on_date=None):
     """
-    Convert currency using external API
+    Convert currency at the stored exchange rate in effect on on_date
     """
     try:
         if from_currency == to_currency:
-            return float(amount)
+            return Decimal(str(amount))
         
-        # Use exchangerate-api.com for currency conversion
-        url = f"https://api.exchangerate-api.com/v4/latest/{from_currency}"
-        response = requests.get(url, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            rate = data['rates'].get(to_currency)
-            if rate:
-                converted_amount = float(amount) * rate
-                return converted_amount
+        converted_amount = convert(amount, from_currency, to_currency, on_date)
+        if converted_amount is not None:
+            return converted_amount
         
         # Fallback: return original amount if conversion fails
-        return float(amount)
+        return Decimal(str(amount))
     except Exception as e:
         print(f"Currency conversion error: {e}")
-        return float(amount)
+        return Decimal(str(amount))
+
+
+def get_base_currency_fields(amount, currency, expense_date=None, base_currency=COMPANY_CURRENCY):
+    """
+    Compute the exchange_rate and base_amount stored on an expense
+
+    When no rate is known the amount is kept as is and exchange_rate stays
+    empty, so the backfill command can pick the row up later.
+    """
+    amount = Decimal(str(amount))
+    if currency == base_currency:
+        return {'exchange_rate': Decimal('1'), 'base_amount': amount}
+    
+    try:
+        rate = get_rate(currency, base_currency, expense_date)
+        if rate is not None:
+            return {
+                'exchange_rate': rate.quantize(EXCHANGE_RATE_PLACES, rounding=ROUND_HALF_UP),
+                'base_amount': convert(amount, currency, base_currency, expense_date)
+            }
+    except Exception as e:
+        print(f"Currency conversion error: {e}")
+    
+    return {'exchange_rate': None, 'base_amount': amount}
 
 
 def get_applicable_rule(amount, company, urgent=False):
     """
     Get the applicable approval rule based on amount and urgency
+    
+    Served from the company's compiled rule index, so no queries are made
+    unless the rules changed since the index was built.
     """
     try:
-        # If urgent and urgent_bypass is enabled, get the rule that skips manager
-        if urgent:
-            urgent_rule = ApprovalRule.objects.filter(
-                company=company,
-                is_active=True,
-                urgent_bypass=True
-            ).first()
-            if urgent_rule:
-                return urgent_rule
-        
-        # Find rule based on amount range
-        rule = ApprovalRule.objects.filter(
-            company=company,
-            is_active=True,
-            min_amount__lte=amount
-        ).filter(
-            models.Q(max_amount__gte=amount) | models.Q(max_amount__isnull=True)
-        ).order_by('min_amount').first()
-        
-        return rule
+        company_id = getattr(company, 'pk', company)
+        return get_rule_set(company_id).match(amount, urgent)
     except Exception as e:
         print(f"Error getting applicable rule: {e}")
         return None
@@ -70,114 +85,327 @@ def calculate_approval_percentage(expense):
     Calculate approval percentage for an expense
     """
     try:
-        total_approvers = ApprovalRecord.objects.filter(
-            expense=expense,
-            role__in=['manager', 'admin']
-        ).count()
-        
-        approved_count = ApprovalRecord.objects.filter(
-            expense=expense,
-            status='approved',
-            role__in=['manager', 'admin']
-        ).count()
-        
-        if total_approvers == 0:
+        # Read the counters the workflow keeps on the expense
+        if expense.approval_record_count == 0:
             return 0
         
-        return (approved_count / total_approvers) * 100
+        return (expense.approval_count / expense.approval_record_count) * 100
     except Exception as e:
         print(f"Error calculating approval percentage: {e}")
         return 0
 
 
-def advance_workflow(expense, approver, action, comment=None):
+class ApproverPools:
     """
-    Advance the workflow based on approval action
+    Number of users who can approve each stage, loaded once per stage
+    
+    The manager pool is the managers of the submitter's set and the admin
+    pool the company's admins. A stage's quorum is the rule's
+    percentage_required of its pool, rounded up, and at least one.
     """
-    try:
-        with transaction.atomic():
-            # Create approval record
-            approval_record = ApprovalRecord.objects.create(
-                expense=expense,
-                approver=approver,
-                role=approver.role,
-                status=action,
-                comment=comment,
-                approved_at=timezone.now() if action in ['approved', 'rejected'] else None
-            )
-            
-            if action == 'rejected':
-                # Reject the expense
-                expense.status = 'rejected'
-                expense.rejection_reason = comment
-                expense.approved_by = approver
-                expense.approved_at = timezone.now()
-                expense.save()
-                return {
-                    'expense_id': expense.id,
-                    'status': 'Rejected',
-                    'current_stage': 'Completed',
-                    'next_approver': None,
-                    'approval_record_id': approval_record.id
-                }
-            
-            elif action == 'approved':
-                # Check if this completes the workflow
-                if expense.approval_rule:
-                    sequence = expense.approval_rule.sequence
-                    current_stage_index = sequence.index(expense.current_stage) if expense.current_stage in sequence else 0
-                    
-                    # Check if we need to move to next stage
-                    if current_stage_index < len(sequence) - 1:
-                        next_stage = sequence[current_stage_index + 1]
-                        expense.current_stage = next_stage
-                        expense.status = 'in_progress'
-                        expense.save()
-                        
-                        return {
-                            'expense_id': expense.id,
-                            'status': 'In Progress',
-                            'current_stage': next_stage,
-                            'next_approver': get_next_approver(expense, next_stage),
-                            'approval_record_id': approval_record.id
-                        }
-                    else:
-                        # Workflow complete
-                        expense.status = 'approved'
-                        expense.approved_by = approver
-                        expense.approved_at = timezone.now()
-                        expense.save()
-                        
-                        return {
-                            'expense_id': expense.id,
-                            'status': 'Approved',
-                            'current_stage': 'Completed',
-                            'next_approver': None,
-                            'approval_record_id': approval_record.id
-                        }
-                else:
-                    # No rule, just approve
-                    expense.status = 'approved'
-                    expense.approved_by = approver
-                    expense.approved_at = timezone.now()
-                    expense.save()
-                    
-                    return {
-                        'expense_id': expense.id,
-                        'status': 'Approved',
-                        'current_stage': 'Completed',
-                        'next_approver': None,
-                        'approval_record_id': approval_record.id
-                    }
-            
-            return {
+    
+    def __init__(self, company_ids):
+        self.company_ids = set(company_ids)
+        self._managers = None
+        self._admins = None
+    
+    @classmethod
+    def for_company(cls, company_id):
+        return cls([company_id])
+    
+    def size(self, stage, user_set_id, company_id):
+        if stage == 'manager':
+            if self._managers is None:
+                self._managers = dict(
+                    User.objects.filter(company_id__in=self.company_ids, role='manager', user_set__isnull=False)
+                    .values_list('user_set').annotate(total=models.Count('pk')).order_by()
+                )
+            return self._managers.get(user_set_id, 0)
+        elif stage == 'admin':
+            if self._admins is None:
+                self._admins = dict(
+                    User.objects.filter(company_id__in=self.company_ids, role='admin')
+                    .values_list('company').annotate(total=models.Count('pk')).order_by()
+                )
+            return self._admins.get(company_id, 0)
+        return 0
+    
+    def quorum(self, stage, user_set_id, company_id, rule=None):
+        return self.quorum_at(stage, user_set_id, company_id, rule.percentage_required if rule else None)
+    
+    def quorum_at(self, stage, user_set_id, company_id, percentage=None):
+        if percentage is None:
+            percentage = 100
+        return max(1, math.ceil(self.size(stage, user_set_id, company_id) * percentage / 100))
+    
+    def quorum_for(self, expense, stage):
+        return self.quorum(stage, expense.user.user_set_id, expense.company_id, expense.approval_rule)
+
+
+WORKFLOW_STATE_FIELDS = [
+    'status', 'current_stage', 'approval_count', 'approval_record_count', 'stage_approval_count', 'stage_quorum'
+]
+WORKFLOW_WRITE_FIELDS = WORKFLOW_STATE_FIELDS + ['rejection_reason', 'approved_by', 'approved_at', 'updated_at']
+OPEN_STATUSES = ['pending', 'in_progress']
+MAX_WORKFLOW_ATTEMPTS = 5
+LOCK_RETRY_BACKOFF = 0.02  # Seconds, doubled on every retry
+COUNTED_ROLES = ['manager', 'admin']
+
+
+def _completed(expense, approver, approval_record, now):
+    expense.status = 'approved'
+    expense.approved_by = approver
+    expense.approved_at = now
+    return {
+        'expense_id': expense.id,
+        'status': 'Approved',
+        'current_stage': 'Completed',
+        'next_approver': None,
+        'approval_record': approval_record
+    }
+
+
+def plan_transition(expense, approver, action, comment=None, now=None, next_approver=None, pools=None):
+    """
+    Apply an approval action to an expense in memory
+    
+    Returns the unsaved ApprovalRecord and the workflow result; the caller
+    saves both, one at a time or in bulk. An approval completes the current
+    stage once the stage's quorum of approvals is reached.
+    """
+    now = now or timezone.now()
+    next_approver = next_approver or get_next_approver
+    approval_record = ApprovalRecord(
+        expense=expense,
+        approver=approver,
+        role=approver.role,
+        stage=expense.current_stage,
+        status=action,
+        comment=comment,
+        approved_at=now if action in ['approved', 'rejected'] else None
+    )
+    expense.updated_at = now
+    if approver.role in COUNTED_ROLES:
+        expense.approval_record_count += 1
+    
+    if action == 'rejected':
+        # Reject the expense
+        expense.status = 'rejected'
+        expense.rejection_reason = comment
+        expense.approved_by = approver
+        expense.approved_at = now
+        return approval_record, {
+            'expense_id': expense.id,
+            'status': 'Rejected',
+            'current_stage': 'Completed',
+            'next_approver': None,
+            'approval_record': approval_record
+        }
+    
+    elif action == 'approved':
+        if approver.role in COUNTED_ROLES:
+            expense.approval_count += 1
+        
+        # No rule, just approve
+        if not expense.approval_rule:
+            return approval_record, _completed(expense, approver, approval_record, now)
+        
+        # Wait for the rest of the stage's quorum
+        expense.stage_approval_count += 1
+        if expense.stage_approval_count < expense.stage_quorum:
+            expense.status = 'in_progress'
+            return approval_record, {
                 'expense_id': expense.id,
-                'status': 'Error',
+                'status': 'In Progress',
                 'current_stage': expense.current_stage,
-                'next_approver': None,
-                'approval_record_id': approval_record.id
+                'next_approver': next_approver(expense, expense.current_stage),
+                'approvals': expense.stage_approval_count,
+                'approvals_required': expense.stage_quorum,
+                'approval_record': approval_record
             }
+        
+        # Check if this completes the workflow
+        sequence = expense.approval_rule.sequence
+        current_stage_index = sequence.index(expense.current_stage) if expense.current_stage in sequence else 0
+        
+        # Check if we need to move to next stage
+        if current_stage_index < len(sequence) - 1:
+            next_stage = sequence[current_stage_index + 1]
+            pools = pools or ApproverPools.for_company(expense.company_id)
+            expense.current_stage = next_stage
+            expense.stage_approval_count = 0
+            expense.stage_quorum = pools.quorum_for(expense, next_stage)
+            expense.status = 'in_progress'
+            return approval_record, {
+                'expense_id': expense.id,
+                'status': 'In Progress',
+                'current_stage': next_stage,
+                'next_approver': next_approver(expense, next_stage),
+                'approvals': 0,
+                'approvals_required': expense.stage_quorum,
+                'approval_record': approval_record
+            }
+        
+        # Workflow complete
+        return approval_record, _completed(expense, approver, approval_record, now)
+    
+    return approval_record, {
+        'expense_id': expense.id,
+        'status': 'Error',
+        'current_stage': expense.current_stage,
+        'next_approver': None,
+        'approval_record': approval_record
+    }
+
+
+def _record_id(result):
+    result = dict(result)
+    record = result.pop('approval_record', None)
+    result['approval_record_id'] = record.id if record else None
+    return result
+
+
+class StaleWorkflowState(Exception):
+    """Raised when an expense's workflow state changed since it was read"""
+
+
+class WorkflowMetrics:
+    """
+    Process-wide counters for workflow writes, for measuring contention
+    """
+    FIELDS = ['commits', 'conflicts', 'lock_retries', 'lock_wait_seconds', 'failures']
     
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self._values = dict.fromkeys(self.FIELDS, 0)
+    
+    def add(self, name, amount=1):
+        with self._lock:
+            self._values[name] += amount
+    
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+workflow_metrics = WorkflowMetrics()
+
+
+def run_workflow_write(write):
+    """
+    Run write() in a transaction, retrying version conflicts and lock errors
+    
+    write() must re-read whatever it depends on, since it may run several
+    times. SQLite "database is locked" errors are only retried when no outer
+    transaction is open, as the outer transaction cannot be replayed.
+    """
+    retry_locks = not transaction.get_connection().in_atomic_block
+    for attempt in range(MAX_WORKFLOW_ATTEMPTS):
+        started = time.monotonic()
+        try:
+            with transaction.atomic():
+                result = write()
+            workflow_metrics.add('commits')
+            return result
+        except StaleWorkflowState:
+            workflow_metrics.add('conflicts')
+        except OperationalError as e:
+            if not retry_locks or 'locked' not in str(e):
+                raise
+            # Full jitter so retrying writers do not collide again
+            time.sleep(random.uniform(0, LOCK_RETRY_BACKOFF * (2 ** attempt)))
+            workflow_metrics.add('lock_retries')
+            workflow_metrics.add('lock_wait_seconds', time.monotonic() - started)
+    
+    workflow_metrics.add('failures')
+    raise StaleWorkflowState(f"Expense kept changing after {MAX_WORKFLOW_ATTEMPTS} attempts")
+
+
+def _lock_workflow_state(expense):
+    # Re-read the workflow state, under a row lock where the backend has them,
+    # and return the expense's rollup fact as read
+    expenses = Expense.objects.all()
+    if transaction.get_connection().features.has_select_for_update:
+        expenses = expenses.select_for_update()
+    state = expenses.values(*WORKFLOW_STATE_FIELDS, 'approved_at', 'version').get(pk=expense.pk)
+    for field, value in state.items():
+        setattr(expense, field, value)
+    return expense_fact(expense)
+
+
+def save_workflow_state(expense, before, extra_fields=()):
+    """
+    Write an expense's workflow fields if its version is still the one read
+    
+    before is the rollup fact returned by _lock_workflow_state. Raises
+    StaleWorkflowState when another writer got there first.
+    """
+    values = {field: getattr(expense, field) for field in WORKFLOW_WRITE_FIELDS + list(extra_fields)}
+    updated = Expense.objects.filter(pk=expense.pk, version=expense.version).update(
+        version=models.F('version') + 1, **values
+    )
+    if not updated:
+        raise StaleWorkflowState(f"Expense {expense.pk} changed since version {expense.version}")
+    expense.version += 1
+    sync_inbox([expense])
+    delta = StatsDelta()
+    after = expense_fact(expense)
+    delta.move(before, after)
+    delta.apply()
+    invalidate_dashboards([expense.company_id], [after[0][1]], [expense.user_id])
+
+
+def has_approved_stage(expense, approver):
+    """
+    Check whether the approver already approved the expense's current stage
+    """
+    return ApprovalRecord.objects.filter(
+        expense=expense, approver=approver, stage=expense.current_stage, status='approved'
+    ).exists()
+
+
+def _workflow_error(expense, message):
+    return {
+        'expense_id': expense.id,
+        'status': 'Error',
+        'message': message,
+        'current_stage': expense.current_stage,
+        'next_approver': None,
+        'approval_record_id': None
+    }
+
+
+def advance_workflow(expense, approver, action, comment=None):
+    """
+    Advance the workflow based on approval action
+    
+    The expense's state is re-read under a lock and written back with a
+    compare-and-swap on its version, retrying if another approver acted
+    on it in between.
+    """
+    def write():
+        before = _lock_workflow_state(expense)
+        
+        # Re-check against the state just read, not the caller's copy
+        if expense.status not in OPEN_STATUSES:
+            return _workflow_error(expense, f'Expense is already {expense.status}')
+        error = get_approval_error(expense, approver)
+        if error:
+            return _workflow_error(expense, error)
+        if action == 'approved' and has_approved_stage(expense, approver):
+            return _workflow_error(expense, 'You have already approved this stage')
+        
+        approval_record, result = plan_transition(expense, approver, action, comment)
+        save_workflow_state(expense, before)
+        approval_record.save()
+        return _record_id(result)
+    
+    try:
+        return run_workflow_write(write)
     except Exception as e:
         print(f"Error advancing workflow: {e}")
         return {
@@ -214,6 +442,77 @@ def get_next_approver(expense, stage):
         return "Error"
 
 
+class ApproverResolver:
+    """
+    Resolves next approvers for many expenses from maps loaded up front
+    
+    The set -> manager and company -> admin usernames are read with two
+    queries, after which each lookup is a dict access. Gives the same
+    answers as get_next_approver.
+    """
+    
+    def __init__(self, company_ids):
+        company_ids = set(company_ids)
+        self.managers = dict(
+            UserSet.objects.filter(company_id__in=company_ids).values_list('id', 'manager__username')
+        )
+        self.admins = {}
+        admins = User.objects.filter(
+            company_id__in=company_ids, role='admin', is_company_admin=True
+        ).order_by('pk').values_list('company_id', 'username')
+        for company_id, username in admins:
+            self.admins.setdefault(company_id, username)
+    
+    @classmethod
+    def for_user(cls, user):
+        return cls([user.company_id])
+    
+    def next_approver(self, expense, stage):
+        if stage == 'manager':
+            return self.managers.get(expense.user.user_set_id) or "Manager (Not Assigned)"
+        elif stage == 'admin':
+            return self.admins.get(expense.company_id, "Admin (Not Found)")
+        return "Unknown Stage"
+
+
+def plan_override(expense, action, admin_user, comment=None, now=None):
+    """
+    Apply an admin override to an expense in memory
+    """
+    now = now or timezone.now()
+    approval_record = ApprovalRecord(
+        expense=expense,
+        approver=admin_user,
+        role='admin',
+        stage=expense.current_stage,
+        status='overridden',
+        comment=comment,
+        approved_at=now
+    )
+    expense.updated_at = now
+    expense.approval_record_count += 1
+    
+    if action == 'approve':
+        expense.status = 'approved'
+        expense.approved_by = admin_user
+        expense.approved_at = now
+        expense.current_stage = 'completed'
+    elif action == 'reject':
+        expense.status = 'rejected'
+        expense.rejection_reason = comment
+        expense.approved_by = admin_user
+        expense.approved_at = now
+        expense.current_stage = 'completed'
+    
+    return approval_record, {
+        'expense_id': expense.id,
+        'status': 'Overridden',
+        'current_stage': 'Completed',
+        'next_approver': None,
+        'approval_record': approval_record
+    }
+
+
 def admin_override(expense_id, action, admin_user, comment=None):
     """
     Admin override functionality
@@ -228,38 +527,16 @@ def admin_override(expense_id, action, admin_user, comment=None):
                 'message': 'Only admins can override'
             }
         
-        with transaction.atomic():
-            # Create override record
-            approval_record = ApprovalRecord.objects.create(
-                expense=expense,
-                approver=admin_user,
-                role='admin',
-                status='overridden',
-                comment=comment,
-                approved_at=timezone.now()
-            )
-            
-            if action == 'approve':
-                expense.status = 'approved'
-                expense.approved_by = admin_user
-                expense.approved_at = timezone.now()
-                expense.current_stage = 'completed'
-            elif action == 'reject':
-                expense.status = 'rejected'
-                expense.rejection_reason = comment
-                expense.approved_by = admin_user
-                expense.approved_at = timezone.now()
-                expense.current_stage = 'completed'
+        def write():
+            before = _lock_workflow_state(expense)
             
-            expense.save()
-            
-            return {
-                'expense_id': expense.id,
-                'status': 'Overridden',
-                'current_stage': 'Completed',
-                'next_approver': None,
-                'approval_record_id': approval_record.id
-            }
+            # Create override record
+            approval_record, result = plan_override(expense, action, admin_user, comment)
+            save_workflow_state(expense, before)
+            approval_record.save()
+            return _record_id(result)
+        
+        return run_workflow_write(write)
     
     except Exception as e:
         print(f"Error in admin override: {e}")
@@ -270,15 +547,145 @@ def admin_override(expense_id, action, admin_user, comment=None):
         }
 
 
+def get_approval_error(expense, approver):
+    """
+    Get the reason an approver cannot act on an expense, or None if they can
+    """
+    if approver.role == 'manager':
+        if not approver.user_set_id or expense.user.user_set_id != approver.user_set_id:
+            return 'You can only act on expenses from your set'
+        if expense.current_stage != 'manager':
+            return 'Expense is not in manager approval stage'
+    elif approver.role == 'admin':
+        if expense.current_stage not in ['admin', 'manager']:
+            return 'Expense is not in admin approval stage'
+    else:
+        return 'Only managers and admins can approve expenses'
+    return None
+
+
+def _claim_versions(expenses):
+    # Compare-and-swap the versions of the expenses actually being written,
+    # one UPDATE for all of them; untouched rows keep theirs
+    by_version = {}
+    for expense in expenses:
+        by_version.setdefault(expense.version, []).append(expense.pk)
+    if not by_version:
+        return
+    current = models.Q()
+    for version, ids in by_version.items():
+        current |= models.Q(version=version, pk__in=ids)
+    updated = Expense.objects.filter(current).update(version=models.F('version') + 1)
+    if updated != len(expenses):
+        raise StaleWorkflowState(f"{len(expenses) - updated} expenses changed since they were read")
+    for expense in expenses:
+        expense.version += 1
+
+
+def bulk_advance_workflow(expense_ids, approver, action, comment=None, decision=None):
+    """
+    Approve, reject or override many expenses in one transaction
+    
+    action is 'approve', 'reject' or 'override' (with decision 'approve' or
+    'reject'). Expenses the approver cannot act on are reported and left
+    unchanged. Returns one result per requested id, in request order.
+    """
+    now = timezone.now()
+    resolver = ApproverResolver.for_user(approver)
+    pools = ApproverPools.for_company(approver.company_id)
+    
+    def write():
+        requested = Expense.objects.filter(id__in=expense_ids, company=approver.company)
+        if transaction.get_connection().features.has_select_for_update:
+            requested = requested.select_for_update()
+        expenses = {expense.id: expense for expense in requested.select_related('user', 'approval_rule')}
+        already_approved = set(ApprovalRecord.objects.filter(
+            expense_id__in=expenses, approver=approver, status='approved'
+        ).values_list('expense_id', 'stage'))
+        
+        records = []
+        changed = []
+        results = {}
+        delta = StatsDelta()
+        for expense_id in dict.fromkeys(expense_ids):
+            expense = expenses.get(expense_id)
+            if expense is None:
+                results[expense_id] = {'expense_id': expense_id, 'status': 'Error', 'message': 'Expense not found'}
+                continue
+            
+            before = expense_fact(expense)
+            if action == 'override':
+                approval_record, result = plan_override(expense, decision, approver, comment, now)
+            else:
+                if expense.status not in OPEN_STATUSES:
+                    error = f'Expense is already {expense.status}'
+                else:
+                    error = get_approval_error(expense, approver)
+                if not error and action == 'approve' and (expense.id, expense.current_stage) in already_approved:
+                    error = 'You have already approved this stage'
+                if error:
+                    results[expense_id] = {'expense_id': expense_id, 'status': 'Error', 'message': error}
+                    continue
+                status_value = 'approved' if action == 'approve' else 'rejected'
+                approval_record, result = plan_transition(
+                    expense, approver, status_value, comment, now, resolver.next_approver, pools
+                )
+            records.append(approval_record)
+            changed.append(expense)
+            results[expense_id] = result
+            delta.move(before, expense_fact(expense))
+        
+        _claim_versions(changed)
+        ApprovalRecord.objects.bulk_create(records)
+        Expense.objects.bulk_update(changed, WORKFLOW_WRITE_FIELDS)
+        sync_inbox(changed)
+        delta.apply()
+        invalidate_dashboards(
+            [expense.company_id for expense in changed],
+            [expense.user.user_set_id for expense in changed],
+            [expense.user_id for expense in changed],
+        )
+        return [_record_id(results[expense_id]) for expense_id in dict.fromkeys(expense_ids)]
+    
+    return run_workflow_write(write)
+
+
+def plan_submission(user, amount, currency, expense_date, urgent=False, now=None):
+    """
+    Compute the derived fields of a new expense before it is inserted
+    
+    Returns the company currency amount and rate, the matching rule, the
+    starting stage and its quorum, and the escalation date, so the expense
+    is written with a single INSERT. Rates, rules and calendars come from
+    in-process caches; only the stage's approver pool is counted in SQL.
+    """
+    fields = get_base_currency_fields(amount, currency, expense_date)
+    
+    # Rule bands are in the company currency
+    rule = get_applicable_rule(fields['base_amount'], user.company_id, urgent)
+    if rule:
+        fields['approval_rule'] = rule
+        fields['current_stage'] = rule.sequence[0] if rule.sequence else 'manager'
+        fields['stage_quorum'] = ApproverPools.for_company(user.company_id).quorum(
+            fields['current_stage'], user.user_set_id, user.company_id, rule
+        )
+    
+    fields['escalation_date'] = escalation_deadline(user.company_id, rule, now)
+    return fields
+
+
 def setup_escalation(expense):
     """
     Setup auto-escalation for expense
+    
+    New submissions get their escalation date in the INSERT instead; this
+    restarts the SLA clock on an existing expense.
     """
     try:
-        # Set escalation date to 48 hours from now
-        escalation_date = timezone.now() + timedelta(hours=48)
+        # The rule's SLA, in business hours when the company has a calendar
+        escalation_date = escalation_deadline(expense.company_id, expense.approval_rule)
         expense.escalation_date = escalation_date
-        expense.save()
+        expense.save(update_fields=['escalation_date'])
         
         return escalation_date
     except Exception as e:
@@ -286,78 +693,160 @@ def setup_escalation(expense):
         return None
 
 
+ESCALATION_CHUNK_SIZE = 1000
+
+
+def escalate_overdue_expenses(now=None, chunk_size=ESCALATION_CHUNK_SIZE, expense_ids=None, company=None):
+    """
+    Move every overdue open expense, or the overdue ones among expense_ids
+    or of one company, to the admin stage
+    
+    Works through the overdue expenses in primary key order, one chunk per
+    transaction: the chunk's ids are claimed, then written with one UPDATE
+    per admin quorum (usually one per company), their inbox rows moved
+    with one more and their rollup rows with another. Expenses already at
+    the admin stage keep the approvals counted towards their quorum. Where
+    the database supports SKIP LOCKED, concurrent workers claim disjoint
+    chunks. Returns the ids of the escalated expenses.
+    """
+    now = now or timezone.now()
+    overdue = Expense.objects.filter(escalation_date__lte=now, escalated=False, status__in=OPEN_STATUSES)
+    if expense_ids is not None:
+        overdue = overdue.filter(pk__in=expense_ids)
+    if company is not None:
+        overdue = overdue.filter(company=company)
+    escalated_ids = []
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            chunk = overdue.filter(pk__gt=last_pk).order_by('pk')
+            features = transaction.get_connection().features
+            if features.has_select_for_update:
+                # Rows claimed by another worker, or locked by an approval, are left to it
+                chunk = chunk.select_for_update(
+                    skip_locked=features.has_select_for_update_skip_locked,
+                    of=('self',) if features.has_select_for_update_of else (),
+                )
+            rows = list(chunk.values_list(
+                'pk', 'company_id', 'approval_rule__percentage_required', 'user__user_set_id', 'submission_date',
+                'user_id', 'category_id', 'status', 'base_amount', 'current_stage'
+            )[:chunk_size])
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            
+            pools = ApproverPools({row[1] for row in rows})
+            by_quorum = {}
+            at_admin = []
+            for pk, company_id, percentage, user_set_id, submission_date, *_, current_stage in rows:
+                if current_stage == 'admin':
+                    # Already at the admin stage: keep the approvals it has towards its quorum
+                    at_admin.append(pk)
+                    continue
+                quorum = pools.quorum_at('admin', user_set_id, company_id, percentage)
+                by_quorum.setdefault(quorum, []).append(pk)
+            
+            # Re-check the overdue condition and stage in case a row changed since it was read
+            updated = overdue.filter(pk__in=at_admin, current_stage='admin').update(
+                escalated=True,
+                status='in_progress',
+                updated_at=now,
+                version=models.F('version') + 1,
+            ) if at_admin else 0
+            for quorum, ids in by_quorum.items():
+                updated += overdue.filter(pk__in=ids).exclude(current_stage='admin').update(
+                    current_stage='admin',
+                    escalated=True,
+                    status='in_progress',
+                    stage_approval_count=0,
+                    stage_quorum=quorum,
+                    updated_at=now,
+                    version=models.F('version') + 1,
+                )
+            
+            ids = [row[0] for row in rows]
+            if updated < len(ids):
+                ids = list(
+                    Expense.objects.filter(pk__in=ids, escalated=True, updated_at=now)
+                    .order_by('pk').values_list('pk', flat=True)
+                )
+            
+            # Pending expenses move to in_progress in the rollup; open ones have no decision date
+            delta = StatsDelta()
+            escalated = set(ids)
+            for pk, company_id, _, user_set_id, submission_date, user_id, category_id, status, base_amount, _ in rows:
+                if pk in escalated:
+                    delta.move(
+                        fact(company_id, user_set_id, user_id, category_id, status, submission_date, base_amount, None),
+                        fact(company_id, user_set_id, user_id, category_id, 'in_progress', submission_date, base_amount, None),
+                    )
+            delta.apply()
+            invalidate_dashboards(
+                [row[1] for row in rows if row[0] in escalated],
+                [row[3] for row in rows if row[0] in escalated],
+                [row[5] for row in rows if row[0] in escalated],
+            )
+            
+            # Open expenses normally have an inbox row already; only create the missing ones
+            if ApprovalInbox.objects.filter(expense_id__in=ids).update(stage='admin') < len(ids):
+                existing = set(ApprovalInbox.objects.filter(expense_id__in=ids).values_list('expense_id', flat=True))
+                upsert_entries([
+                    ApprovalInbox(
+                        expense_id=pk, company_id=company_id, stage='admin',
+                        user_set_id=user_set_id, submission_date=submission_date
+                    )
+                    for pk, company_id, _, user_set_id, submission_date, *_ in rows
+                    if pk in escalated and pk not in existing
+                ])
+            escalated_ids.extend(ids)
+    return escalated_ids
+
+
 def check_escalations():
     """
     Check for expenses that need escalation
     """
     try:
-        now = timezone.now()
-        expired_expenses = Expense.objects.filter(
-            escalation_date__lte=now,
-            escalated=False,
-            status__in=['pending', 'in_progress']
-        )
-        
-        escalated_count = 0
-        for expense in expired_expenses:
-            # Escalate to admin
-            expense.current_stage = 'admin'
-            expense.escalated = True
-            expense.status = 'in_progress'
-            expense.save()
-            escalated_count += 1
-        
-        return escalated_count
+        return len(escalate_overdue_expenses())
     except Exception as e:
         print(f"Error checking escalations: {e}")
         return 0
 
 
+DEFAULT_RULES = [
+    # ≤ 5000 - Manager only
+    {'name': 'Low Amount - Manager Only', 'min_amount': Decimal('0'), 'max_amount': Decimal('5000'),
+     'sequence': ['manager']},
+    # 5000.01-25000 - Manager → Admin
+    {'name': 'Medium Amount - Manager to Admin', 'min_amount': Decimal('5000.01'), 'max_amount': Decimal('25000'),
+     'sequence': ['manager', 'admin']},
+    # > 25000 - Manager → Admin (with comment requirement)
+    {'name': 'High Amount - Manager to Admin', 'min_amount': Decimal('25000.01'), 'max_amount': None,
+     'sequence': ['manager', 'admin']},
+]
+
+
 def create_default_rules(company):
     """
     Create default approval rules for a company
+    
+    The default bands are contiguous at cent precision. A band is skipped
+    when the company already has a rule by that name or its own rules cover
+    any part of the band.
     """
     try:
-        # Rule 1: ≤ 5000 - Manager only
-        ApprovalRule.objects.get_or_create(
-            company=company,
-            min_amount=0,
-            max_amount=5000,
-            defaults={
-                'name': 'Low Amount - Manager Only',
-                'sequence': ['manager'],
-                'percentage_required': 100,
-                'admin_override': True,
-                'urgent_bypass': True
-            }
-        )
-        
-        # Rule 2: 5001-25000 - Manager → Admin
-        ApprovalRule.objects.get_or_create(
-            company=company,
-            min_amount=5001,
-            max_amount=25000,
-            defaults={
-                'name': 'Medium Amount - Manager to Admin',
-                'sequence': ['manager', 'admin'],
-                'percentage_required': 100,
-                'admin_override': True,
-                'urgent_bypass': True
-            }
-        )
-        
-        # Rule 3: > 25000 - Manager → Admin (with comment requirement)
-        ApprovalRule.objects.get_or_create(
-            company=company,
-            min_amount=25001,
-            defaults={
-                'name': 'High Amount - Manager to Admin',
-                'sequence': ['manager', 'admin'],
-                'percentage_required': 100,
-                'admin_override': True,
-                'urgent_bypass': True
-            }
-        )
+        for values in DEFAULT_RULES:
+            if ApprovalRule.objects.filter(company=company, name=values['name']).exists():
+                continue
+            rule = ApprovalRule(
+                company=company,
+                percentage_required=100,
+                admin_override=True,
+                urgent_bypass=True,
+                **values
+            )
+            if check_rule_change(company.pk, rule)['valid']:
+                rule.save()
         
         return True
     except Exception as e:
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -87,6 +89,40 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/ref/settings/#caches
+# The rule, calendar and dashboard versions and the dashboard recompute lock
+# must be shared by every worker process and need an atomic add(), so deploy
+# with Redis or Memcached: set CACHE_URL to redis://host:6379/0 or
+# memcached://host:11211. Without it each process gets its own LocMemCache,
+# which is only correct for a single-process development server; the
+# expense_auth.W001 check warns when DEBUG is off. Tests always use LocMem.
+
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+CACHE_URL = '' if TESTING else os.environ.get('CACHE_URL', '')
+
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+elif CACHE_URL.startswith('memcached://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': CACHE_URL.removeprefix('memcached://'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -191,3 +227,35 @@ CORS_ALLOW_CREDENTIALS = True
 
 # Allow all hosts for development
 ALLOWED_HOSTS = ['*']
+
+# Exchange rates used for currency conversion
+EXCHANGE_RATES = {
+    'PROVIDER': 'auth.exchange_rates.ExchangeRateAPIProvider',
+    'PROVIDER_OPTIONS': {},
+    'BASE_CURRENCIES': ['USD'],  # Fetched by refresh_exchange_rates, used for cross rates
+    'CACHE_TTL': 3600,  # Seconds a rate stays in the in-process cache
+    'CACHE_MAXSIZE': 1024,
+}
+
+# Outbound HTTP calls to third-party services (auth/http_client.py)
+OUTBOUND_HTTP = {
+    'TIMEOUT': (3.05, 10),  # (connect, read) seconds
+    'HOST_TIMEOUTS': {
+        'restcountries.com': (3.05, 30),  # Large payload
+    },
+    'MAX_RETRIES': 2,
+    'BACKOFF_BASE': 0.2,  # Seconds, doubled per attempt with full jitter
+    'BACKOFF_MAX': 2.0,
+    'POOL_CONNECTIONS': 10,
+    'POOL_MAXSIZE': 20,
+    'BREAKER_FAILURE_THRESHOLD': 5,  # Consecutive failures before failing fast
+    'BREAKER_RESET_TIMEOUT': 30,  # Seconds before a trial call is let through
+}
+
+# Dashboard response cache (auth/dashboard_cache.py), stored in the default cache
+DASHBOARD_CACHE = {
+    'TIMEOUT': 300,  # Seconds a response is kept; writes expire it sooner
+    'LOCK_TIMEOUT': 30,  # Seconds one request may spend recomputing a response
+    'WAIT_TIMEOUT': 5,  # Seconds concurrent requests wait for that response
+    'WAIT_INTERVAL': 0.05,
+}
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Dashboard latency benchmark
+
+Grows one employee's expense history from 10 to 100k rows in a throwaway
+SQLite database and times the employee dashboard endpoint, which reads the
+daily rollup, at each size: rendered, served from the response cache, and
+next to the previous implementation (a Python pass over the rows per figure
+plus separate counts) up to --legacy-limit rows.
+
+Usage: python benchmark_dashboard.py [--runs N] [--legacy-limit N]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date
+from decimal import Decimal
+
+import django
+
+# Setup Django against a temporary database and cache
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+from django.conf import settings  # noqa: E402
+
+DB_DIR = tempfile.mkdtemp(prefix='dashboard-bench-')
+settings.DATABASES['default']['NAME'] = os.path.join(DB_DIR, 'bench.sqlite3')
+# A private in-process cache, never the shared one
+settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench'}}
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from rest_framework.test import APIRequestFactory, force_authenticate  # noqa: E402
+
+from auth.dashboard_cache import invalidate_dashboards  # noqa: E402
+from auth.models import Company, Expense, User, UserSet  # noqa: E402
+from auth.rollups import rebuild_stats  # noqa: E402
+from auth.views import get_employee_dashboard_data  # noqa: E402
+
+SIZES = [10, 100, 1000, 10000, 100000]
+STATUSES = ['pending', 'in_progress', 'approved', 'rejected']
+
+
+def setup_employee():
+    company = Company.objects.create(
+        name='Bench Co', address='1 Main St', phone='+1234567890',
+        email='bench@example.com', industry='Tech', size='11-50'
+    )
+    user_set = UserSet.objects.create(name='Bench', company=company)
+    return User.objects.create_user(
+        username='employee', email='employee@example.com', password='pass',
+        role='employee', company=company, user_set=user_set
+    )
+
+
+def grow(employee, have, want):
+    Expense.objects.bulk_create([
+        Expense(
+            user=employee, company_id=employee.company_id, title=f'Expense {i}',
+            amount=Decimal(10 + i % 500), base_amount=Decimal(10 + i % 500),
+            expense_date=date(2025, 1, 1 + i % 28), status=STATUSES[i % len(STATUSES)],
+        )
+        for i in range(have, want)
+    ], batch_size=5000)
+    # bulk_create skips the signals that maintain the rollup
+    rebuild_stats()
+
+
+def legacy_summary(employee):
+    """The previous get_employee_dashboard_data figures"""
+    all_expenses = Expense.objects.filter(user=employee)
+    return {
+        'total_submitted': sum(expense.base_amount or 0 for expense in all_expenses),
+        'pending_amount': sum(expense.base_amount or 0 for expense in all_expenses.filter(status='pending')),
+        'approved_amount': sum(expense.base_amount or 0 for expense in all_expenses.filter(status='approved')),
+        'rejected_amount': sum(expense.base_amount or 0 for expense in all_expenses.filter(status='rejected')),
+        'pending_count': all_expenses.filter(status='pending').count(),
+        'approved_count': all_expenses.filter(status='approved').count(),
+        'rejected_count': all_expenses.filter(status='rejected').count(),
+        'total_expenses': all_expenses.count(),
+    }
+
+
+def timed(call, runs, before=None):
+    samples = []
+    for _ in range(runs):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        result = call()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--legacy-limit', type=int, default=10000)
+    options = parser.parse_args()
+
+    print("🧪 Employee Dashboard Benchmark")
+    print("=" * 50)
+    print(f"Database: {settings.DATABASES['default']['NAME']}")
+    call_command('migrate', verbosity=0)
+    employee = setup_employee()
+    factory = APIRequestFactory()
+
+    def dashboard():
+        request = factory.get('/api/auth/employee-dashboard/')
+        force_authenticate(request, user=employee)
+        return get_employee_dashboard_data(request)
+
+    try:
+        have = 0
+        print(f"\n{'Expenses':>10}  {'Dashboard':>10}  {'Queries':>7}  {'Cached':>8}  {'Previous':>10}")
+        for size in SIZES:
+            grow(employee, have, size)
+            have = size
+
+            with CaptureQueriesContext(connection) as queries:
+                response = dashboard()
+            assert response.data['total_expenses'] == size
+            assert len(queries) == 2, [query['sql'] for query in queries]
+            # Expire only this user's dashboards, outside the measured call
+            latency, _ = timed(dashboard, options.runs, lambda: invalidate_dashboards(user_ids=[employee.pk]))
+            cached_latency, response = timed(dashboard, options.runs)
+            assert response.data['total_expenses'] == size
+
+            previous = '-'
+            if size <= options.legacy_limit:
+                legacy_latency, figures = timed(lambda: legacy_summary(employee), max(1, options.runs // 2))
+                assert figures['total_expenses'] == size
+                previous = f'{legacy_latency:.1f}ms'
+            print(f"{size:>10}  {latency:>8.1f}ms  {len(queries):>7}  {cached_latency:>6.2f}ms  {previous:>10}")
+    finally:
+        connection.close()
+        shutil.rmtree(DB_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Submission benchmark for the expense workflow
+
+Submits expenses through ExpenseSubmissionSerializer against a throwaway
+SQLite database, asserts that each submission runs the expected queries
+(one INSERT of the expense, no UPDATE) and reports submissions per second.
+For comparison it also runs the old shape of the pipeline: insert the row,
+then save it again to set the escalation date.
+
+Usage: python benchmark_submission.py [submissions]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+import django
+
+# Setup Django against a temporary database and cache
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+from django.conf import settings  # noqa: E402
+
+DB_DIR = tempfile.mkdtemp(prefix='submission-bench-')
+settings.DATABASES['default']['NAME'] = os.path.join(DB_DIR, 'bench.sqlite3')
+# A private in-process cache, never the shared one
+settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench'}}
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from auth.exchange_rates import save_rates  # noqa: E402
+from auth.models import BusinessCalendar, Company, Expense, User, UserSet  # noqa: E402
+from auth.serializers import ExpenseSubmissionSerializer  # noqa: E402
+from auth.workflow import create_default_rules, plan_submission  # noqa: E402
+
+# Pool count, expense INSERT, inbox upsert, daily rollup read and write, monthly rollup increment
+EXPECTED_QUERIES = 6
+
+
+def setup_company():
+    company = Company.objects.create(
+        name='Bench Co', address='1 Main St', phone='+1234567890',
+        email='bench@example.com', industry='Tech', size='11-50'
+    )
+    user_set = UserSet.objects.create(name='Bench', company=company)
+    User.objects.create_user(
+        username='manager', email='manager@example.com', password='pass',
+        role='manager', company=company, user_set=user_set
+    )
+    employee = User.objects.create_user(
+        username='employee', email='employee@example.com', password='pass',
+        role='employee', company=company, user_set=user_set
+    )
+    create_default_rules(company)
+    BusinessCalendar.objects.create(company=company, timezone='Europe/Berlin')
+    save_rates('USD', {'EUR': Decimal('0.80')}, timezone.make_aware(datetime(2025, 1, 1)))
+    return User.objects.select_related('company').get(pk=employee.pk)
+
+
+def payload(i):
+    return {
+        'title': f'Expense {i}', 'amount': str(Decimal(100 + i * 37 % 30000)),
+        'currency': 'EUR' if i % 3 == 0 else 'USD', 'expense_date': '2025-01-15',
+    }
+
+
+def submit(context, i):
+    serializer = ExpenseSubmissionSerializer(data=payload(i), context=context)
+    serializer.is_valid(raise_exception=True)
+    return serializer.save()
+
+
+def legacy_submit(employee, i):
+    """Insert the expense, then write it a second time for the escalation date"""
+    data = payload(i)
+    fields = plan_submission(employee, Decimal(data['amount']), data['currency'], date(2025, 1, 15))
+    escalation_date = fields.pop('escalation_date')
+    expense = Expense.objects.create(
+        user=employee, company=employee.company, title=data['title'], amount=Decimal(data['amount']),
+        currency=data['currency'], expense_date=date(2025, 1, 15), **fields
+    )
+    expense.escalation_date = escalation_date
+    expense.save()
+    return expense
+
+
+def report(mode, count, elapsed):
+    print(f"\n📊 {mode}")
+    print(f"   Submissions:        {count} ({elapsed:.2f}s)")
+    print(f"   Throughput:         {count / elapsed:.0f} submissions/s")
+    print(f"   Mean latency:       {elapsed / count * 1000:.2f}ms")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print("🧪 Expense Submission Benchmark")
+    print("=" * 50)
+    print(f"Database: {settings.DATABASES['default']['NAME']}")
+    call_command('migrate', verbosity=0)
+    employee = setup_company()
+    context = {'request': SimpleNamespace(user=employee)}
+
+    try:
+        # Warm the rate, rule and calendar caches, then check the query shape
+        submit(context, 0)
+        with CaptureQueriesContext(connection) as queries:
+            submit(context, 1)
+        statements = [
+            query['sql'] for query in queries
+            if not query['sql'].startswith(('BEGIN', 'COMMIT', 'SAVEPOINT', 'RELEASE'))
+        ]
+        inserts = sum(sql.startswith('INSERT INTO "expense_auth_expense"') for sql in statements)
+        updates = sum(sql.startswith('UPDATE "expense_auth_expense"') for sql in statements)
+        assert len(statements) == EXPECTED_QUERIES, statements
+        assert (inserts, updates) == (1, 0), statements
+        print(f"Queries per submission: {len(statements)} (1 expense INSERT, 0 UPDATE) ✅")
+
+        started = time.perf_counter()
+        for i in range(count):
+            legacy_submit(employee, i)
+        report('insert + save (previous pipeline)', count, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for i in range(count):
+            submit(context, i)
+        report('single INSERT', count, time.perf_counter() - started)
+    finally:
+        connection.close()
+        shutil.rmtree(DB_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for approval workflow writes
+
+Two managers approve the same expense at the same moment, for many
+expenses, against a throwaway SQLite database. Runs the legacy
+read-modify-save path and the version-checked advance_workflow and reports
+lost updates, errors, lock retries and call latency for each.
+
+Usage: python benchmark_workflow_concurrency.py [pairs]
+"""
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+import django
+
+# Setup Django against a temporary database and cache
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+from django.conf import settings  # noqa: E402
+
+DB_DIR = tempfile.mkdtemp(prefix='workflow-bench-')
+settings.DATABASES['default']['NAME'] = os.path.join(DB_DIR, 'bench.sqlite3')
+# A private in-process cache, never the shared one
+settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench'}}
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+
+from auth.models import ApprovalRule, Company, Expense, User, UserSet  # noqa: E402
+from auth.workflow import advance_workflow, plan_transition, workflow_metrics  # noqa: E402
+
+
+def setup_company():
+    company = Company.objects.create(
+        name='Bench Co', address='1 Main St', phone='+1234567890',
+        email='bench@example.com', industry='Tech', size='11-50'
+    )
+    user_set = UserSet.objects.create(name='Bench', company=company)
+    managers = [
+        User.objects.create_user(
+            username=f'manager{i}', email=f'manager{i}@example.com', password='pass',
+            role='manager', company=company, user_set=user_set
+        )
+        for i in range(2)
+    ]
+    employee = User.objects.create_user(
+        username='employee', email='employee@example.com', password='pass',
+        role='employee', company=company, user_set=user_set
+    )
+    # Both managers must approve
+    rule = ApprovalRule.objects.create(
+        name='Two managers', min_amount=0, sequence=['manager'], percentage_required=100, company=company
+    )
+    return company, employee, managers, rule
+
+
+def legacy_approve(expense_id, approver):
+    """The pre-version-column path: read, compute in Python, save"""
+    with transaction.atomic():
+        expense = Expense.objects.select_related('approval_rule').get(pk=expense_id)
+        approval_record, result = plan_transition(expense, approver, 'approved')
+        approval_record.save()
+        expense.save()
+    return result
+
+
+def versioned_approve(expense_id, approver):
+    expense = Expense.objects.select_related('user', 'approval_rule').get(pk=expense_id)
+    result = advance_workflow(expense, approver, 'approved')
+    if result['status'] == 'Error':
+        raise RuntimeError(result.get('message', 'workflow error'))
+    return result
+
+
+def run(mode, approve, pairs, company, employee, managers, rule):
+    expenses = [
+        Expense.objects.create(
+            user=employee, company=company, title=f'{mode} {i}', amount=Decimal('100.00'),
+            base_amount=Decimal('100.00'), expense_date='2025-01-15', approval_rule=rule, stage_quorum=2
+        )
+        for i in range(pairs)
+    ]
+    workflow_metrics.reset()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def approve_at(barrier, expense_id, approver):
+        barrier.wait()
+        started = time.perf_counter()
+        try:
+            approve(expense_id, approver)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+        finally:
+            with lock:
+                latencies.append(time.perf_counter() - started)
+            connection.close()
+
+    started = time.perf_counter()
+    for expense in expenses:
+        barrier = threading.Barrier(len(managers))
+        threads = [
+            threading.Thread(target=approve_at, args=(barrier, expense.id, manager))
+            for manager in managers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+
+    # An update is lost when a committed approval is missing from the counters
+    lost = 0
+    for expense in Expense.objects.filter(pk__in=[e.pk for e in expenses]):
+        recorded = expense.approval_records.filter(status='approved').count()
+        if expense.approval_count != recorded or expense.stage_approval_count != recorded:
+            lost += 1
+
+    latencies.sort()
+    metrics = workflow_metrics.snapshot()
+    print(f"\n📊 {mode}")
+    print(f"   Pairs:              {pairs} ({elapsed:.2f}s)")
+    print(f"   Lost updates:       {lost} ({lost / pairs:.1%})")
+    print(f"   Failed calls:       {len(errors)}")
+    print(f"   Latency p50 / p95:  {statistics.median(latencies) * 1000:.1f}ms / "
+          f"{latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms")
+    if mode == 'versioned':
+        print(f"   Version conflicts:  {metrics['conflicts']}")
+        print(f"   Lock retries:       {metrics['lock_retries']} "
+              f"({metrics['lock_wait_seconds'] * 1000:.1f}ms waiting)")
+        print(f"   Gave up:            {metrics['failures']}")
+
+
+def main():
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print("🧪 Workflow Concurrency Benchmark")
+    print("=" * 50)
+    print(f"Database: {settings.DATABASES['default']['NAME']}")
+    call_command('migrate', verbosity=0)
+    company, employee, managers, rule = setup_company()
+
+    try:
+        run('legacy', legacy_approve, pairs, company, employee, managers, rule)
+        run('versioned', versioned_approve, pairs, company, employee, managers, rule)
+    finally:
+        connection.close()
+        shutil.rmtree(DB_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
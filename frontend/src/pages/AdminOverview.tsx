@@ -170,14 +170,14 @@ const AdminOverview = () => {
       value: dashboardData.total_users.toString(), 
       icon: Users, 
       color: "text-primary", 
-      change: `+${dashboardData.user_growth}%` 
+      change: `${dashboardData.user_growth >= 0 ? '+' : ''}${dashboardData.user_growth}%` 
     },
     { 
       label: "Monthly Expenses", 
       value: `$${dashboardData.monthly_expenses.toLocaleString()}`, 
       icon: DollarSign, 
       color: "text-success", 
-      change: `+${dashboardData.expense_growth}%`,
+      change: `${dashboardData.expense_growth >= 0 ? '+' : ''}${dashboardData.expense_growth}%`,
       subtitle: "Excludes rejected bills"
     },
     { 
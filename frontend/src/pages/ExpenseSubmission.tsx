@@ -41,12 +41,6 @@ interface Currency {
   country: string;
 }
 
-interface ExchangeRates {
-  rates: Record<string, number>;
-  base: string;
-  date: string;
-}
-
 interface OCRData {
   text: string;
   confidence: number;
@@ -92,7 +86,6 @@ const ExpenseSubmission = () => {
   // Data states
   const [countries, setCountries] = useState<Country[]>([]);
   const [currencies, setCurrencies] = useState<Currency[]>([]);
-  const [exchangeRates, setExchangeRates] = useState<ExchangeRates | null>(null);
   const [categories, setCategories] = useState<ExpenseCategory[]>([]);
 
   // Load initial data
@@ -115,14 +108,13 @@ const ExpenseSubmission = () => {
         return;
       }
 
-      const [countriesData, exchangeRatesData, categoriesData] = await Promise.all([
+      // Amounts are converted server-side at submission, so the full rate table is not needed here
+      const [countriesData, categoriesData] = await Promise.all([
         apiService.getCountriesCurrencies(),
-        apiService.getExchangeRates(),
         apiService.getExpenseCategories()
       ]);
 
       setCountries(countriesData);
-      setExchangeRates(exchangeRatesData);
       
       // Filter only active categories
       // Fix: Add 'is_active' to ExpenseCategory type and use type assertion for safety
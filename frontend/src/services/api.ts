@@ -383,6 +383,24 @@ class ApiService {
     return response.json();
   }
 
+  async convertCurrencies(conversions: Array<{ amount: number | string; from: string; to?: string; date?: string | null }>) {
+    const response = await this.makeAuthenticatedRequest(`${API_BASE_URL}/auth/exchange-rates/convert/`, {
+      method: 'POST',
+      body: JSON.stringify({ conversions }),
+    });
+
+    if (!response.ok) {
+      try {
+        const error = await response.json();
+        throw new Error(error.error || 'Failed to convert currencies');
+      } catch (parseError) {
+        throw new Error(`Failed to convert currencies (${response.status})`);
+      }
+    }
+
+    return response.json();
+  }
+
   // Expense Category Management APIs
   async createExpenseCategory(data: { name: string; description?: string }) {
     const response = await this.makeAuthenticatedRequest(`${API_BASE_URL}/auth/expense-categories/`, {
@@ -629,6 +647,28 @@ class ApiService {
     }
   }
 
+  async bulkExpenseAction(data: {
+    action: 'approve' | 'reject' | 'override';
+    decision?: 'approve' | 'reject';
+    comment?: string;
+    expense_ids?: number[];
+    filter?: Record<string, string | number>;
+  }): Promise<any> {
+    try {
+      const response = await this.makeAuthenticatedRequest(`${API_BASE_URL}/auth/expenses/bulk-action/`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(data),
+      });
+      return await response.json();
+    } catch (error) {
+      console.error('Error processing bulk action:', error);
+      throw error;
+    }
+  }
+
   async rejectExpenseWorkflow(expenseId: number, data: { comment?: string }): Promise<any> {
     try {
       const response = await this.makeAuthenticatedRequest(`${API_BASE_URL}/auth/expenses/${expenseId}/reject-workflow/`, {